@@ -0,0 +1,286 @@
+#!/usr/env python
+"""
+Measure the crawler against a local stand-in for the youtube api, with no network access.
+The stand-in, a yt_cassette.FakeYoutubeServer, serves a power-law graph of channels - most
+channels feature a few others, a few feature many, and popular channels are featured most -
+with optional latency and errors.
+For each graph size, the time build_graph takes, the api requests it sends, its peak memory,
+and the time each output format takes to write are measured. Results are saved as json, and
+can be compared with earlier results to catch regressions.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import argparse
+import bisect
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import networkx
+
+from scripts import yt_cassette
+from scripts import yt_script
+
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+# the exponent of the power law of how many channels each channel features.
+DEFAULT_EXPONENT = 2.0
+# the most channels the api lists as featured by a channel.
+MAX_FEATURED = 100
+# degrees past the last channel found cost nothing, so the default crawls the whole graph.
+DEFAULT_DEGREE = 100
+# metrics where a higher value is a regression, compared with earlier results.
+COMPARED_METRICS = ['crawl_seconds', 'api_requests', 'peak_memory_bytes']
+DEFAULT_TOLERANCE = 0.2
+
+
+def power_law_channels(count, exponent=DEFAULT_EXPONENT, seed=1):
+    """
+    make a random, reproducible graph of channels with power-law degrees, by preferential
+    attachment: each new channel is featured by an earlier channel, and features earlier
+    channels, each chosen in proportion to how connected it already is. every channel can be
+    reached from the first.
+    :param count: how many channels to make.
+    :param exponent: the exponent of the power law of how many channels each channel features.
+    :param seed: seed for the random choices.
+    :return: dict of channel id -> (title, featured channel ids).
+    """
+    generator = random.Random(seed)
+    ids = ['UC%08d' % index for index in range(count)]
+    # a channel features k channels with probability proportional to k ^ -exponent.
+    featured_weights = list()
+    featured_total = 0.0
+    for featured_count in range(1, MAX_FEATURED + 1):
+        featured_total += featured_count ** -exponent
+        featured_weights.append(featured_total)
+    featured = dict((channel_id, list()) for channel_id in ids)
+    # each end of every edge, so a uniform choice is a choice in proportion to degree.
+    endpoints = [ids[0]]
+    for channel_id in ids[1:]:
+        parent = generator.choice(endpoints)
+        while len(featured[parent]) >= MAX_FEATURED:
+            parent = generator.choice(endpoints)
+        featured[parent].append(channel_id)
+        endpoints.extend((parent, channel_id))
+        featured_count = bisect.bisect(featured_weights, generator.random() * featured_total)
+        for _ in range(featured_count):
+            target = generator.choice(endpoints)
+            if target != channel_id and target not in featured[channel_id]:
+                featured[channel_id].append(target)
+                endpoints.extend((channel_id, target))
+    return dict((channel_id, ('title ' + channel_id, featured[channel_id]))
+                for channel_id in ids)
+
+
+def crawl(channels, arguments):
+    """
+    crawl the synthetic channels from the first, served by a local stand-in for the api.
+    :param channels: dict of channel id -> (title, featured channel ids).
+    :param arguments: the parsed benchmark arguments.
+    :return: tuple of (graph, the stopped FakeYoutubeServer, seconds taken).
+    """
+    server = yt_cassette.FakeYoutubeServer(yt_cassette.Cassette.from_channels(channels),
+                                           latency=arguments.latency,
+                                           error_rate=arguments.error_rate)
+    yt_script.configure_transport(api_url=server.root_url)
+    try:
+        document = yt_script.load_discovery_document()
+
+        def _create_api():
+            """
+            :return: an api object for a thread of the crawl.
+            """
+            return yt_script.create_youtube_api('benchmark_api_key', discovery_document=document)
+
+        graph = networkx.Graph()
+        start = time.time()
+        yt_script.build_graph(graph, _create_api(), max_depth=arguments.degree,
+                              initial_channel=sorted(channels)[0], workers=arguments.workers,
+                              api_factory=_create_api)
+        seconds = time.time() - start
+    finally:
+        yt_script.configure_transport()
+        server.stop()
+    return graph, server, seconds
+
+
+def peak_crawl_memory(channels, arguments):
+    """
+    measure the most memory a crawl allocates, in a crawl of its own, as tracing allocations
+    slows the crawl.
+    :param channels: dict of channel id -> (title, featured channel ids).
+    :param arguments: the parsed benchmark arguments.
+    :return: the peak bytes allocated, or None if tracemalloc is unavailable.
+    """
+    try:
+        import tracemalloc
+    except ImportError:     # pragma: no cover
+        return None
+    tracemalloc.start()
+    try:
+        crawl(channels, arguments)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def time_exports(graph, temp_dir):
+    """
+    time writing the graph in each output format.
+    :param graph: the networkx graph.
+    :param temp_dir: a directory to write to.
+    :return: dict of output format -> {'seconds', 'bytes'}, or {'error'} if it can not be
+        written, e.g. as the installed networkx lacks a writer.
+    """
+    exports = dict()
+    for output_format in yt_script.OUTPUT_FORMATS:
+        filename = yt_script.output_filename(os.path.join(temp_dir, 'graph'), output_format)
+        start = time.time()
+        try:
+            yt_script.generate_output(graph, output_format, filename)
+        except Exception as excp:
+            exports[output_format] = {'error': str(excp)}
+            continue
+        exports[output_format] = {'seconds': time.time() - start,
+                                  'bytes': os.path.getsize(filename)}
+    return exports
+
+
+def run_benchmark(size, arguments, temp_dir):
+    """
+    benchmark crawling and writing a synthetic graph.
+    :param size: how many channels the graph has.
+    :param arguments: the parsed benchmark arguments.
+    :param temp_dir: a directory to write to.
+    :return: dict of the results.
+    """
+    channels = power_law_channels(size, arguments.exponent, arguments.seed)
+    graph, server, seconds = crawl(channels, arguments)
+    result = {'channels': size, 'nodes': len(graph), 'edges': graph.number_of_edges(),
+              'crawl_seconds': seconds, 'api_requests': server.request_count + server.throttled,
+              'api_errors': server.throttled, 'ids_requested': server.ids_requested,
+              'peak_memory_bytes': None}
+    if not arguments.skip_memory:
+        result['peak_memory_bytes'] = peak_crawl_memory(channels, arguments)
+    if not arguments.skip_exports:
+        result['exports'] = time_exports(graph, temp_dir)
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """
+    compare results with earlier results of the same sizes.
+    :param results: dict of size -> results, from run_benchmark.
+    :param baseline: dict of size -> results, loaded from an earlier run.
+    :param tolerance: the share a metric may grow by before it is a regression.
+    :return: list of descriptions of the regressions.
+    """
+    regressions = list()
+    for size, result in sorted(results.items(), key=lambda item: int(item[0])):
+        if size not in baseline:
+            continue
+        earlier = baseline[size]
+        measured = [(metric, result.get(metric), earlier.get(metric))
+                    for metric in COMPARED_METRICS]
+        for output_format, export in result.get('exports', {}).items():
+            earlier_export = earlier.get('exports', {}).get(output_format, {})
+            measured.append(('export ' + output_format, export.get('seconds'),
+                             earlier_export.get('seconds')))
+        for metric, value, earlier_value in measured:
+            if value is None or not earlier_value:
+                continue
+            ratio = float(value) / earlier_value
+            print('{:>8} {:<28} {:12.4g} -> {:12.4g} ({:+.0%})'.format(
+                size, metric, earlier_value, value, ratio - 1))
+            if ratio > 1 + tolerance:
+                regressions.append('{} channels: {} rose {:.0%}'.format(size, metric, ratio - 1))
+    return regressions
+
+
+def report(result):
+    """
+    print the results of a benchmark.
+    :param result: dict of the results, from run_benchmark.
+    :return:
+    """
+    print('{channels} channels: crawled {nodes} nodes and {edges} edges in {crawl_seconds:.2f} s,'
+          ' with {api_requests} requests ({api_errors} refused)'.format(**result))
+    if result['peak_memory_bytes'] is not None:
+        print('    peak memory {:.1f} MB'.format(result['peak_memory_bytes'] / 1e6))
+    for output_format, export in sorted(result.get('exports', {}).items()):
+        if 'error' in export:
+            print('    {:<10} unavailable: {}'.format(output_format, export['error']))
+        else:
+            print('    {:<10} {:8.3f} s {:12d} bytes'.format(output_format, export['seconds'],
+                                                           export['bytes']))
+
+
+def main_function():
+    """
+    the runner function of the benchmark
+    :return: 1 if results regressed from the baseline, otherwise 0.
+    """
+    parser = argparse.ArgumentParser(description="""Time crawls of synthetic youtube channel
+                                                  graphs, and writing their output.""")
+    parser.add_argument('-s', '--sizes', action='store', type=str,
+                        default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="Comma separated numbers of channels to benchmark. Default is " +
+                        ','.join(str(size) for size in DEFAULT_SIZES) + ".")
+    parser.add_argument('-d', '--degree', action='store', type=int, default=DEFAULT_DEGREE,
+                        help="The degree of separation to crawl to. Default is " +
+                        str(DEFAULT_DEGREE) + ", enough to crawl the whole graph.")
+    parser.add_argument('-w', '--workers', action='store', type=int, default=1,
+                        help="The number of threads sending requests. Default is 1.")
+    parser.add_argument('--latency', action='store', type=float, default=0.0,
+                        help="Seconds each api request takes. Default is 0.")
+    parser.add_argument('--error_rate', action='store', type=float, default=0.0,
+                        help="The share of api requests refused for load. Default is 0.")
+    parser.add_argument('--exponent', action='store', type=float, default=DEFAULT_EXPONENT,
+                        help="The exponent of the graph's power laws. Default is " +
+                        str(DEFAULT_EXPONENT) + ".")
+    parser.add_argument('--seed', action='store', type=int, default=1,
+                        help="Seed for the synthetic graph. Default is 1.")
+    parser.add_argument('--skip_memory', action='store_true', default=False,
+                        help="Do not measure peak memory, which takes a second crawl.")
+    parser.add_argument('--skip_exports', action='store_true', default=False,
+                        help="Do not time the output formats.")
+    parser.add_argument('-r', '--results', action='store', type=str, default=None,
+                        help="A json file to save the results to.")
+    parser.add_argument('-b', '--baseline', action='store', type=str, default=None,
+                        help="A json file of earlier results to compare with.")
+    parser.add_argument('--tolerance', action='store', type=float, default=DEFAULT_TOLERANCE,
+                        help="The share a metric may rise by from the baseline before it is " +
+                        "a regression. Default is " + str(DEFAULT_TOLERANCE) + ".")
+    arguments = parser.parse_args()
+
+    results = dict()
+    temp_dir = tempfile.mkdtemp()
+    try:
+        for size in [int(size) for size in arguments.sizes.split(',')]:
+            results[str(size)] = run_benchmark(size, arguments, temp_dir)
+            report(results[str(size)])
+    finally:
+        shutil.rmtree(temp_dir)
+    if arguments.results is not None:
+        with open(arguments.results, 'w') as f_handle:
+            json.dump({'python': platform.python_version(), 'networkx': networkx.__version__,
+                       'options': vars(arguments), 'results': results}, f_handle, indent=2,
+                      sort_keys=True)
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as f_handle:
+            baseline = json.load(f_handle)['results']
+        regressions = compare(results, baseline, arguments.tolerance)
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main_function())
@@ -0,0 +1,96 @@
+#!/usr/env python
+"""
+Compare the time taken to create a youtube api object, when the discovery document is
+downloaded, when it is loaded from the copy in the cache directory, and when it is already
+loaded in the process, as for the api objects of worker threads.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from googleapiclient import discovery
+
+from scripts import yt_script
+
+
+def time_calls(function, repeats):
+    """
+    time a function.
+    :param function: the function to call, without arguments.
+    :param repeats: how many times to call it.
+    :return: list of the seconds each call took.
+    """
+    timings = list()
+    for _ in range(repeats):
+        start = time.time()
+        function()
+        timings.append(time.time() - start)
+    return timings
+
+
+def report(name, timings):
+    """
+    print the mean and best times of a benchmark.
+    :param name: the name of the benchmark.
+    :param timings: list of seconds, or None if the benchmark could not run.
+    :return:
+    """
+    if timings is None:
+        print('{:<36} unavailable'.format(name))
+    else:
+        print('{:<36} mean {:8.1f} ms   best {:8.1f} ms'.format(
+            name, 1000 * sum(timings) / len(timings), 1000 * min(timings)))
+
+
+def main_function():
+    """
+    the runner function of the benchmark
+    :return:
+    """
+    parser = argparse.ArgumentParser(description="""Time the creation of youtube api objects.""")
+    parser.add_argument('-r', '--repeats', action='store', type=int, default=10,
+                        help="How many api objects to create in each benchmark. Default is 10.")
+    arguments = parser.parse_args()
+    cache_dir = tempfile.mkdtemp()
+    try:
+        def _downloaded():
+            discovery.build(yt_script.API_YOUTUBE_SERVICE, yt_script.API_VERSION,
+                            developerKey='benchmark_key', cache_discovery=False,
+                            static_discovery=False)
+
+        def _from_cache_directory():
+            yt_script._discovery_documents.clear()
+            yt_script.create_youtube_api('benchmark_key',
+                                         discovery_document=yt_script.load_discovery_document(
+                                             cache_dir))
+
+        def _already_loaded():
+            yt_script.create_youtube_api('benchmark_key',
+                                         discovery_document=yt_script.load_discovery_document(
+                                             cache_dir))
+
+        try:
+            downloaded = time_calls(_downloaded, arguments.repeats)
+        except Exception as excp:
+            print('Could not download the discovery document: ' + str(excp))
+            downloaded = None
+        # save the document to the cache directory first.
+        yt_script.load_discovery_document(cache_dir)
+        report('discovery.build, downloaded', downloaded)
+        report('build_from_document, cache directory',
+               time_calls(_from_cache_directory, arguments.repeats))
+        report('build_from_document, already loaded',
+               time_calls(_already_loaded, arguments.repeats))
+    finally:
+        yt_script._discovery_documents.clear()
+        shutil.rmtree(cache_dir)
+
+if __name__ == '__main__':
+    main_function()
@@ -0,0 +1,296 @@
+"""
+asyncio based crawling for the youtube graphing script.
+channels().list requests are sent straight to the youtube data api over non-blocking
+connections, so a single thread can keep hundreds of requests in flight.
+requires python 3.5 or later.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import asyncio
+import json
+import ssl
+import time
+from urllib.parse import urlencode, urlsplit
+
+try:
+    from scripts import yt_script
+    from scripts.yt_quota import QUOTA_COSTS, is_quota_status
+    from scripts.yt_throttle import AimdController, backoff_delay, is_retryable_status
+except ImportError:
+    import yt_script
+    from yt_quota import QUOTA_COSTS, is_quota_status
+    from yt_throttle import AimdController, backoff_delay, is_retryable_status
+
+
+API_BASE_URL = 'https://www.googleapis.com/youtube/v3/'
+
+DEFAULT_MAX_IN_FLIGHT = 100
+# seconds to wait for a response before giving up on a request.
+DEFAULT_REQUEST_TIMEOUT = 30
+
+
+async def _read_chunked_body(reader):
+    """
+    read a response body sent with chunked transfer encoding.
+    :param reader: the asyncio StreamReader of the connection.
+    :return: the body as bytes.
+    """
+    body = bytearray()
+    while True:
+        size_line = await reader.readline()
+        size = int(size_line.split(b';')[0].strip(), 16)
+        if size == 0:
+            # skip any trailers.
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return bytes(body)
+        body.extend(await reader.readexactly(size))
+        await reader.readline()
+
+
+async def http_get_json(url, timeout=DEFAULT_REQUEST_TIMEOUT, headers=None):
+    """
+    send an http(s) GET request over a non-blocking connection and decode the json reply.
+    :param url: the url to request.
+    :param timeout: seconds to wait for the response.
+    :param headers: dict of extra request headers.
+    :return: (http status code, decoded json body, or None if the body is empty).
+    """
+
+    async def _request():
+        """
+        send the request and read the whole response.
+        :return: (http status code, response body bytes)
+        """
+        reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=ssl_context)
+        try:
+            path = parts.path + ('?' + parts.query if parts.query else '')
+            extra_headers = ''.join('{}: {}\r\n'.format(name, value)
+                                    for name, value in (headers or {}).items())
+            writer.write(('GET {} HTTP/1.1\r\nHost: {}\r\nAccept: application/json\r\n{}'
+                          'Connection: close\r\n\r\n').format(path, parts.netloc,
+                                                                extra_headers).encode('ascii'))
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            response_headers = dict()
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+            if status == 304:
+                body = b''
+            elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+                body = await _read_chunked_body(reader)
+            elif 'content-length' in response_headers:
+                body = await reader.readexactly(int(response_headers['content-length']))
+            else:
+                body = await reader.read()
+            return status, body
+        finally:
+            writer.close()
+
+    parts = urlsplit(url)
+    ssl_context = ssl.create_default_context() if parts.scheme == 'https' else None
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    status, body = await asyncio.wait_for(_request(), timeout)
+    return status, json.loads(body.decode('utf-8')) if body else None
+
+
+class AsyncChannelFetcher(object):
+    """
+    looks up channel details for build_graph, sending every request of a degree concurrently
+    from an asyncio event loop. throttled requests are retried, and the requests in flight are
+    limited by an AimdController.
+    """
+
+    def __init__(self, api_key, max_in_flight=DEFAULT_MAX_IN_FLIGHT, base_url=API_BASE_URL,
+                 cache=None, timeout=DEFAULT_REQUEST_TIMEOUT, key_pool=None, controller=None,
+                 logger=None):
+        """
+        :param api_key: the api key with which to access the youtube api.
+        :param max_in_flight: the most requests waiting on a response at once.
+        :param base_url: the root url of the youtube data api.
+        :param cache: a ChannelCache to read channel details from first.
+        :param timeout: seconds to wait for each response.
+        :param key_pool: an ApiKeyPool to take the key of each request from, instead of api_key.
+        :param controller: an AimdController whose limit bounds the requests in flight. if None,
+            one is made from max_in_flight.
+        :param logger: logging object to warn of failed requests through.
+        :return:
+        """
+        if api_key is None and key_pool is None:
+            raise RuntimeError(" '<api_key>' developerKey cannot be null.")
+        if max_in_flight is None or max_in_flight < 1:
+            raise RuntimeError("""Error in AsyncChannelFetcher(k, m, b, c, t):
+                               'm' should be a positive integer.""")
+        self.api_key = api_key
+        self.max_in_flight = max_in_flight
+        self.base_url = base_url
+        self.cache = cache
+        self.timeout = timeout
+        self.key_pool = key_pool
+        self.logger = logger
+        self.controller = controller if controller is not None else AimdController(max_in_flight)
+        self.in_flight = 0
+        self.request_count = 0
+        self.loop = asyncio.new_event_loop()
+
+    async def _fetch_chunk(self, id_chunk, limit, failed=None):
+        """
+        look up a chunk of channels through a single brandingSettings request. if the cache
+        is revalidating, the request is conditional on the etag of the last response.
+        :param id_chunk: list of no more than MAX_IDS_PER_REQUEST channel ids.
+        :param limit: condition guarding the count of requests in flight.
+        :param failed: a list to add the ids of the chunk to if its request fails.
+        :return: dict of channel id to (title, associate ids).
+        """
+        headers = dict()
+        stored = None
+        if self.cache is not None and self.cache.revalidate:
+            response_etag = self.cache.get_response_etag(id_chunk)
+            if response_etag is not None:
+                stored = self.cache.get_stale_many(response_etag[1])
+                # only revalidate if every channel of the last response is still cached.
+                if len(stored) == len(response_etag[1]):
+                    headers['If-None-Match'] = response_etag[0]
+                else:
+                    stored = None
+        attempt = 0
+        while True:
+            if self.key_pool is not None:
+                key = self.key_pool.acquire(QUOTA_COSTS['channels.list'])
+            else:
+                key = self.api_key
+            url = self.base_url + 'channels?' + urlencode(
+                [('part', 'brandingSettings'), ('id', ','.join(id_chunk)),
+                 ('maxResults', yt_script.MAX_IDS_PER_REQUEST), ('key', key)])
+            async with limit:
+                await limit.wait_for(lambda: self.in_flight < self.controller.current_limit)
+                self.in_flight += 1
+            ticket = self.controller.ticket()
+            start = time.time()
+            try:
+                self.request_count += 1
+                status, result = await http_get_json(url, self.timeout, headers)
+            except (OSError, asyncio.TimeoutError):
+                status, result = None, None
+            finally:
+                async with limit:
+                    self.in_flight -= 1
+                    limit.notify_all()
+            if self.controller.metrics is not None:
+                self.controller.metrics.observe_request(
+                    'channels.list', 'network' if status is None else status,
+                    time.time() - start)
+            # a key the api refuses for a spent quota is dropped, and the next key tried.
+            if self.key_pool is not None and is_quota_status(status, json.dumps(result)):
+                self.key_pool.exhaust(key)
+                continue
+            if status is None or is_retryable_status(status, json.dumps(result)):
+                if attempt >= self.controller.max_retries:
+                    raise RuntimeError("""Error in AsyncChannelFetcher:
+                                       the youtube api was still refusing requests after
+                                       retrying them. status = """ + str(status))
+                self.controller.on_throttle(ticket)
+                await asyncio.sleep(backoff_delay(attempt, self.controller.base_delay,
+                                                  self.controller.max_delay))
+                attempt += 1
+                continue
+            self.controller.on_success()
+            break
+        if status == 400:
+            raise RuntimeError("""Error in AsyncChannelFetcher:
+                               failed request to youtube api - check the api_key is correctly
+                               spelt.""")
+        details = dict()
+        if status == 304 and stored is not None:
+            self.cache.refresh_many(stored)
+            details.update(stored)
+        elif status == 200:
+            etags = dict()
+            for item in result.get('items', []):
+                channel = item.get('brandingSettings', {}).get('channel', {})
+                details[item['id']] = (channel.get('title'),
+                                       channel.get('featuredChannelsUrls'))
+                etags[item['id']] = item.get('etag')
+            if self.cache is not None:
+                self.cache.put_many(details, etags=etags)
+                if 'etag' in result:
+                    self.cache.put_response_etag(id_chunk, result['etag'], list(details))
+        else:
+            yt_script._declare_failed_chunk(self.logger, id_chunk,
+                                            'http status ' + str(status), failed)
+        return details
+
+    async def _fetch_all(self, channel_ids, failed=None):
+        """
+        look up every given channel, with all requests running concurrently.
+        :param channel_ids: list of unique channel ids.
+        :param failed: a list to add the ids of channels whose request failed to.
+        :return: dict of channel id to (title, associate ids).
+        """
+        limit = asyncio.Condition()
+        results = await asyncio.gather(*[self._fetch_chunk(id_chunk, limit, failed) for id_chunk
+                                         in yt_script.chunk_channel_ids(channel_ids, self.cache)])
+        details = dict()
+        for result in results:
+            details.update(result)
+        return details
+
+    def __call__(self, channel_ids, failed=None):
+        """
+        look up channel details, in the same form as yt_script.get_channel_details.
+        :param channel_ids: the ids of the channels to look up.
+        :param failed: a list to add the ids of channels whose request failed to.
+        :return: dict of channel id to (title, associate ids).
+        """
+        channel_ids = list(channel_ids)
+        details = dict()
+        if self.cache is not None:
+            details.update(self.cache.get_many(channel_ids))
+        unresolved_ids = [channel_id for channel_id in channel_ids if channel_id not in details]
+        if len(unresolved_ids) > 0:
+            details.update(self.loop.run_until_complete(self._fetch_all(unresolved_ids,
+                                                                           failed)))
+        return details
+
+    def close(self):
+        """
+        close the event loop.
+        :return:
+        """
+        self.loop.close()
+
+
+def build_graph_async(graph, api_key, max_depth=1, initial_channel=None, logger=None,
+                      cache=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, base_url=API_BASE_URL,
+                      key_pool=None, controller=None, metrics=None, **options):
+    """
+    build a graph as yt_script.build_graph does, with the requests of each degree sent
+    concurrently from an asyncio event loop.
+    :param graph: the networkx graph object to work with.
+    :param api_key: the api key with which to access the youtube api.
+    :param max_depth: furthermost depth to build to.
+    :param initial_channel: the channel id for the initial node
+    :param logger: logging object for generating verbose messages
+    :param cache: a ChannelCache to read channel details from first.
+    :param max_in_flight: the most requests waiting on a response at once.
+    :param base_url: the root url of the youtube data api.
+    :param key_pool: an ApiKeyPool to take the key of each request from, instead of api_key.
+    :param controller: an AimdController whose limit bounds the requests in flight.
+    :param metrics: a CrawlMetrics to count the requests and the growth of the graph in.
+    :param options: further keyword arguments for yt_script.build_graph, such as checkpoints.
+    :return:
+    """
+    if controller is None:
+        controller = AimdController(max_in_flight, metrics=metrics)
+    fetcher = AsyncChannelFetcher(api_key, max_in_flight=max_in_flight, base_url=base_url,
+                                  cache=cache, key_pool=key_pool, controller=controller,
+                                  logger=logger)
+    try:
+        yt_script.build_graph(graph, None, max_depth=max_depth, initial_channel=initial_channel,
+                              logger=logger, fetcher=fetcher, metrics=metrics, **options)
+    finally:
+        fetcher.close()
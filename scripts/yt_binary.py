@@ -0,0 +1,259 @@
+"""
+Compact binary graph format for the youtube graphing script.
+The graph is kept as CSR arrays - each node's neighbours as a run of int32 node indices - with
+a degree array and string tables of the node labels and titles, written with numpy. The file
+can be memory mapped, so a graph is analysed without reading it all in, and converted back to
+a networkx graph on demand.
+
+Layout: an 8 byte magic string, the length of a json header as a little endian uint64, the
+header, then each array it lists, starting on 64 byte boundaries.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import json
+import struct
+
+try:
+    from scripts.yt_compression import compression_of, open_file
+except ImportError:
+    from yt_compression import compression_of, open_file
+try:
+    import numpy
+except ImportError:
+    print ('''ERROR: the numpy module is required.
+    You can install this module through pip.''')
+    exit()
+
+
+MAGIC = b'YTGRAPH\x00'
+BINARY_VERSION = 1
+# the alignment of each array in the file.
+ALIGNMENT = 64
+# the degree stored for nodes without a 'degree' attribute.
+MISSING_DEGREE = -1
+ARRAY_NAMES = ['indptr', 'indices', 'degrees', 'label_offsets', 'label_data', 'title_offsets',
+               'title_data']
+
+
+def _string_table(strings):
+    """
+    pack strings into one utf-8 byte array, with the offset of each string.
+    :param strings: list of strings.
+    :return: tuple of (offsets, data) arrays. string i is data[offsets[i]:offsets[i + 1]].
+    """
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = numpy.zeros(len(encoded) + 1, dtype='<i8')
+    numpy.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return offsets, numpy.frombuffer(b''.join(encoded), dtype='u1')
+
+
+def _padding(position):
+    """
+    :param position: a position in the file.
+    :return: bytes of padding to the next aligned position.
+    """
+    return b'\x00' * (-position % ALIGNMENT)
+
+
+def convert_graph_to_binary(graph, filename):
+    """
+    convert from a networkX graph object, to the compact binary format.
+    node labels are written as text. each node's 'degree' attribute is kept, as is its 'title'
+    attribute when the nodes are labelled by channel id.
+    :param graph: the networkX graph object.
+    :param filename: the name of the file to write to.
+    :return:
+    """
+    nodes = list(graph.nodes(data=True))
+    index = dict((node, position) for position, (node, _) in enumerate(nodes))
+    has_titles = len(nodes) > 0 and all('title' in data for _, data in nodes)
+
+    indptr = numpy.zeros(len(nodes) + 1, dtype='<i8')
+    numpy.cumsum([len(graph[node]) for node, _ in nodes], out=indptr[1:])
+    indices = numpy.fromiter((index[neighbour] for node, _ in nodes for neighbour in graph[node]),
+                             dtype='<i4', count=int(indptr[-1]))
+    degrees = numpy.array([data.get('degree', MISSING_DEGREE) for _, data in nodes], dtype='<i4')
+    label_offsets, label_data = _string_table([u'%s' % node for node, _ in nodes])
+    title_offsets, title_data = _string_table([data['title'] for _, data in nodes]
+                                              if has_titles else [])
+    arrays = dict(indptr=indptr, indices=indices, degrees=degrees, label_offsets=label_offsets,
+                  label_data=label_data, title_offsets=title_offsets, title_data=title_data)
+
+    header = {'version': BINARY_VERSION, 'nodes': len(nodes),
+              'edges': graph.number_of_edges(), 'titles': has_titles, 'arrays': {}}
+    # the header holds the array offsets, so is sized with placeholder offsets first.
+    for name in ARRAY_NAMES:
+        header['arrays'][name] = {'dtype': arrays[name].dtype.str,
+                                  'shape': list(arrays[name].shape), 'offset': 0}
+    header_size = len(json.dumps(header)) + 32 * len(ARRAY_NAMES)
+    position = len(MAGIC) + 8 + header_size
+    position += len(_padding(position))
+    for name in ARRAY_NAMES:
+        header['arrays'][name]['offset'] = position
+        position += arrays[name].nbytes
+        position += len(_padding(position))
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (header_size - len(header_bytes))
+
+    with open_file(filename, 'wb') as f_handle:
+        f_handle.write(MAGIC + struct.pack('<Q', header_size) + header_bytes)
+        position = len(MAGIC) + 8 + header_size
+        for name in ARRAY_NAMES:
+            f_handle.write(_padding(position))
+            f_handle.write(arrays[name].tobytes())
+            position = header['arrays'][name]['offset'] + arrays[name].nbytes
+    return
+
+
+class BinaryGraph(object):
+    """
+    a graph loaded from the compact binary format. the arrays are numpy arrays, memory mapped
+    unless loaded with mmap=False:
+    indptr - node i's neighbours are indices[indptr[i]:indptr[i + 1]].
+    indices - int32 node indices.
+    degrees - the degree of separation of each node, or -1 if the node had none.
+    """
+
+    def __init__(self, header, arrays):
+        """
+        :param header: the header read from the file.
+        :param arrays: dict of array name -> numpy array.
+        :return:
+        """
+        self.header = header
+        self.has_titles = header['titles']
+        self.indptr = arrays['indptr']
+        self.indices = arrays['indices']
+        self.degrees = arrays['degrees']
+        self.label_offsets = arrays['label_offsets']
+        self.label_data = arrays['label_data']
+        self.title_offsets = arrays['title_offsets']
+        self.title_data = arrays['title_data']
+        self._index = None
+
+    def node_count(self):
+        return self.header['nodes']
+
+    def edge_count(self):
+        return self.header['edges']
+
+    @staticmethod
+    def _string(offsets, data, position):
+        """
+        :param offsets: a string table's offsets.
+        :param data: a string table's data.
+        :param position: the index of the string.
+        :return: the string.
+        """
+        return data[offsets[position]:offsets[position + 1]].tobytes().decode('utf-8')
+
+    def label(self, position):
+        """
+        :param position: a node index.
+        :return: the node's label.
+        """
+        return self._string(self.label_offsets, self.label_data, position)
+
+    def title(self, position):
+        """
+        :param position: a node index.
+        :return: the node's title, or None if the nodes had no titles.
+        """
+        if not self.has_titles:
+            return None
+        return self._string(self.title_offsets, self.title_data, position)
+
+    @staticmethod
+    def _strings(offsets, data):
+        """
+        :param offsets: a string table's offsets.
+        :param data: a string table's data.
+        :return: list of every string in the table.
+        """
+        text = data.tobytes()
+        bounds = offsets.tolist()
+        return [text[bounds[position]:bounds[position + 1]].decode('utf-8')
+                for position in range(len(bounds) - 1)]
+
+    def labels(self):
+        """
+        :return: list of every node label, by node index.
+        """
+        return self._strings(self.label_offsets, self.label_data)
+
+    def index(self, label):
+        """
+        :param label: a node label.
+        :return: the node index of the label. the lookup table is made on the first call.
+        """
+        if self._index is None:
+            self._index = dict((node, position) for position, node in enumerate(self.labels()))
+        return self._index[label]
+
+    def neighbours(self, position):
+        """
+        :param position: a node index.
+        :return: array of the node indices of the node's neighbours, without copying.
+        """
+        return self.indices[self.indptr[position]:self.indptr[position + 1]]
+
+    def to_networkx(self, graph=None):
+        """
+        add the nodes and edges to a networkx graph, with the attributes they were written with.
+        :param graph: the networkx graph to add to. if None, a new networkx.Graph is made.
+        :return: the networkx graph.
+        """
+        if graph is None:
+            import networkx
+            graph = networkx.Graph()
+        labels = self.labels()
+        degrees = self.degrees.tolist()
+        titles = self._strings(self.title_offsets, self.title_data) if self.has_titles else None
+        for position, label in enumerate(labels):
+            attributes = dict()
+            if degrees[position] != MISSING_DEGREE:
+                attributes['degree'] = degrees[position]
+            if titles is not None:
+                attributes['title'] = titles[position]
+            graph.add_node(label, **attributes)
+        sources = numpy.repeat(numpy.arange(self.node_count(), dtype='<i4'),
+                               numpy.diff(self.indptr))
+        # each edge is listed at both ends, so is added from its lower end only.
+        lower = self.indices >= sources
+        graph.add_edges_from((labels[source], labels[target]) for source, target in
+                             zip(sources[lower].tolist(), self.indices[lower].tolist()))
+        return graph
+
+
+def load_binary(filename, mmap=True):
+    """
+    load a graph written by convert_graph_to_binary.
+    :param filename: the name of the file.
+    :param mmap: if True, the arrays are memory mapped from the file, and pages are only read
+        as they are used. if False, or the file is compressed, the arrays are read into memory.
+    :return: the BinaryGraph.
+    """
+    if compression_of(filename) is not None:
+        mmap = False
+    with open_file(filename, 'rb') as f_handle:
+        if f_handle.read(len(MAGIC)) != MAGIC:
+            raise RuntimeError("""Error in load_binary(f): 'f' is not a binary graph file.""")
+        header_size = struct.unpack('<Q', f_handle.read(8))[0]
+        header = json.loads(f_handle.read(header_size).decode('utf-8'))
+        if header['version'] != BINARY_VERSION:
+            raise RuntimeError("""Error in load_binary(f):
+                               'f' was written by an unsupported version of the format.""")
+        arrays = dict()
+        for name in ARRAY_NAMES:
+            layout = header['arrays'][name]
+            dtype = numpy.dtype(str(layout['dtype']))
+            shape = tuple(layout['shape'])
+            if mmap and numpy.prod(shape) > 0:
+                arrays[name] = numpy.memmap(filename, dtype=dtype, mode='r',
+                                            offset=layout['offset'], shape=shape)
+            else:
+                # arrays are read in order, so compressed files are only read forwards.
+                f_handle.seek(layout['offset'])
+                arrays[name] = numpy.frombuffer(
+                    f_handle.read(int(numpy.prod(shape)) * dtype.itemsize), dtype=dtype)
+    return BinaryGraph(header, arrays)
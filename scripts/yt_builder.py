@@ -0,0 +1,199 @@
+"""
+Compact graph building for the youtube graphing script.
+Channels are keyed by channel id, interned to integers, so channels sharing a title stay
+apart. Degrees and edges are kept in integer arrays, with a set of packed edge keys for
+constant time membership tests. A networkx graph is only made once the crawl is done.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+from array import array
+
+
+# ways of labelling the nodes of the networkx graph.
+NODE_KEYS = ['title', 'id']
+
+
+class CompactGraphBuilder(object):
+    """
+    an undirected graph of channels, each with a title and the degree it was found at.
+    """
+
+    def __init__(self):
+        # channel id -> node index
+        self.index = dict()
+        # node index -> channel id, title and degree
+        self.ids = list()
+        self.titles = list()
+        self.degrees = array('i')
+        # node index -> title label, given as each node is added, and the labels taken.
+        self.title_labels = list()
+        self.used_labels = set()
+        # the ends of each edge, by node index, in the order the edges were added.
+        self.edge_sources = array('i')
+        self.edge_targets = array('i')
+        # packed node index pairs, for membership tests.
+        self.edge_keys = set()
+
+    @staticmethod
+    def _edge_key(index_a, index_b):
+        """
+        pack an undirected edge into a single integer.
+        :param index_a: the node index of one end.
+        :param index_b: the node index of the other end.
+        :return: the key.
+        """
+        if index_a > index_b:
+            index_a, index_b = index_b, index_a
+        return (index_a << 32) | index_b
+
+    def add_node(self, channel_id, title, degree):
+        """
+        add a channel, unless it is already in the graph.
+        :param channel_id: the id of the channel.
+        :param title: the title of the channel.
+        :param degree: the degree of separation the channel was found at.
+        :return: True if the channel was added.
+        """
+        if channel_id in self.index:
+            return False
+        self.index[channel_id] = len(self.ids)
+        self.ids.append(channel_id)
+        self.titles.append(title)
+        self.degrees.append(degree)
+        self._add_title_label(channel_id, title)
+        return True
+
+    def _add_title_label(self, channel_id, title):
+        """
+        label the newest node by its title, or 'title (id)' if an earlier node has the title.
+        :param channel_id: the id of the channel.
+        :param title: the title of the channel.
+        :return:
+        """
+        label = title
+        if label in self.used_labels:
+            label = '{} ({})'.format(title, channel_id)
+        self.used_labels.add(label)
+        self.title_labels.append(label)
+
+    def label(self, channel_id, node_key='title'):
+        """
+        :param channel_id: the id of a channel in the graph.
+        :param node_key: how to label the node, as for labels().
+        :return: the label of the channel's node.
+        """
+        if node_key == 'id':
+            return channel_id
+        return self.title_labels[self.index[channel_id]]
+
+    def has_node(self, channel_id):
+        """
+        :param channel_id: the id of a channel.
+        :return: True if the channel is in the graph.
+        """
+        return channel_id in self.index
+
+    def add_edge(self, channel_id_a, channel_id_b):
+        """
+        add an edge between two channels in the graph, unless it is already there.
+        :param channel_id_a: the id of one channel.
+        :param channel_id_b: the id of the other channel.
+        :return: True if the edge was added.
+        """
+        index_a = self.index[channel_id_a]
+        index_b = self.index[channel_id_b]
+        key = self._edge_key(index_a, index_b)
+        if key in self.edge_keys:
+            return False
+        self.edge_keys.add(key)
+        self.edge_sources.append(index_a)
+        self.edge_targets.append(index_b)
+        return True
+
+    def has_edge(self, channel_id_a, channel_id_b):
+        """
+        :param channel_id_a: the id of one channel.
+        :param channel_id_b: the id of the other channel.
+        :return: True if the channels are joined by an edge.
+        """
+        if channel_id_a not in self.index or channel_id_b not in self.index:
+            return False
+        return self._edge_key(self.index[channel_id_a], self.index[channel_id_b]) in \
+            self.edge_keys
+
+    def node_count(self):
+        """
+        :return: the number of channels added.
+        """
+        return len(self.ids)
+
+    def edge_count(self):
+        """
+        :return: the number of edges added.
+        """
+        return len(self.edge_sources)
+
+    def labels(self, node_key='title'):
+        """
+        label each node for the networkx graph.
+        :param node_key: 'title' labels nodes by title. a channel whose title is already taken
+            by an earlier channel has its id added, as 'title (id)'. 'id' labels nodes by
+            channel id.
+        :return: list of labels, by node index.
+        """
+        if node_key not in NODE_KEYS:
+            raise RuntimeError("""Error in CompactGraphBuilder.labels(k): 'k' has an unrecognised
+                               value. value of 'k'=""" + str(node_key))
+        if node_key == 'id':
+            return list(self.ids)
+        return list(self.title_labels)
+
+    def to_networkx(self, graph=None, node_key='title'):
+        """
+        add the nodes and edges to a networkx graph. each node has a 'degree' attribute, and
+        when labelled by id a 'title' attribute too.
+        :param graph: the networkx graph to add to. if None, a new networkx.Graph is made.
+        :param node_key: how to label the nodes, as for labels().
+        :return: the networkx graph.
+        """
+        if graph is None:
+            import networkx
+            graph = networkx.Graph()
+        labels = self.labels(node_key)
+        if node_key == 'id':
+            graph.add_nodes_from((labels[index], {'degree': self.degrees[index],
+                                                  'title': self.titles[index]})
+                                 for index in range(len(labels)))
+        else:
+            graph.add_nodes_from((labels[index], {'degree': self.degrees[index]})
+                                 for index in range(len(labels)))
+        graph.add_edges_from((labels[source], labels[target])
+                             for source, target in zip(self.edge_sources, self.edge_targets))
+        return graph
+
+    def state(self):
+        """
+        :return: a json serializable dict of the graph, for from_state.
+        """
+        return {'ids': self.ids, 'titles': self.titles, 'degrees': self.degrees.tolist(),
+                'edges': [self.edge_sources.tolist(), self.edge_targets.tolist()]}
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        rebuild a graph saved with state().
+        :param state: the dict made by state().
+        :return: the CompactGraphBuilder.
+        """
+        builder = cls()
+        builder.ids = list(state['ids'])
+        builder.titles = list(state['titles'])
+        builder.degrees = array('i', state['degrees'])
+        builder.index = dict((channel_id, index) for index, channel_id in enumerate(builder.ids))
+        for channel_id, title in zip(builder.ids, builder.titles):
+            builder._add_title_label(channel_id, title)
+        builder.edge_sources = array('i', state['edges'][0])
+        builder.edge_targets = array('i', state['edges'][1])
+        builder.edge_keys = set(cls._edge_key(source, target) for source, target in
+                                zip(builder.edge_sources, builder.edge_targets))
+        return builder
@@ -0,0 +1,293 @@
+"""
+Persistent storage of channel details between runs of the youtube graphing script.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.yt_graph_cache')
+CACHE_FILENAME = 'channels.sqlite'
+
+# hours before a cached channel is fetched from the api again.
+DEFAULT_CACHE_TTL = 24.0
+# the most channels kept in the cache, before the soonest to expire are evicted.
+DEFAULT_CACHE_SIZE = 100000
+
+
+class ChannelCache(object):
+    """
+    an sqlite backed cache of channel titles and featured channels, keyed by channel id.
+    each entry records when it was fetched and when it expires.
+    the etags of api responses are kept too, so entries can be revalidated with conditional
+    requests rather than fetched again. the channels of each request are remembered, so later
+    requests can be split into the same chunks and revalidated.
+    the cache may be shared between threads.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_CACHE_TTL,
+                 max_entries=DEFAULT_CACHE_SIZE, bypass=False, revalidate=False):
+        """
+        open, or create, the cache in a given directory.
+        :param cache_dir: the directory holding the cache file.
+        :param ttl: default hours an entry stays valid for.
+        :param max_entries: the most entries to keep.
+        :param bypass: if True, never read from the cache, but still store fresh entries.
+        :param revalidate: if True, never trust an entry without asking the api whether it has
+            changed, through a conditional request.
+        :return:
+        """
+        if ttl is None or ttl < 0:
+            raise RuntimeError("""Error in ChannelCache(d, t, m, b):
+                               't' should be zero or a positive number of hours.""")
+        if max_entries is None or max_entries < 1:
+            raise RuntimeError("""Error in ChannelCache(d, t, m, b):
+                               'm' should be a positive integer.""")
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.path = os.path.join(cache_dir, CACHE_FILENAME)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.revalidate = revalidate
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS channels (
+                                    id TEXT PRIMARY KEY, title TEXT, featured TEXT,
+                                    fetched REAL, expires REAL)""")
+            self.connection.execute("""CREATE INDEX IF NOT EXISTS channels_expires
+                                    ON channels (expires)""")
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(channels)')]
+            # caches made before etags were kept need the column added.
+            if 'etag' not in columns:
+                self.connection.execute('ALTER TABLE channels ADD COLUMN etag TEXT')
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                    ids TEXT PRIMARY KEY, etag TEXT, returned TEXT)""")
+            # the request each channel was last sent in, keyed as in responses.
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS response_members (
+                                    id TEXT PRIMARY KEY, ids TEXT)""")
+
+    def get(self, channel_id):
+        """
+        get the cached details of a channel.
+        :param channel_id: the id of the channel.
+        :return: (title, list of associated channel ids), or None if missing or expired.
+        """
+        return self.get_many([channel_id]).get(channel_id)
+
+    def get_many(self, channel_ids):
+        """
+        get the cached details of many channels.
+        :param channel_ids: the ids of the channels.
+        :return: dict of channel id to (title, list of associated channel ids), for every
+            channel with an entry that has not expired.
+        """
+        channel_ids = list(channel_ids)
+        details = dict()
+        if self.bypass or self.revalidate:
+            with self.lock:
+                self.misses += len(channel_ids)
+            return details
+        return self._select(channel_ids, time.time())
+
+    def get_stale_many(self, channel_ids):
+        """
+        get the cached details of many channels, whether or not they have expired.
+        :param channel_ids: the ids of the channels.
+        :return: dict of channel id to (title, list of associated channel ids).
+        """
+        return self._select(list(channel_ids), None)
+
+    def get_etags(self, channel_ids):
+        """
+        get the stored etags of many channels, whether or not they have expired.
+        :param channel_ids: the ids of the channels.
+        :return: dict of channel id to the etag of its api resource, for every channel with one.
+        """
+        channel_ids = list(channel_ids)
+        etags = dict()
+        with self.lock:
+            for start in range(0, len(channel_ids), 500):
+                chunk = channel_ids[start:start + 500]
+                etags.update(self.connection.execute(
+                    'SELECT id, etag FROM channels WHERE etag IS NOT NULL AND id IN (' +
+                    ','.join('?' * len(chunk)) + ')', chunk).fetchall())
+        return etags
+
+    def _select(self, channel_ids, now):
+        """
+        read entries from the cache.
+        :param channel_ids: list of the ids of the channels.
+        :param now: only entries expiring after this time are read. if None, read any entry.
+        :return: dict of channel id to (title, list of associated channel ids).
+        """
+        details = dict()
+        expiry = -1 if now is None else now
+        with self.lock:
+            # stay under sqlite's limit on query parameters.
+            for start in range(0, len(channel_ids), 500):
+                chunk = channel_ids[start:start + 500]
+                rows = self.connection.execute(
+                    'SELECT id, title, featured FROM channels WHERE expires > ? AND id IN (' +
+                    ','.join('?' * len(chunk)) + ')', [expiry] + chunk).fetchall()
+                for channel_id, title, featured in rows:
+                    details[channel_id] = (title, json.loads(featured))
+            if now is not None:
+                self.hits += len(details)
+                self.misses += len(set(channel_ids)) - len(details)
+        return details
+
+    def put(self, channel_id, title, featured, ttl=None):
+        """
+        store the details of a channel.
+        :param channel_id: the id of the channel.
+        :param title: the title of the channel.
+        :param featured: list of associated channel ids, or None if unavailable.
+        :param ttl: hours the entry stays valid for. if None, the cache default is used.
+        :return:
+        """
+        self.put_many({channel_id: (title, featured)}, ttl)
+
+    def put_many(self, details, ttl=None, etags=None):
+        """
+        store the details of many channels, then evict entries beyond the size limit.
+        :param details: dict of channel id to (title, list of associated channel ids).
+        :param ttl: hours the entries stay valid for. if None, the cache default is used.
+        :param etags: dict of channel id to the etag of its api resource, if known. a channel
+            without one keeps its stored etag, if its details are unchanged. when revalidating,
+            channels whose etag is unchanged are counted as not modified.
+        :return:
+        """
+        if len(details) == 0:
+            return
+        if ttl is None:
+            ttl = self.ttl
+        etags = dict(etags or {})
+        now = time.time()
+        expires = now + ttl * 3600
+        channel_ids = list(details)
+        with self.lock, self.connection:
+            for start in range(0, len(channel_ids), 500):
+                chunk = channel_ids[start:start + 500]
+                for channel_id, title, featured, etag in self.connection.execute(
+                        'SELECT id, title, featured, etag FROM channels WHERE id IN (' +
+                        ','.join('?' * len(chunk)) + ')', chunk):
+                    if etags.get(channel_id) is None:
+                        if (title, json.loads(featured)) == tuple(details[channel_id]):
+                            etags[channel_id] = etag
+                    elif self.revalidate and etags[channel_id] == etag:
+                        self.not_modified += 1
+            self.connection.executemany(
+                """INSERT OR REPLACE INTO channels (id, title, featured, fetched, expires, etag)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                [(channel_id, title, json.dumps(featured), now, expires, etags.get(channel_id))
+                 for channel_id, (title, featured) in details.items()])
+            self._evict()
+
+    def refresh_many(self, details):
+        """
+        renew the entries of channels the api reported as not modified.
+        :param details: dict of channel id to (title, list of associated channel ids).
+        :return:
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany('UPDATE channels SET fetched = ?, expires = ? WHERE id = ?',
+                                        [(now, now + self.ttl * 3600, channel_id)
+                                         for channel_id in details])
+            self.not_modified += len(details)
+
+    def get_response_etag(self, channel_ids):
+        """
+        get the etag of the last api response for a request of exactly these channels.
+        :param channel_ids: the ids of the channels in the request, in order.
+        :return: (etag, list of the channel ids the response held), or None if unknown.
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT etag, returned FROM responses WHERE ids = ?',
+                                          (','.join(channel_ids),)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put_response_etag(self, channel_ids, etag, returned_ids):
+        """
+        store the etag of an api response.
+        :param channel_ids: the ids of the channels in the request, in order.
+        :param etag: the etag of the response.
+        :param returned_ids: the ids of the channels the response held.
+        :return:
+        """
+        key = ','.join(channel_ids)
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)',
+                                    (key, etag, json.dumps(returned_ids)))
+            self.connection.executemany('INSERT OR REPLACE INTO response_members VALUES (?, ?)',
+                                        [(channel_id, key) for channel_id in channel_ids])
+            # replaced rows get a new rowid, so the lowest rowids are the oldest responses.
+            cursor = self.connection.execute("""DELETE FROM responses WHERE rowid <= (
+                                             SELECT MAX(rowid) FROM responses) - ?""",
+                                             (self.max_entries,))
+            if cursor.rowcount > 0:
+                self.connection.execute("""DELETE FROM response_members WHERE ids NOT IN (
+                                        SELECT ids FROM responses)""")
+
+    def get_response_chunks(self, channel_ids):
+        """
+        find earlier requests made up only of some of these channels, so they can be sent
+        again as they were, and revalidated with the etag of their response.
+        :param channel_ids: the ids of the channels to look up.
+        :return: list of the channel ids of each earlier request, in the order the first of
+            their channels is given. no channel is in more than one request.
+        """
+        channel_ids = list(channel_ids)
+        keys = dict()
+        with self.lock:
+            for start in range(0, len(channel_ids), 500):
+                chunk = channel_ids[start:start + 500]
+                keys.update(self.connection.execute(
+                    'SELECT m.id, m.ids FROM response_members m JOIN responses r ' +
+                    'ON r.ids = m.ids WHERE m.id IN (' + ','.join('?' * len(chunk)) + ')',
+                    chunk).fetchall())
+        wanted = set(channel_ids)
+        chunked = set()
+        chunks = list()
+        for channel_id in channel_ids:
+            if channel_id not in keys or channel_id in chunked:
+                continue
+            id_chunk = keys[channel_id].split(',')
+            if wanted.issuperset(id_chunk) and chunked.isdisjoint(id_chunk):
+                chunks.append(id_chunk)
+                chunked.update(id_chunk)
+        return chunks
+
+    def _evict(self):
+        """
+        remove the entries closest to expiry until the cache fits its size limit.
+        :return:
+        """
+        count = self.connection.execute('SELECT COUNT(*) FROM channels').fetchone()[0]
+        if count > self.max_entries:
+            self.connection.execute("""DELETE FROM channels WHERE id IN (
+                                    SELECT id FROM channels ORDER BY expires LIMIT ?)""",
+                                    (count - self.max_entries,))
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM channels').fetchone()[0]
+
+    def close(self):
+        """
+        close the connection to the cache file.
+        :return:
+        """
+        with self.lock:
+            self.connection.close()
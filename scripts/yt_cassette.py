@@ -0,0 +1,310 @@
+"""
+Recording and replaying the youtube api, for the youtube graphing script.
+A RecordingHttp transport saves every channel a crawl is sent by the api to a cassette file.
+A FakeYoutubeServer serves a cassette over http, with the discovery document, a chosen
+latency and a share of requests refused for load, as a local stand-in for the api, so whole
+runs of the script can be repeated and load tested without the network or api quota.
+
+Run this module to serve a cassette:
+    python yt_cassette.py <cassette> [--port <port>] [--latency <seconds>]
+then run the script with '--api_url http://127.0.0.1:<port>/'.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:     # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+try:
+    from scripts.yt_compression import open_file
+except ImportError:
+    from yt_compression import open_file
+
+
+CASSETTE_VERSION = 1
+# where the api's discovery document, and its channels, are served, relative to the root url.
+DISCOVERY_PATH = 'discovery/v1/apis/youtube/v3/rest'
+SERVICE_PATH = 'youtube/v3/'
+CHANNELS_PATH = SERVICE_PATH + 'channels'
+# refusals served for a server's error rate, as the api sends them when under load.
+LOAD_ERRORS = [(403, {'error': {'errors': [{'reason': 'rateLimitExceeded'}]}}),
+               (429, None), (503, None)]
+
+
+def _etag(data):
+    """
+    :param data: a json serializable resource.
+    :return: an etag for the resource, which changes when it does.
+    """
+    return '"' + hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest() + '"'
+
+
+class Cassette(object):
+    """
+    the channel resources sent by the api, by channel id. channels the api was asked for but
+    did not send are kept as None, so a replay does not send them either.
+    a cassette may be shared between threads.
+    """
+
+    def __init__(self, filename=None):
+        """
+        :param filename: the file the cassette is saved to. if it exists, its channels are
+            loaded, and new recordings are added to them.
+        :return:
+        """
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.channels = dict()
+        if filename is not None and os.path.isfile(filename):
+            with open_file(filename, 'r') as f_handle:
+                content = json.load(f_handle)
+            if content.get('version') != CASSETTE_VERSION:
+                raise RuntimeError("""Error in Cassette(f): 'f' was written by an unsupported
+                                   version of the cassette format.""")
+            self.channels.update(content['channels'])
+
+    def record(self, uri, content):
+        """
+        record a response of the api. only channels.list responses are kept.
+        :param uri: the uri requested.
+        :param content: the body of the response, as bytes or text.
+        :return:
+        """
+        url = urlparse(uri)
+        if not url.path.endswith('/channels'):
+            return
+        requested = parse_qs(url.query).get('id', [''])[0].split(',')
+        if not isinstance(content, str):
+            content = content.decode('utf-8')
+        items = dict((item['id'], item) for item in json.loads(content).get('items', []))
+        with self.lock:
+            for channel_id in requested:
+                if channel_id:
+                    self.channels[channel_id] = items.get(channel_id)
+
+    def response(self, channel_ids):
+        """
+        :param channel_ids: the ids of the channels requested.
+        :return: the channels.list response the api recorded for the channels.
+        """
+        with self.lock:
+            items = [self.channels[channel_id] for channel_id in channel_ids
+                     if self.channels.get(channel_id) is not None]
+        return {'kind': 'youtube#channelListResponse', 'etag': _etag(items),
+                'pageInfo': {'totalResults': len(items), 'resultsPerPage': len(items)},
+                'items': items}
+
+    def save(self, filename=None):
+        """
+        write the cassette to a file.
+        :param filename: the file to write to. if None, the file the cassette was made with.
+        :return:
+        """
+        with self.lock:
+            content = {'version': CASSETTE_VERSION, 'channels': self.channels}
+            with open_file(filename or self.filename, 'w') as f_handle:
+                f_handle.write(json.dumps(content, sort_keys=True, indent=1))
+
+    @classmethod
+    def from_channels(cls, channels):
+        """
+        make a cassette of made up channels, e.g. for tests and benchmarks.
+        :param channels: dict of channel id -> (title, featured channel ids).
+        :return: the Cassette.
+        """
+        cassette = cls()
+        for channel_id, (title, featured) in channels.items():
+            channel = {'title': title, 'featuredChannelsUrls': featured}
+            cassette.channels[channel_id] = {
+                'kind': 'youtube#channel', 'etag': _etag(channel), 'id': channel_id,
+                'brandingSettings': {'channel': channel}}
+        return cassette
+
+
+class RecordingHttp(object):
+    """
+    an http transport recording the responses of another into a cassette. it is otherwise
+    used just as the transport it wraps.
+    """
+
+    def __init__(self, http, cassette):
+        """
+        :param http: the httplib2.Http object to send requests with.
+        :param cassette: the Cassette to record to.
+        :return:
+        """
+        self.http = http
+        self.cassette = cassette
+
+    def request(self, uri, method='GET', body=None, headers=None, **options):
+        response, content = self.http.request(uri, method=method, body=body, headers=headers,
+                                              **options)
+        if method == 'GET' and response.status == 200:
+            self.cassette.record(uri, content)
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+class FakeYoutubeHandler(BaseHTTPRequestHandler):
+    """
+    answers discovery and channels.list requests from the cassette of its server.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body=None):
+        """
+        send a response, keeping the connection open.
+        :param status: the http status code.
+        :param body: the json serializable body, or None for an empty body.
+        :return:
+        """
+        content = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.most_in_flight = max(server.most_in_flight, server.in_flight)
+        try:
+            if server.latency > 0:
+                time.sleep(server.latency)
+            url = urlparse(self.path)
+            if url.path == '/' + DISCOVERY_PATH:
+                self._send(200, server.discovery_document)
+            elif url.path == '/' + CHANNELS_PATH:
+                channel_ids = parse_qs(url.query).get('id', [''])[0].split(',')
+                with server.lock:
+                    refusal = None
+                    if server.random.random() < server.error_rate:
+                        refusal = server.random.choice(LOAD_ERRORS)
+                        server.throttled += 1
+                    else:
+                        server.request_count += 1
+                        server.ids_requested += len(channel_ids)
+                if refusal is not None:
+                    self._send(*refusal)
+                    return
+                body = server.cassette.response(channel_ids)
+                if self.headers.get('If-None-Match') == body['etag']:
+                    with server.lock:
+                        server.not_modified += 1
+                    self._send(304)
+                else:
+                    self._send(200, body)
+            else:
+                self._send(404, {'error': {'code': 404, 'message': 'Not Found'}})
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeYoutubeServer(ThreadingMixIn, HTTPServer):
+    """
+    a local http stand-in for the youtube data api, replaying a cassette. it is served from a
+    background thread once made. each request is answered by its own thread, after the
+    server's latency, so many requests may be in flight at once.
+    the requests answered, refused and not modified are counted.
+    """
+    daemon_threads = True
+
+    def __init__(self, cassette, latency=0.0, discovery_document=None, port=0, error_rate=0.0,
+                 seed=1):
+        """
+        :param cassette: the Cassette to serve channels from.
+        :param latency: seconds to wait before answering each request.
+        :param discovery_document: the parsed discovery document to serve. its urls are
+            pointed at the server. if None, the copy shipped with google-api-python-client is
+            used.
+        :param port: the port to serve on. if 0, a free port is chosen.
+        :param error_rate: the share of channels requests refused for load, with one of
+            LOAD_ERRORS.
+        :param seed: seed for choosing which requests are refused.
+        :return:
+        """
+        HTTPServer.__init__(self, ('127.0.0.1', port), FakeYoutubeHandler)
+        self.cassette = cassette
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.request_count = 0
+        self.ids_requested = 0
+        self.throttled = 0
+        self.not_modified = 0
+        if discovery_document is None:
+            from googleapiclient.discovery_cache import get_static_doc
+            discovery_document = json.loads(get_static_doc('youtube', 'v3'))
+        self.discovery_document = dict(
+            discovery_document, rootUrl=self.root_url,
+            baseUrl=self.root_url + discovery_document.get('servicePath', ''))
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def root_url(self):
+        return 'http://127.0.0.1:%d/' % self.server_address[1]
+
+    @property
+    def service_url(self):
+        """
+        :return: the url the api's resources are served under, e.g. for yt_async's base_url.
+        """
+        return self.root_url + SERVICE_PATH
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main_function():    # pragma: no cover
+    """
+    serve a cassette until interrupted.
+    :return:
+    """
+    parser = argparse.ArgumentParser(description="Serve a cassette recorded with the youtube " +
+                                     "graphing script's --record option, as a local stand-in " +
+                                     "for the youtube api.")
+    parser.add_argument('cassette', help="The cassette file to serve.")
+    parser.add_argument('--port', type=int, default=8080, help="The port to serve on.")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="Seconds to wait before answering each request.")
+    arguments = parser.parse_args()
+    server = FakeYoutubeServer(Cassette(arguments.cassette), latency=arguments.latency,
+                               port=arguments.port)
+    print('Serving ' + str(len(server.cassette.channels)) + ' channels. Run the script with ' +
+          "'--api_url " + server.root_url + "'.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main_function()
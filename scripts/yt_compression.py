@@ -0,0 +1,97 @@
+"""
+Transparent compression of the youtube graphing script's files.
+Files named with a .gz, .bz2 or .xz suffix are written and read through the matching
+compressor, so output is compressed as it is written, without a second pass.
+Files written in full before being used are moved into place with replace_file, so a reader
+never sees one half written.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import bz2
+import gzip
+import io
+import os
+
+
+# compression -> the suffix of files compressed with it.
+COMPRESSION_SUFFIXES = {'gz': '.gz', 'bz2': '.bz2', 'xz': '.xz'}
+COMPRESSIONS = sorted(COMPRESSION_SUFFIXES)
+
+
+def compression_of(filename):
+    """
+    :param filename: the name of a file.
+    :return: the compression its suffix names, or None if it is not compressed.
+    """
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if filename.endswith(suffix):
+            return compression
+    return None
+
+
+def strip_compression(filename):
+    """
+    :param filename: the name of a file.
+    :return: the filename without any compression suffix.
+    """
+    compression = compression_of(filename)
+    if compression is None:
+        return filename
+    return filename[:-len(COMPRESSION_SUFFIXES[compression])]
+
+
+def compressed_filename(filename, compression):
+    """
+    :param filename: the name of a file.
+    :param compression: one of COMPRESSIONS, or None.
+    :return: the filename with the suffix of the compression, if it does not have it already.
+    """
+    if compression is None or compression_of(filename) == compression:
+        return filename
+    return strip_compression(filename) + COMPRESSION_SUFFIXES[compression]
+
+
+def open_file(filename, mode='rb'):
+    """
+    open a file, through a compressor if its suffix names one.
+    :param filename: the name of the file.
+    :param mode: 'r', 'w' or 'a', with 'b' for bytes. text is encoded as utf-8.
+    :return: the file object.
+    """
+    text = 'b' not in mode
+    binary_mode = mode.replace('t', '').replace('b', '') + 'b'
+    compression = compression_of(filename)
+    if compression is None:
+        if text:
+            return io.open(filename, binary_mode[:-1], encoding='utf-8')
+        return io.open(filename, binary_mode)
+    if compression == 'gz':
+        f_handle = gzip.GzipFile(filename, binary_mode)
+    elif compression == 'bz2':
+        f_handle = bz2.BZ2File(filename, binary_mode)
+    else:
+        try:
+            import lzma
+        except ImportError:     # pragma: no cover
+            raise RuntimeError("""Error in open_file(f, m): 'f' is xz compressed, which requires
+                               python 3.3 or later.""")
+        f_handle = lzma.LZMAFile(filename, binary_mode)
+    if text:
+        return io.TextIOWrapper(f_handle, encoding='utf-8')
+    return f_handle
+
+
+def replace_file(source, destination):
+    """
+    move a file into place, atomically replacing any file already there.
+    :param source: the name of the file to move.
+    :param destination: the name to move it to.
+    :return:
+    """
+    try:
+        os.replace(source, destination)
+    # python 2 has no os.replace
+    except AttributeError:      # pragma: no cover
+        if os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
@@ -0,0 +1,346 @@
+#!/usr/env python
+"""
+Sharded crawling for the youtube graphing script.
+A coordinator (yt_script.py run with --work_queue) keeps the frontier and processed channels,
+and splits the lookups of each degree into tasks on a shared sqlite queue. Worker processes,
+on the same host or any host that can reach the queue file, lease tasks, fetch the channels
+from the api and hand back their titles and featured channels.
+A lease that is not completed in time expires, so workers may be stopped and restarted freely.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import time
+
+try:
+    from scripts import yt_script
+    from scripts.yt_cache import ChannelCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL
+    from scripts.yt_quota import QuotaExhaustedError, DEFAULT_DAILY_QUOTA
+except ImportError:
+    import yt_script
+    from yt_cache import ChannelCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL
+    from yt_quota import QuotaExhaustedError, DEFAULT_DAILY_QUOTA
+
+
+# seconds a worker holds a task before it may be given to another worker.
+DEFAULT_LEASE_TIME = 120.0
+# seconds between checks of the queue, while waiting on tasks or results.
+DEFAULT_POLL_INTERVAL = 0.5
+# seconds to wait for a busy queue file before giving up.
+QUEUE_TIMEOUT = 60.0
+# seconds without a finished task before warning that no worker may be running.
+DEFAULT_WAIT_WARNING = 60.0
+
+
+class CrawlQueue(object):
+    """
+    a queue of channel lookup tasks, held in an sqlite file shared by the coordinator and
+    workers. each task is a batch of no more than MAX_IDS_PER_REQUEST channel ids.
+    """
+
+    def __init__(self, path, lease_time=DEFAULT_LEASE_TIME):
+        """
+        open, or create, a queue file.
+        :param path: the path of the queue file.
+        :param lease_time: seconds a leased task stays with its worker.
+        :return:
+        """
+        if lease_time is None or lease_time <= 0:
+            raise RuntimeError("""Error in CrawlQueue(p, l):
+                               'l' should be a positive number of seconds.""")
+        self.path = path
+        self.lease_time = lease_time
+        # transactions are managed explicitly, so leases are taken atomically between processes.
+        self.connection = sqlite3.connect(path, timeout=QUEUE_TIMEOUT, isolation_level=None)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS tasks (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT, channel_ids TEXT,
+                                state TEXT, worker TEXT, lease_expires REAL, details TEXT)""")
+        self.connection.execute('CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state)')
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(tasks)')]
+        # queues made before etags were handed back need the column added.
+        if 'etags' not in columns:
+            self.connection.execute('ALTER TABLE tasks ADD COLUMN etags TEXT')
+
+    def put(self, channel_ids, cache=None):
+        """
+        add tasks to look up channels.
+        :param channel_ids: the ids of the channels to look up.
+        :param cache: a revalidating ChannelCache, whose earlier requests are kept together in
+            a task, so workers can revalidate them.
+        :return: list of the new task ids, in order.
+        """
+        task_ids = list()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            for id_chunk in yt_script.chunk_channel_ids(list(channel_ids), cache):
+                cursor = self.connection.execute(
+                    "INSERT INTO tasks (channel_ids, state) VALUES (?, 'pending')",
+                    (json.dumps(id_chunk),))
+                task_ids.append(cursor.lastrowid)
+            self.connection.execute('COMMIT')
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+        return task_ids
+
+    def lease(self, worker, count=1):
+        """
+        take pending tasks, or tasks whose lease has expired.
+        :param worker: the id of the worker taking the tasks.
+        :param count: the most tasks to take.
+        :return: list of (task id, list of channel ids).
+        """
+        now = time.time()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = self.connection.execute(
+                """SELECT id, channel_ids FROM tasks WHERE state = 'pending' OR
+                (state = 'leased' AND lease_expires < ?) ORDER BY id LIMIT ?""",
+                (now, count)).fetchall()
+            self.connection.executemany(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_expires = ? WHERE id = ?",
+                [(worker, now + self.lease_time, task_id) for task_id, _ in rows])
+            self.connection.execute('COMMIT')
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+        return [(task_id, json.loads(channel_ids)) for task_id, channel_ids in rows]
+
+    def complete(self, task_id, worker, details, etags=None):
+        """
+        hand back the results of a leased task.
+        :param task_id: the id of the task.
+        :param worker: the id of the worker holding the lease.
+        :param details: dict of channel id to (title, list of associated channel ids).
+        :param etags: dict of channel id to the etag of its api resource, for the channels
+            fetched from the api.
+        :return: True if accepted, False if the lease had passed to another worker.
+        """
+        cursor = self.connection.execute(
+            """UPDATE tasks SET state = 'done', details = ?, etags = ? WHERE id = ? AND
+            state = 'leased' AND worker = ?""",
+            (json.dumps(details), json.dumps(etags or {}), task_id, worker))
+        return cursor.rowcount == 1
+
+    def collect(self, task_ids, etags=None):
+        """
+        take the results of finished tasks off the queue.
+        :param task_ids: the ids of the tasks to collect.
+        :param etags: a dict to add the etags handed back with the tasks to.
+        :return: dict of task id to details, for each finished task.
+        """
+        task_ids = list(task_ids)
+        results = dict()
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.connection.execute(
+                    "SELECT id, details, etags FROM tasks WHERE state = 'done' AND id IN (" +
+                    placeholders + ')', chunk).fetchall()
+                self.connection.executemany('DELETE FROM tasks WHERE id = ?',
+                                            [(task_id,) for task_id, _, _ in rows])
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+            for task_id, details, task_etags in rows:
+                results[task_id] = dict((channel_id, tuple(detail))
+                                        for channel_id, detail in json.loads(details).items())
+                if etags is not None and task_etags is not None:
+                    etags.update(json.loads(task_etags))
+        return results
+
+    def __len__(self):
+        """
+        :return: the number of tasks not yet finished.
+        """
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM tasks WHERE state != 'done'").fetchone()[0]
+
+    def close(self):
+        """
+        close the connection to the queue file.
+        :return:
+        """
+        self.connection.close()
+
+
+class QueueFetcher(object):
+    """
+    looks up channel details for build_graph, by queueing the lookups for workers and waiting
+    on their results. while no task is finished, it warns periodically that no worker may be
+    running.
+    """
+
+    def __init__(self, queue, cache=None, poll_interval=DEFAULT_POLL_INTERVAL,
+                 wait_warning=DEFAULT_WAIT_WARNING, timeout=None, logger=None):
+        """
+        :param queue: the CrawlQueue shared with the workers.
+        :param cache: a ChannelCache to read channel details from first.
+        :param poll_interval: seconds between checks for finished tasks.
+        :param wait_warning: seconds without a finished task between warnings.
+        :param timeout: seconds without a finished task before giving up. if None, wait until
+            the tasks are finished.
+        :param logger: logging object to warn through.
+        :return:
+        """
+        self.queue = queue
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.wait_warning = wait_warning
+        self.timeout = timeout
+        self.logger = logger
+
+    def __call__(self, channel_ids, failed=None):
+        """
+        look up channel details, in the same form as yt_script.get_channel_details.
+        :param channel_ids: the ids of the channels to look up.
+        :param failed: unused. workers hand back whatever details they could retrieve.
+        :return: dict of channel id to (title, associate ids).
+        """
+        channel_ids = list(channel_ids)
+        details = dict()
+        if self.cache is not None:
+            details.update(self.cache.get_many(channel_ids))
+        unresolved_ids = [channel_id for channel_id in channel_ids if channel_id not in details]
+        task_ids = self.queue.put(unresolved_ids, self.cache)
+        results = dict()
+        etags = dict()
+        progress = warned = time.time()
+        while len(results) < len(task_ids):
+            finished = len(results)
+            results.update(self.queue.collect((task_id for task_id in task_ids
+                                               if task_id not in results), etags))
+            now = time.time()
+            if len(results) > finished:
+                progress = warned = now
+            elif self.timeout is not None and now - progress >= self.timeout:
+                raise RuntimeError("""Error in QueueFetcher:
+                                   no task was finished in {} seconds. the unfinished tasks are
+                                   left on the queue.""".format(self.timeout))
+            elif now - warned >= self.wait_warning:
+                yt_script.declare_warning(self.logger, (
+                    'No task has been finished for {:.0f} seconds, with {} of {} waiting. Is a '
+                    'worker running? Start one with "yt_distributed.py {} <api_key>".').format(
+                        now - progress, len(task_ids) - len(results), len(task_ids),
+                        self.queue.path))
+                warned = now
+            if len(results) < len(task_ids):
+                time.sleep(self.poll_interval)
+        # merged in task order, so the graph is built as in the serial path.
+        for task_id in task_ids:
+            details.update(results[task_id])
+            if self.cache is not None:
+                self.cache.put_many(results[task_id], etags=etags)
+        return details
+
+
+def run_worker(queue, api, worker=None, cache=None, batch_size=1, idle_timeout=None,
+               poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    lease tasks from a queue, look up their channels and hand back the results.
+    :param queue: the CrawlQueue to work from.
+    :param api: the google api object.
+    :param worker: the id of this worker. if None, one is made from the host name and pid.
+    :param cache: a ChannelCache to read channel details from first.
+    :param batch_size: how many tasks to lease at once.
+    :param idle_timeout: seconds without work before the worker stops. if None, never stop.
+    :param poll_interval: seconds between checks for new tasks.
+    :return: the number of tasks completed.
+    """
+    if worker is None:
+        worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+    completed = 0
+    idle_since = time.time()
+    while idle_timeout is None or time.time() - idle_since < idle_timeout:
+        tasks = queue.lease(worker, batch_size)
+        if len(tasks) == 0:
+            time.sleep(poll_interval)
+            continue
+        for task_id, channel_ids in tasks:
+            etags = dict()
+            details = yt_script.get_channel_details(channel_ids, api, cache, etags=etags)
+            if queue.complete(task_id, worker, details, etags):
+                completed += 1
+        idle_since = time.time()
+    return completed
+
+
+def setup_arg_parser():
+    """
+    prepare and set up the argumentParser for a worker
+    :return: the argumentParser
+    """
+    parser = argparse.ArgumentParser(description="""Look up channels for a crawl coordinated
+                                                 through a shared work queue.""")
+    parser.add_argument('queue', action='store', type=str,
+                        help="The work queue file given to the coordinator with --work_queue.")
+    parser.add_argument('api_key', action='store', type=str,
+                        help="The api key with which to access the youtube API.")
+    parser.add_argument('-b', '--batch_size', action='store', type=int, default=1,
+                        help="How many tasks, of up to 50 channels each, to lease at once. " +
+                        "Default is 1.")
+    parser.add_argument('-l', '--lease_time', action='store', type=float,
+                        default=DEFAULT_LEASE_TIME,
+                        help="Seconds before an unfinished task is given to another worker. " +
+                        "Default is " + str(DEFAULT_LEASE_TIME) + ".")
+    parser.add_argument('-i', '--idle_timeout', action='store', type=float, default=None,
+                        help="Seconds without work before the worker stops. If omitted, the " +
+                        "worker runs until interrupted.")
+    parser.add_argument('--cache_dir', action='store', type=str, default=DEFAULT_CACHE_DIR,
+                        help="A directory to cache channel details in between runs.")
+    parser.add_argument('--cache_ttl', action='store', type=float, default=DEFAULT_CACHE_TTL,
+                        help="Hours before a cached channel is fetched from the api again.")
+    parser.add_argument('--bypass_cache', action='store_true', default=False,
+                        help="Fetch every channel from the api, ignoring cached details.")
+    parser.add_argument('--recrawl', action='store_true', default=False,
+                        help="Ask the api whether each cached channel has changed, with " +
+                        "conditional (etag) requests, as the coordinator's --recrawl does.")
+    parser.add_argument('--api_keys', action='store', type=str, default=None,
+                        help="A file listing further api keys, one per line, to share the " +
+                        "requests with once a key's quota is spent.")
+    parser.add_argument('--daily_quota', action='store', type=int, default=DEFAULT_DAILY_QUOTA,
+                        help="The quota units each api key may spend in a day.")
+    parser.add_argument('--wait_for_quota', action='store_true', default=False,
+                        help="When every api key has spent its quota, wait for the quotas to " +
+                        "reset instead of stopping. The tasks of a stopped worker pass to " +
+                        "other workers once their leases expire.")
+    return parser
+
+
+def main_function():
+    """
+    the runner function of a worker
+    :return:
+    """
+    arguments = setup_arg_parser().parse_args()
+    if arguments.batch_size < 1:
+        print("ERROR:  '-b <batch_size>': <batch_size> should be a positive integer.")
+        return
+    queue = CrawlQueue(arguments.queue, lease_time=arguments.lease_time)
+    cache = ChannelCache(arguments.cache_dir, ttl=arguments.cache_ttl,
+                         bypass=arguments.bypass_cache, revalidate=arguments.recrawl)
+    key_pool = yt_script.create_key_pool(arguments)
+    try:
+        api = yt_script.create_pooled_api(
+            key_pool, discovery_document=yt_script.load_discovery_document(arguments.cache_dir))
+        completed = run_worker(queue, api, cache=cache, batch_size=arguments.batch_size,
+                               idle_timeout=arguments.idle_timeout)
+        print('Tasks completed: {}'.format(completed))
+    except QuotaExhaustedError as excp:
+        print('ERROR: ' + str(excp))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        key_pool.save()
+        cache.close()
+        queue.close()
+
+if __name__ == '__main__':
+    main_function()
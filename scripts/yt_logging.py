@@ -0,0 +1,179 @@
+"""
+Structured, non blocking logging for the youtube graphing script.
+At verbosity 3 a record is logged for every node and edge, so records are put on a queue and
+written as json lines by a background thread, instead of being formatted and written to the
+console by the crawl. Each record names its event, e.g. 'node' or 'edge', and the events can be
+sampled and rate limited, so large crawls are not slowed or flooded by their own log.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import atexit
+import json
+import logging
+import threading
+import time
+
+
+# the events the script logs.
+LOG_EVENTS = ['degree', 'warning', 'quota', 'processed', 'node', 'edge']
+
+# listeners still writing records, stopped at exit if not stopped before.
+_listeners = list()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    formats a record as one line of json. the message is only formatted with its arguments
+    here, on the thread writing the record. the event and fields given in the record's extra
+    are kept as keys of their own, as text if they are not json types.
+    """
+
+    def format(self, record):
+        entry = {'time': record.created, 'level': record.levelname,
+                 'function': record.funcName, 'line': record.lineno,
+                 'message': record.getMessage().strip()}
+        event = getattr(record, 'event', None)
+        if event is not None:
+            entry['event'] = event
+        entry.update(getattr(record, 'fields', None) or {})
+        dropped = getattr(record, 'dropped', 0)
+        if dropped:
+            entry['dropped'] = dropped
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, sort_keys=True, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    drops records of an event by a sample rate, and beyond a rate limit. records without an
+    event are kept. each kept record counts, as 'dropped', the records of its event dropped
+    since the last one kept.
+    """
+
+    def __init__(self, sample_rates=None, rate_limits=None):
+        """
+        :param sample_rates: dict of event to the fraction of its records to keep, e.g. 0.1 keeps
+            every tenth record. events not listed are all kept.
+        :param rate_limits: dict of event to the most records kept per second. bursts of up to
+            a second's worth are kept. events not listed are not limited.
+        :return:
+        """
+        logging.Filter.__init__(self)
+        self.sample_rates = dict(sample_rates or {})
+        self.rate_limits = dict(rate_limits or {})
+        self.lock = threading.Lock()
+        # event -> records seen
+        self.seen = dict()
+        # event -> records dropped since the last one kept
+        self.dropped = dict()
+        # event -> [records that may be kept now, time they were counted]
+        self.allowances = dict()
+
+    def _sampled(self, event):
+        """
+        :param event: the event of a record.
+        :return: True if the record is kept by the event's sample rate.
+        """
+        rate = self.sample_rates.get(event)
+        if rate is None:
+            return True
+        seen = self.seen.get(event, 0) + 1
+        self.seen[event] = seen
+        # a record is kept each time the kept share passes a whole record, so drops are even.
+        return int(seen * rate) > int((seen - 1) * rate)
+
+    def _allowed(self, event):
+        """
+        :param event: the event of a record.
+        :return: True if the record is within the event's rate limit.
+        """
+        limit = self.rate_limits.get(event)
+        if limit is None:
+            return True
+        now = time.time()
+        allowance = self.allowances.setdefault(event, [limit, now])
+        allowance[0] = min(limit, allowance[0] + (now - allowance[1]) * limit)
+        allowance[1] = now
+        if allowance[0] < 1:
+            return False
+        allowance[0] -= 1
+        return True
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        if event is None:
+            return True
+        with self.lock:
+            if not (self._sampled(event) and self._allowed(event)):
+                self.dropped[event] = self.dropped.get(event, 0) + 1
+                return False
+            record.dropped = self.dropped.pop(event, 0)
+        return True
+
+
+def start_queued_logging(logger, handler, sample_rates=None, rate_limits=None):
+    """
+    log through a queue, with the records written as json lines by a background thread.
+    :param logger: the Logger to log through the queue.
+    :param handler: the Handler to write the records with, e.g. a StreamHandler.
+    :param sample_rates: dict of event to the fraction of its records to keep.
+    :param rate_limits: dict of event to the most records of it to keep per second.
+    :return:
+    """
+    handler.setFormatter(JsonFormatter())
+    # records are sampled on the logging thread, so dropped records are never queued.
+    logger.addFilter(SamplingFilter(sample_rates, rate_limits))
+    try:
+        from logging.handlers import QueueHandler, QueueListener
+    except ImportError:     # pragma: no cover
+        # python 2 has no queue handlers, so writes the records as they are logged.
+        logger.addHandler(handler)
+        return
+    try:
+        import queue
+    except ImportError:     # pragma: no cover
+        import Queue as queue
+
+    class _LazyQueueHandler(QueueHandler):
+        """
+        queues records as they are, leaving their formatting to the listener.
+        """
+
+        def prepare(self, record):
+            return record
+
+    record_queue = queue.Queue()
+    listener = QueueListener(record_queue, handler)
+    listener.start()
+    _listeners.append(listener)
+    logger.listener = listener
+    logger.addHandler(_LazyQueueHandler(record_queue))
+
+
+def stop_logging(logger):
+    """
+    write any queued records, and remove the logger's handlers and filters.
+    :param logger: the Logger.
+    :return:
+    """
+    listener = getattr(logger, 'listener', None)
+    logger.listener = None
+    if listener in _listeners:
+        _listeners.remove(listener)
+        listener.stop()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    for log_filter in list(logger.filters):
+        if isinstance(log_filter, SamplingFilter):
+            logger.removeFilter(log_filter)
+
+
+@atexit.register
+def _stop_listeners():
+    """
+    write the records still queued when the script exits.
+    :return:
+    """
+    while _listeners:
+        _listeners.pop().stop()
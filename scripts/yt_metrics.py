@@ -0,0 +1,257 @@
+"""
+Crawl metrics for the youtube graphing script.
+Requests by endpoint and response code, request latency histograms, the nodes and edges added
+in each degree, the frontier, the cache hit rate and the time each output format takes are
+collected while the script runs, and written periodically as a json snapshot or in the
+prometheus text format, e.g. for the node exporter's textfile collector.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import json
+import threading
+import time
+
+try:
+    from scripts.yt_compression import replace_file
+except ImportError:
+    from yt_compression import replace_file
+
+
+# seconds between writes of the metrics file.
+DEFAULT_METRICS_INTERVAL = 15.0
+# upper bounds, in seconds, of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = 'yt_'
+
+
+def request_endpoint(request):
+    """
+    :param request: a google api request.
+    :return: the api method the request calls, e.g. 'channels.list'.
+    """
+    method_id = getattr(request, 'methodId', None) or 'unknown'
+    if method_id.startswith('youtube.'):
+        method_id = method_id[len('youtube.'):]
+    return method_id
+
+
+class CrawlMetrics(object):
+    """
+    metrics of a crawl and its output.
+    the metrics may be shared between threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        # (endpoint, response code) -> requests
+        self.requests = dict()
+        # endpoint -> [count in each of LATENCY_BUCKETS and above them, sum of seconds]
+        self.latencies = dict()
+        self.degree = 0
+        # degree -> the channels queued when the degree started, and the nodes and edges added.
+        self.frontier = dict()
+        self.nodes_added = dict()
+        self.edges_added = dict()
+        self.processed = 0
+        self.caches = list()
+        # output format -> seconds taken to write it
+        self.exports = dict()
+
+    def observe_request(self, endpoint, code, seconds):
+        """
+        count a request sent to the api.
+        :param endpoint: the api method, e.g. 'channels.list'.
+        :param code: the http status code of the response, or 'network' if none was received.
+        :param seconds: how long the request took.
+        :return:
+        """
+        with self.lock:
+            key = (endpoint, str(code))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if endpoint not in self.latencies:
+                self.latencies[endpoint] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            latency = self.latencies[endpoint]
+            bucket = 0
+            while bucket < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[bucket]:
+                bucket += 1
+            latency[bucket] += 1
+            latency[-1] += seconds
+
+    def degree_started(self, degree, frontier_size):
+        """
+        :param degree: the degree of separation now being crawled.
+        :param frontier_size: how many channels are queued for the degree.
+        :return:
+        """
+        with self.lock:
+            self.degree = degree
+            self.frontier[degree] = frontier_size
+
+    def node_added(self, degree):
+        with self.lock:
+            self.nodes_added[degree] = self.nodes_added.get(degree, 0) + 1
+
+    def edge_added(self, degree):
+        with self.lock:
+            self.edges_added[degree] = self.edges_added.get(degree, 0) + 1
+
+    def channel_processed(self):
+        with self.lock:
+            self.processed += 1
+
+    def track_cache(self, cache):
+        """
+        include the hits and misses of a ChannelCache in the metrics.
+        :param cache: the ChannelCache.
+        :return:
+        """
+        with self.lock:
+            self.caches.append(cache)
+
+    def observe_export(self, output_format, seconds):
+        """
+        :param output_format: an output format.
+        :param seconds: how long writing it took.
+        :return:
+        """
+        with self.lock:
+            self.exports[output_format] = seconds
+
+    def snapshot(self):
+        """
+        :return: a json serializable dict of the metrics.
+        """
+        with self.lock:
+            hits = sum(cache.hits for cache in self.caches)
+            misses = sum(cache.misses for cache in self.caches)
+            latencies = dict()
+            for endpoint, latency in self.latencies.items():
+                cumulative = 0
+                buckets = list()
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), latency[:-1]):
+                    cumulative += count
+                    buckets.append([bound, cumulative])
+                latencies[endpoint] = {'buckets': buckets, 'sum': latency[-1],
+                                       'count': cumulative}
+            return {
+                'uptime_seconds': time.time() - self.started,
+                'requests': [{'endpoint': endpoint, 'code': code, 'count': count}
+                             for (endpoint, code), count in sorted(self.requests.items())],
+                'request_seconds': latencies,
+                'degree': self.degree,
+                'frontier': self.frontier.get(self.degree, 0),
+                'frontier_by_degree': dict(self.frontier),
+                'nodes_added': dict(self.nodes_added),
+                'edges_added': dict(self.edges_added),
+                'channels_processed': self.processed,
+                'cache': {'hits': hits, 'misses': misses,
+                          'hit_rate': float(hits) / (hits + misses) if hits + misses else None},
+                'export_seconds': dict(self.exports)}
+
+    def to_prometheus(self):
+        """
+        :return: the metrics in the prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = list()
+
+        def _metric(name, metric_type, help_text, samples):
+            """
+            add a metric and its samples.
+            :param name: the metric's name, without the prefix.
+            :param metric_type: 'counter', 'gauge' or 'histogram'.
+            :param help_text: the description of the metric.
+            :param samples: list of (name suffix, dict of labels, value).
+            :return:
+            """
+            lines.append('# HELP ' + METRIC_PREFIX + name + ' ' + help_text)
+            lines.append('# TYPE ' + METRIC_PREFIX + name + ' ' + metric_type)
+            for suffix, labels, value in samples:
+                label_text = ','.join('{}="{}"'.format(key, labels[key]) for key in sorted(labels))
+                lines.append(METRIC_PREFIX + name + suffix +
+                             ('{' + label_text + '}' if label_text else '') + ' ' + repr(value))
+
+        _metric('api_requests_total', 'counter', 'Api requests by endpoint and response code.',
+                [('', {'endpoint': item['endpoint'], 'code': item['code']}, item['count'])
+                 for item in snapshot['requests']])
+        samples = list()
+        for endpoint, latency in sorted(snapshot['request_seconds'].items()):
+            samples.extend(('_bucket', {'endpoint': endpoint, 'le': bound}, count)
+                           for bound, count in latency['buckets'])
+            samples.append(('_sum', {'endpoint': endpoint}, latency['sum']))
+            samples.append(('_count', {'endpoint': endpoint}, latency['count']))
+        _metric('api_request_seconds', 'histogram', 'Api request latency.', samples)
+        _metric('crawl_degree', 'gauge', 'The degree of separation being crawled.',
+                [('', {}, snapshot['degree'])])
+        _metric('frontier_size', 'gauge', 'Channels queued for the current degree.',
+                [('', {}, snapshot['frontier'])])
+        _metric('nodes_added_total', 'counter', 'Nodes added to the graph, by degree.',
+                [('', {'degree': degree}, count)
+                 for degree, count in sorted(snapshot['nodes_added'].items())])
+        _metric('edges_added_total', 'counter', 'Edges added to the graph, by degree.',
+                [('', {'degree': degree}, count)
+                 for degree, count in sorted(snapshot['edges_added'].items())])
+        _metric('channels_processed_total', 'counter', 'Channels whose associates were added.',
+                [('', {}, snapshot['channels_processed'])])
+        _metric('cache_hits_total', 'counter', 'Channels read from the cache.',
+                [('', {}, snapshot['cache']['hits'])])
+        _metric('cache_misses_total', 'counter', 'Channels not found in the cache.',
+                [('', {}, snapshot['cache']['misses'])])
+        _metric('export_seconds', 'gauge', 'Seconds taken to write each output format.',
+                [('', {'format': output_format}, seconds)
+                 for output_format, seconds in sorted(snapshot['export_seconds'].items())])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filename):
+        """
+        write the metrics to a file, replacing it atomically so it is never read half written.
+        :param filename: the file to write to. a name ending in '.json' gets a json snapshot,
+            any other name the prometheus text format.
+        :return:
+        """
+        if filename.endswith('.json'):
+            text = json.dumps(self.snapshot(), indent=2, sort_keys=True)
+        else:
+            text = self.to_prometheus()
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'w') as f_handle:
+            f_handle.write(text)
+        replace_file(temp_filename, filename)
+
+
+class MetricsReporter(object):
+    """
+    writes metrics to a file periodically, from a background thread.
+    """
+
+    def __init__(self, metrics, filename, interval=DEFAULT_METRICS_INTERVAL):
+        """
+        :param metrics: the CrawlMetrics to write.
+        :param filename: the file to write to, as for CrawlMetrics.write.
+        :param interval: seconds between writes.
+        :return:
+        """
+        self.metrics = metrics
+        self.filename = filename
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            self.metrics.write(self.filename)
+
+    def start(self):
+        self.metrics.write(self.filename)
+        self.thread.start()
+
+    def stop(self):
+        """
+        stop writing periodically, and write the final metrics.
+        :return:
+        """
+        self.stopping.set()
+        self.thread.join()
+        self.metrics.write(self.filename)
@@ -0,0 +1,158 @@
+"""
+Per phase profiling for the youtube graphing script.
+Each phase of a run - verifying the arguments, each degree of the crawl, writing the output,
+rendering and showing the graph - is profiled with cProfile and tracemalloc, and written to a
+directory as a pstats file and a summary of the lines that allocated the most memory.
+The profilers are only imported when profiling, so a run without profiling is not slowed.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import contextlib
+import io
+import os
+import time
+
+
+# allocation sites listed in each phase's memory summary.
+DEFAULT_TOP_ALLOCATIONS = 25
+# stack frames kept for each allocation.
+TRACEMALLOC_FRAMES = 1
+SUMMARY_FILENAME = 'summary.txt'
+
+
+class PhaseProfiler(object):
+    """
+    profiles the phases of a run one at a time, writing the reports of each as it ends.
+    cProfile only sees the thread that starts a phase, so time spent by worker threads and
+    processes shows as time waiting on them.
+    """
+
+    def __init__(self, directory, top=DEFAULT_TOP_ALLOCATIONS):
+        """
+        :param directory: the directory to write the reports to. it is made if missing.
+        :param top: how many allocation sites to list for each phase.
+        :return:
+        """
+        self.directory = directory
+        self.top = top
+        # (phase, seconds, peak traced bytes or None) of each finished phase, in order.
+        self.phases = list()
+        self._phase = None
+        self._profile = None
+        self._started = None
+        self._tracing = False
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _filename(self, phase, suffix):
+        """
+        :param phase: the name of a phase.
+        :param suffix: the suffix of the report.
+        :return: the path of the phase's report. reports are numbered in the order run.
+        """
+        return os.path.join(self.directory,
+                            '{:02d}_{}{}'.format(len(self.phases) + 1, phase, suffix))
+
+    def start(self, phase):
+        """
+        start profiling a phase, ending any phase still being profiled.
+        :param phase: the name of the phase, used in the names of its reports.
+        :return:
+        """
+        import cProfile
+        self.stop()
+        try:
+            import tracemalloc
+        except ImportError:     # pragma: no cover
+            tracemalloc = None
+        # memory already traced by someone else is left to them.
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._tracing = True
+        self._phase = phase
+        self._started = time.time()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        """
+        end the phase being profiled, if any, and write its reports.
+        :return:
+        """
+        if self._phase is None:
+            return
+        self._profile.disable()
+        seconds = time.time() - self._started
+        peak = None
+        snapshot = None
+        if self._tracing:
+            import tracemalloc
+            peak = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__),
+                 tracemalloc.Filter(False, '<frozen importlib._bootstrap>')])
+            tracemalloc.stop()
+            self._tracing = False
+        self._profile.dump_stats(self._filename(self._phase, '.pstats'))
+        if snapshot is not None:
+            self._write_allocations(snapshot, peak)
+        self.phases.append((self._phase, seconds, peak))
+        self._write_summary()
+        self._phase = None
+        self._profile = None
+
+    def _write_allocations(self, snapshot, peak):
+        """
+        write the lines that allocated the most memory still held at the end of the phase.
+        :param snapshot: the tracemalloc snapshot taken at the end of the phase.
+        :param peak: the most memory traced at once during the phase, in bytes.
+        :return:
+        """
+        statistics = snapshot.statistics('lineno')
+        with io.open(self._filename(self._phase, '.memory.txt'), 'w',
+                     encoding='utf-8') as f_handle:
+            f_handle.write(u'phase: {}\npeak: {} bytes\nheld at end: {} bytes\n\n'.format(
+                self._phase, peak, sum(statistic.size for statistic in statistics)))
+            for statistic in statistics[:self.top]:
+                frame = statistic.traceback[0]
+                f_handle.write(u'{}:{}: {} bytes in {} blocks\n'.format(
+                    frame.filename, frame.lineno, statistic.size, statistic.count))
+
+    def _write_summary(self):
+        """
+        write the time and peak memory of each finished phase.
+        :return:
+        """
+        with io.open(os.path.join(self.directory, SUMMARY_FILENAME), 'w',
+                     encoding='utf-8') as f_handle:
+            for phase, seconds, peak in self.phases:
+                f_handle.write(u'{:<24} {:>10.3f}s {:>14} bytes peak\n'.format(
+                    phase, seconds, 'unknown' if peak is None else peak))
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        """
+        profile the body of a with statement as a phase.
+        :param phase: the name of the phase.
+        :return:
+        """
+        self.start(phase)
+        try:
+            yield
+        finally:
+            self.stop()
+
+
+@contextlib.contextmanager
+def profile_phase(profiler, phase):
+    """
+    profile the body of a with statement as a phase, or just run it if not profiling.
+    :param profiler: a PhaseProfiler, or None.
+    :param phase: the name of the phase.
+    :return:
+    """
+    if profiler is None:
+        yield
+    else:
+        with profiler.phase(phase):
+            yield
@@ -0,0 +1,368 @@
+"""
+Quota accounting for the youtube graphing script.
+Every youtube data api request is charged its quota cost against one of a pool of api keys.
+Keys are used in turn, and when every key has spent its daily quota the crawl either waits for
+the quota to reset or stops, so it can be resumed later.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    from googleapiclient.errors import HttpError
+except ImportError:
+    print ('''ERROR: the google-api-client module is required.
+    You can install this module through pip.''')
+    exit()
+
+try:
+    from scripts.yt_compression import replace_file
+except ImportError:
+    from yt_compression import replace_file
+
+
+# quota units charged by the youtube data api for each kind of request.
+QUOTA_COSTS = {'channels.list': 1}
+# reasons the api gives for refusing a key whose quota is spent.
+QUOTA_REASONS = ('quotaExceeded', 'dailyLimitExceeded')
+DEFAULT_DAILY_QUOTA = 10000
+# environment variable holding extra api keys, separated by commas.
+API_KEYS_ENVIRONMENT_VARIABLE = 'YT_API_KEYS'
+# quotas reset at midnight pacific time. a fixed offset of UTC-8 is used, which during
+# daylight saving makes the reset an hour later than it really is, never earlier.
+PACIFIC_OFFSET = -8 * 3600
+SECONDS_PER_DAY = 24 * 3600
+
+
+class QuotaExhaustedError(RuntimeError):
+    """
+    raised when every api key in a pool has spent its daily quota.
+    """
+    pass
+
+
+def quota_day(timestamp=None):
+    """
+    find which quota day a time falls in.
+    :param timestamp: seconds since the epoch. if None, the current time.
+    :return: the number of the quota day.
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    return int((timestamp + PACIFIC_OFFSET) // SECONDS_PER_DAY)
+
+
+def seconds_until_reset(timestamp=None):
+    """
+    find how long until the daily quotas reset.
+    :param timestamp: seconds since the epoch. if None, the current time.
+    :return: seconds until the next reset.
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    return (quota_day(timestamp) + 1) * SECONDS_PER_DAY - PACIFIC_OFFSET - timestamp
+
+
+def load_api_keys(api_key=None, filename=None, environment=None):
+    """
+    gather a pool of api keys, without repeats.
+    :param api_key: a single api key, used first.
+    :param filename: a file listing api keys, one per line. blank lines and lines starting
+        with '#' are ignored.
+    :param environment: dict of environment variables. if None, os.environ is used.
+    :return: list of api keys.
+    """
+    if environment is None:
+        environment = os.environ
+    keys = list()
+    if api_key is not None:
+        keys.append(api_key)
+    if filename is not None:
+        with open(filename) as f_handle:
+            keys.extend(line.strip() for line in f_handle
+                        if line.strip() and not line.strip().startswith('#'))
+    keys.extend(key.strip() for key in environment.get(API_KEYS_ENVIRONMENT_VARIABLE, '').split(',')
+                if key.strip())
+    unique_keys = list()
+    for key in keys:
+        if key not in unique_keys:
+            unique_keys.append(key)
+    return unique_keys
+
+
+def project_quota(max_depth, featured_count, ids_per_request, cached_fraction=0.0):
+    """
+    estimate the quota a crawl will spend, assuming every channel features as many channels
+    as the initial channel, and no channel is featured twice. this is an upper bound.
+    :param max_depth: the degree the crawl goes to.
+    :param featured_count: how many channels the initial channel features.
+    :param ids_per_request: the most channels looked up by one request.
+    :param cached_fraction: the share of channels expected to be read from the cache.
+    :return: the projected quota units.
+    """
+    cost = QUOTA_COSTS['channels.list']
+    units = cost
+    level_size = 1
+    for _ in range(max_depth):
+        level_size *= max(featured_count, 1)
+        uncached = level_size * (1.0 - cached_fraction)
+        units += cost * int(-(-uncached // ids_per_request))
+    return units
+
+
+class ApiKeyPool(object):
+    """
+    tracks the quota left on each of a pool of api keys, and hands out keys in turn.
+    spent quota may be saved to a file, so separate runs on the same day share the accounting.
+    the pool may be shared between threads.
+    """
+
+    def __init__(self, keys, daily_quota=DEFAULT_DAILY_QUOTA, state_file=None, wait=False,
+                 logger=None):
+        """
+        :param keys: list of api keys.
+        :param daily_quota: the quota units each key may spend in a day.
+        :param state_file: a json file to load and save spent quota with.
+        :param wait: if True, wait for the quotas to reset when every key is spent. if False,
+            raise a QuotaExhaustedError.
+        :param logger: logging object for generating verbose messages
+        :return:
+        """
+        if keys is None or len(keys) == 0:
+            raise RuntimeError("""Error in ApiKeyPool(k, d, s, w, l):
+                               'k' should hold at least one api key.""")
+        if daily_quota is None or daily_quota < 1:
+            raise RuntimeError("""Error in ApiKeyPool(k, d, s, w, l):
+                               'd' should be a positive integer.""")
+        self.keys = list(keys)
+        self.daily_quota = daily_quota
+        self.state_file = state_file
+        self.wait = wait
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.next_index = 0
+        self.day = quota_day()
+        self.spent = dict((key, 0) for key in self.keys)
+        # spent quota as last read from, or written to, the state file.
+        self.saved = dict(self.spent)
+        self.total_spent = 0
+        self._load()
+
+    @staticmethod
+    def _key_id(key):
+        """
+        make an id for a key that can be saved without revealing the key.
+        :param key: the api key.
+        :return: the id.
+        """
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _load(self):
+        """
+        read spent quota from the state file, if it is from the current quota day.
+        :return:
+        """
+        state = self._read_state()
+        for key in self.keys:
+            self.spent[key] = self.saved[key] = state['spent'].get(self._key_id(key), 0)
+
+    def _read_state(self):
+        """
+        read the state file.
+        :return: the saved state of the current quota day, which is empty if the file is
+            missing or from an earlier day.
+        """
+        state = {'day': self.day, 'spent': dict()}
+        if self.state_file is not None and os.path.isfile(self.state_file):
+            with open(self.state_file) as f_handle:
+                saved_state = json.load(f_handle)
+            if saved_state.get('day') == self.day:
+                state['spent'].update(saved_state['spent'])
+        return state
+
+    def save(self):
+        """
+        add the quota spent since the last save to the state file, keeping what other runs
+        saved to it in the meantime. the file is replaced atomically.
+        :return:
+        """
+        if self.state_file is None:
+            return
+        with self.lock:
+            self._roll_day()
+            state = self._read_state()
+            for key in self.keys:
+                key_id = self._key_id(key)
+                spent = state['spent'].get(key_id, 0) + self.spent[key] - self.saved[key]
+                state['spent'][key_id] = self.spent[key] = self.saved[key] = min(
+                    spent, self.daily_quota)
+            temp_filename = '{}.{}.tmp'.format(self.state_file, os.getpid())
+            with open(temp_filename, 'w') as f_handle:
+                json.dump(state, f_handle)
+            replace_file(temp_filename, self.state_file)
+
+    def _roll_day(self):
+        """
+        forget spent quota once the quotas have reset.
+        :return:
+        """
+        today = quota_day()
+        if today != self.day:
+            self.day = today
+            self.spent = dict((key, 0) for key in self.keys)
+            self.saved = dict(self.spent)
+
+    def remaining(self, key=None):
+        """
+        :param key: an api key. if None, the total of every key is given.
+        :return: the quota units left today.
+        """
+        with self.lock:
+            self._roll_day()
+            if key is not None:
+                return max(self.daily_quota - self.spent[key], 0)
+            return sum(max(self.daily_quota - spent, 0) for spent in self.spent.values())
+
+    def acquire(self, cost=QUOTA_COSTS['channels.list']):
+        """
+        choose the next key with enough quota left, and charge it for a request.
+        :param cost: the quota cost of the request.
+        :return: the api key to send the request with.
+        """
+        while True:
+            with self.lock:
+                self._roll_day()
+                for offset in range(len(self.keys)):
+                    index = (self.next_index + offset) % len(self.keys)
+                    key = self.keys[index]
+                    if self.spent[key] + cost <= self.daily_quota:
+                        self.spent[key] += cost
+                        self.total_spent += cost
+                        self.next_index = (index + 1) % len(self.keys)
+                        return key
+            if not self.wait:
+                raise QuotaExhaustedError("""Every api key has spent its daily quota of {}
+                                          units. The quotas reset at midnight, pacific time.
+                                          """.format(self.daily_quota))
+            if self.logger is not None:
+                self.logger.warning('Every api key has spent its daily quota. Waiting ' +
+                                    '{:.0f} seconds for the quotas to reset.'.format(
+                                        seconds_until_reset()))
+            time.sleep(seconds_until_reset() + 1)
+
+    def exhaust(self, key):
+        """
+        mark a key as having no quota left, e.g. after the api refused it.
+        :param key: the api key.
+        :return:
+        """
+        with self.lock:
+            self.spent[key] = self.daily_quota
+
+
+def is_quota_error(http_excp):
+    """
+    check whether the api refused a request because a key's quota is spent.
+    :param http_excp: the HttpError raised by the request.
+    :return: True if the quota is spent.
+    """
+    resp = getattr(http_excp, 'resp', None)
+    if resp is None:
+        return False
+    return is_quota_status(resp.status, getattr(http_excp, 'content', b''))
+
+
+def is_quota_status(status, content=None):
+    """
+    check whether a response refuses a request because a key's quota is spent.
+    :param status: the http status code.
+    :param content: the response body, as text or bytes.
+    :return: True if the quota is spent.
+    """
+    if status != 403 or not content:
+        return False
+    if not isinstance(content, str):
+        content = content.decode('utf-8', 'replace')
+    return any(reason in content for reason in QUOTA_REASONS)
+
+
+class KeyPoolApi(object):
+    """
+    a stand-in for the google api object, sending each request with a key from an
+    ApiKeyPool. keys refused for a spent quota are marked as exhausted, and the request is
+    sent again with the next key.
+    like the google api object, it is not thread-safe. each thread needs its own, though they
+    may share the pool.
+    """
+
+    def __init__(self, pool, api_factory):
+        """
+        :param pool: the ApiKeyPool to take keys from.
+        :param api_factory: function taking an api key and creating a google api object.
+        :return:
+        """
+        self.pool = pool
+        self.api_factory = api_factory
+        self.apis = dict()
+
+    def api_for(self, key):
+        """
+        :param key: an api key.
+        :return: the google api object for the key.
+        """
+        if key not in self.apis:
+            self.apis[key] = self.api_factory(key)
+        return self.apis[key]
+
+    def channels(self):
+        return _PooledResource(self, 'channels')
+
+
+class _PooledResource(object):
+    """
+    a resource of a KeyPoolApi, e.g. channels().
+    """
+
+    def __init__(self, pool_api, name):
+        self.pool_api = pool_api
+        self.name = name
+
+    def list(self, **kwargs):
+        return _PooledRequest(self.pool_api, self.name, 'list', kwargs)
+
+
+class _PooledRequest(object):
+    """
+    a request of a KeyPoolApi. the key is chosen, and charged, when the request is executed.
+    """
+
+    def __init__(self, pool_api, resource, method, kwargs):
+        self.pool_api = pool_api
+        self.resource = resource
+        self.method = method
+        self.kwargs = kwargs
+        self.headers = dict()
+        # named as the api client's requests name their method.
+        self.methodId = 'youtube.' + resource + '.' + method
+
+    def execute(self):
+        """
+        send the request with keys from the pool until one is accepted.
+        :return: the api response.
+        """
+        cost = QUOTA_COSTS[self.resource + '.' + self.method]
+        while True:
+            key = self.pool_api.pool.acquire(cost)
+            resource = getattr(self.pool_api.api_for(key), self.resource)()
+            request = getattr(resource, self.method)(**self.kwargs)
+            request.headers.update(self.headers)
+            try:
+                return request.execute()
+            except HttpError as http_excp:
+                if not is_quota_error(http_excp):
+                    raise
+                self.pool_api.pool.exhaust(key)
@@ -0,0 +1,497 @@
+"""
+Scalable, headless rendering for the youtube graphing script.
+Layouts are force directed, and computed on several levels: the graph is coarsened by merging
+matched neighbours until it is small, the smallest graph is laid out, and each finer graph is
+refined from the layout of the one before. Repulsion between nodes is approximated Barnes-Hut
+style, from the centres of mass of the cells of a hierarchy of grids, with numpy, so each
+iteration costs O(n log n) rather than the O(n^2) of networkx's spring layout.
+
+Graphs are drawn to svg, or to png with matplotlib, without a display. Only the best connected
+nodes are labelled, and when there are too many edges to draw, they are thinned to a spanning
+tree of the crawl plus a sample of the rest.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+from xml.sax.saxutils import escape
+
+try:
+    from scripts.yt_compression import open_file, strip_compression
+except ImportError:
+    from yt_compression import open_file, strip_compression
+try:
+    import numpy
+except ImportError:
+    print ('''ERROR: the numpy module is required.
+    You can install this module through pip.''')
+    exit()
+
+
+# the image formats graphs are rendered to, which --render is checked against.
+RENDER_FORMATS = ['png', 'svg']
+# graphs are coarsened until they have no more nodes than this.
+COARSEST_SIZE = 50
+# layout iterations of the coarsest graph, and of each finer graph.
+COARSEST_ITERATIONS = 200
+REFINE_ITERATIONS = 30
+# the average nodes per cell above which a cell is pushed as a whole by far cells.
+CELL_PUSH_OCCUPANCY = 4
+# nodes labelled, and edges drawn, at most.
+DEFAULT_LABEL_COUNT = 30
+DEFAULT_MAX_EDGES = 20000
+# the width and height of the image in pixels, and the colour of nodes without a degree.
+DEFAULT_IMAGE_SIZE = 1600
+MISSING_COLOUR = '#999999'
+EDGE_COLOUR = '#555555'
+
+
+def _graph_arrays(graph):
+    """
+    :param graph: the networkx graph.
+    :return: tuple of (list of nodes, int array of edges as node index pairs, int array of
+        each node's degree attribute, or -1 if it has none).
+    """
+    node_data = list(graph.nodes(data=True))
+    nodes = [node for node, _ in node_data]
+    index = dict((node, position) for position, node in enumerate(nodes))
+    edges = numpy.array([(index[node_a], index[node_b]) for node_a, node_b in graph.edges()
+                         if node_a != node_b], dtype=numpy.int64).reshape(-1, 2)
+    degrees = numpy.array([data.get('degree', -1) for _, data in node_data], dtype=numpy.int64)
+    return nodes, edges, degrees
+
+
+def _connectivity(node_count, edges):
+    """
+    :param node_count: how many nodes there are.
+    :param edges: array of edges as node index pairs.
+    :return: array of how many edges each node has.
+    """
+    return numpy.bincount(edges.ravel(), minlength=node_count)
+
+
+def _choose_neighbours(node_count, sources, targets, priority):
+    """
+    :param node_count: how many nodes there are.
+    :param sources: array of the nodes choosing.
+    :param targets: array of the neighbour of each source that may be chosen.
+    :param priority: array of the priority of each node.
+    :return: array of the neighbour of highest priority each node chose, or the node itself
+        if it had none to choose.
+    """
+    choice = numpy.arange(node_count)
+    if len(sources):
+        # the neighbour of highest priority is the last of its source's run, once sorted.
+        order = numpy.lexsort((priority[targets], sources))
+        last = numpy.ones(len(order), dtype=bool)
+        last[:-1] = sources[order][1:] != sources[order][:-1]
+        choice[sources[order][last]] = targets[order][last]
+    return choice
+
+
+def _coarsen(node_count, edges, generator):
+    """
+    merge each node with a neighbour that chose it too, then each node left over into the
+    group of a merged neighbour, so chains, stars and hubs all shrink quickly.
+    :param node_count: how many nodes there are.
+    :param edges: array of edges as node index pairs.
+    :param generator: the numpy RandomState to break ties with.
+    :return: tuple of (array of the coarse node of each node, how many coarse nodes there are,
+        array of the coarse edges, without repeats or loops).
+    """
+    sources = numpy.concatenate([edges[:, 0], edges[:, 1]])
+    targets = numpy.concatenate([edges[:, 1], edges[:, 0]])
+    priority = generator.random_sample(node_count)
+    nodes = numpy.arange(node_count)
+    choice = _choose_neighbours(node_count, sources, targets, priority)
+    matched = (choice[choice] == nodes) & (choice != nodes)
+    group = numpy.where(matched, numpy.minimum(choice, nodes), nodes)
+    joining = ~matched[sources] & matched[targets]
+    choice = _choose_neighbours(node_count, sources[joining], targets[joining], priority)
+    group = group[choice]
+    _, mapping = numpy.unique(group, return_inverse=True)
+    coarse_count = int(mapping.max()) + 1
+    coarse_edges = mapping[edges]
+    coarse_edges = coarse_edges[coarse_edges[:, 0] != coarse_edges[:, 1]]
+    coarse_edges.sort(axis=1)
+    # repeated edges are removed by their index in a coarse_count x coarse_count matrix.
+    pairs = numpy.unique(coarse_edges[:, 0] * coarse_count + coarse_edges[:, 1])
+    return mapping, coarse_count, numpy.column_stack([pairs // coarse_count,
+                                                      pairs % coarse_count])
+
+
+def _repulsion(positions, weights, k):
+    """
+    approximate the repulsion of every node by every other, each pushing with its weight.
+    the space is divided into grids of 4, 16, 64, ... cells. at each level, a node is pushed
+    by the centres of mass of the cells that are near its parent cell's neighbours, but not
+    neighbours of its own cell, and at the finest level by each node of its neighbouring
+    cells. every other node is so counted once. where cells hold many nodes, the push on a
+    cell's centre of mass is given to each of its nodes.
+    :param positions: array of node positions, of shape (n, 2).
+    :param weights: array of node weights.
+    :param k: the ideal edge length.
+    :return: array of the displacement of each node.
+    """
+    node_count = len(positions)
+    if node_count < 2:
+        return numpy.zeros_like(positions)
+    low = positions.min(axis=0)
+    span = max(float((positions.max(axis=0) - low).max()), 1e-9) * (1 + 1e-6)
+    finest = int(min(10, max(2, numpy.ceil(numpy.log(max(node_count / 2.0, 1)) /
+                                           numpy.log(4)))))
+    cells = numpy.floor((positions - low) / span * (1 << finest)).astype(numpy.int64)
+    cells = numpy.clip(cells, 0, (1 << finest) - 1)
+    min_distance = (k * 1e-3) ** 2
+    position_x, position_y = positions[:, 0], positions[:, 1]
+    push_x, push_y = numpy.zeros(node_count), numpy.zeros(node_count)
+
+    for level in range(2, finest + 1):
+        size = 1 << level
+        cell_x = cells[:, 0] >> (finest - level)
+        cell_y = cells[:, 1] >> (finest - level)
+        cell_ids = cell_x * size + cell_y
+        mass = numpy.bincount(cell_ids, weights=weights, minlength=size * size)
+        occupied = numpy.maximum(mass, 1e-300)
+        centre_x = numpy.bincount(cell_ids, weights=weights * position_x,
+                                  minlength=size * size) / occupied
+        centre_y = numpy.bincount(cell_ids, weights=weights * position_y,
+                                  minlength=size * size) / occupied
+        if size * size * CELL_PUSH_OCCUPANCY <= node_count:
+            # cells of many nodes are pushed once, at their centres, and pass it to their nodes.
+            pushed = numpy.nonzero(mass)[0]
+            pushed_x, pushed_y = centre_x[pushed], centre_y[pushed]
+            pushed_cell_x, pushed_cell_y = pushed // size, pushed % size
+        else:
+            pushed = None
+            pushed_x, pushed_y, pushed_cell_x, pushed_cell_y = (position_x, position_y,
+                                                                cell_x, cell_y)
+        level_push_x, level_push_y = numpy.zeros(len(pushed_x)), numpy.zeros(len(pushed_x))
+        # the six columns and rows of cells under the parent cell's neighbours.
+        targets_x = [(pushed_cell_x >> 1) * 2 - 2 + offset for offset in range(6)]
+        targets_y = [(pushed_cell_y >> 1) * 2 - 2 + offset for offset in range(6)]
+        for target_x in targets_x:
+            far_x = numpy.abs(target_x - pushed_cell_x) > 1
+            inside_x = (target_x >= 0) & (target_x < size)
+            for target_y in targets_y:
+                far = (far_x | (numpy.abs(target_y - pushed_cell_y) > 1)) & inside_x & \
+                    (target_y >= 0) & (target_y < size)
+                target_ids = numpy.where(far, target_x * size + target_y, 0)
+                delta_x = pushed_x - centre_x[target_ids]
+                delta_y = pushed_y - centre_y[target_ids]
+                # cells that are near, outside the grid or empty push with no weight.
+                force = numpy.where(far, mass[target_ids], 0) / numpy.maximum(
+                    delta_x * delta_x + delta_y * delta_y, min_distance)
+                level_push_x += delta_x * force
+                level_push_y += delta_y * force
+        if pushed is None:
+            push_x += level_push_x
+            push_y += level_push_y
+        else:
+            cell_push = numpy.zeros(size * size)
+            cell_push[pushed] = level_push_x
+            push_x += cell_push[cell_ids]
+            cell_push[pushed] = level_push_y
+            push_y += cell_push[cell_ids]
+
+    # the nodes of neighbouring cells push exactly.
+    size = 1 << finest
+    cell_ids = cells[:, 0] * size + cells[:, 1]
+    order = numpy.argsort(cell_ids, kind='mergesort')
+    starts = numpy.searchsorted(cell_ids[order], numpy.arange(size * size))
+    counts = numpy.bincount(cell_ids, minlength=size * size)
+    for offset_x in (-1, 0, 1):
+        for offset_y in (-1, 0, 1):
+            target = cells + (offset_x, offset_y)
+            valid = (target >= 0).all(axis=1) & (target < size).all(axis=1)
+            sources = numpy.nonzero(valid)[0]
+            target_ids = target[sources, 0] * size + target[sources, 1]
+            target_counts = counts[target_ids]
+            # every pair of a source and a node of its target cell, the cell's nodes in turn.
+            sources = numpy.repeat(sources, target_counts)
+            runs = numpy.cumsum(target_counts) - target_counts
+            others = order[numpy.repeat(starts[target_ids] - runs, target_counts) +
+                           numpy.arange(len(sources))]
+            distinct = others != sources
+            sources, others = sources[distinct], others[distinct]
+            delta_x = position_x[sources] - position_x[others]
+            delta_y = position_y[sources] - position_y[others]
+            force = weights[others] / numpy.maximum(delta_x * delta_x + delta_y * delta_y,
+                                                    min_distance)
+            push_x += numpy.bincount(sources, weights=delta_x * force, minlength=node_count)
+            push_y += numpy.bincount(sources, weights=delta_y * force, minlength=node_count)
+    return numpy.column_stack([push_x, push_y]) * (k * k)
+
+
+def _attraction(positions, edges, k):
+    """
+    :param positions: array of node positions, of shape (n, 2).
+    :param edges: array of edges as node index pairs.
+    :param k: the ideal edge length.
+    :return: array of the displacement of each node by the edges pulling it.
+    """
+    delta = positions[edges[:, 1]] - positions[edges[:, 0]]
+    pull = delta * (numpy.sqrt((delta ** 2).sum(axis=1)) / k)[:, None]
+    displacement = numpy.zeros_like(positions)
+    for axis in range(2):
+        displacement[:, axis] = (numpy.bincount(edges[:, 0], weights=pull[:, axis],
+                                                minlength=len(positions)) -
+                                 numpy.bincount(edges[:, 1], weights=pull[:, axis],
+                                                minlength=len(positions)))
+    return displacement
+
+
+def _force_directed(positions, edges, weights, k, iterations, temperature):
+    """
+    move the nodes by the forces on them, a step no longer than the temperature, which cools
+    to nothing over the iterations.
+    :param positions: array of node positions, of shape (n, 2). it is updated in place.
+    :param edges: array of edges as node index pairs.
+    :param weights: array of node weights.
+    :param k: the ideal edge length.
+    :param iterations: how many steps to take.
+    :param temperature: the longest step allowed at first.
+    :return:
+    """
+    for iteration in range(iterations):
+        displacement = _repulsion(positions, weights, k) + _attraction(positions, edges, k)
+        length = numpy.maximum(numpy.sqrt((displacement ** 2).sum(axis=1)), 1e-12)
+        step = temperature * (1 - float(iteration) / iterations)
+        positions += displacement * (numpy.minimum(length, step) / length)[:, None]
+
+
+def layout_arrays(node_count, edges, seed=1):
+    """
+    lay out a graph given as arrays, on several levels.
+    :param node_count: how many nodes there are.
+    :param edges: array of edges as node index pairs.
+    :param seed: seed for the random start, so layouts are reproducible.
+    :return: array of node positions, of shape (n, 2), within the unit square.
+    """
+    generator = numpy.random.RandomState(seed)
+    if node_count == 0:
+        return numpy.zeros((0, 2))
+    # every level keeps the total weight, so one edge length suits them all.
+    k = 1.0 / numpy.sqrt(node_count)
+    levels = [(node_count, edges, numpy.ones(node_count))]
+    mappings = list()
+    while levels[-1][0] > COARSEST_SIZE:
+        count, level_edges, weights = levels[-1]
+        mapping, coarse_count, coarse_edges = _coarsen(count, level_edges, generator)
+        if coarse_count > 0.9 * count:
+            break
+        mappings.append(mapping)
+        levels.append((coarse_count, coarse_edges,
+                       numpy.bincount(mapping, weights=weights, minlength=coarse_count)))
+    count, level_edges, weights = levels[-1]
+    positions = generator.random_sample((count, 2))
+    _force_directed(positions, level_edges, weights, k, COARSEST_ITERATIONS, 0.1)
+    for level in range(len(mappings) - 1, -1, -1):
+        count, level_edges, weights = levels[level]
+        positions = positions[mappings[level]] + (generator.random_sample((count, 2)) - 0.5) * k
+        _force_directed(positions, level_edges, weights, k, REFINE_ITERATIONS, k)
+    low = positions.min(axis=0)
+    return (positions - low) / max(float((positions.max(axis=0) - low).max()), 1e-9)
+
+
+def layout(graph, seed=1):
+    """
+    lay out a networkx graph, as networkx.spring_layout does, in O(n log n) per iteration.
+    :param graph: the networkx graph.
+    :param seed: seed for the random start, so layouts are reproducible.
+    :return: dict of node -> array of its position, within the unit square.
+    """
+    nodes, edges, _ = _graph_arrays(graph)
+    return dict(zip(nodes, layout_arrays(len(nodes), edges, seed)))
+
+
+def _labelled_nodes(connectivity, degrees, label_count):
+    """
+    :param connectivity: array of how many edges each node has.
+    :param degrees: array of each node's degree attribute.
+    :param label_count: the most nodes to label.
+    :return: array of the indices of the initial channel, and the best connected nodes.
+    """
+    if label_count <= 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    # ties are broken by degree of separation, so nearer channels are labelled first.
+    order = numpy.lexsort((degrees, -connectivity))
+    labelled = list(numpy.nonzero(degrees == 0)[0][:1])
+    labelled.extend(node for node in order[:label_count] if node not in labelled)
+    return numpy.array(labelled[:label_count], dtype=numpy.int64)
+
+
+def _thinned_edges(edges, degrees, max_edges, generator):
+    """
+    :param edges: array of edges as node index pairs.
+    :param degrees: array of each node's degree attribute.
+    :param max_edges: the most edges to keep.
+    :param generator: the numpy RandomState to sample with.
+    :return: array of the edges to draw: all of them if there are no more than max_edges,
+        otherwise an edge to each channel from one that featured it in the degree before, and a
+        sample of the rest.
+    """
+    if len(edges) <= max_edges:
+        return edges
+    deeper = numpy.where(degrees[edges[:, 0]] > degrees[edges[:, 1]], edges[:, 0], edges[:, 1])
+    tree = numpy.abs(degrees[edges[:, 0]] - degrees[edges[:, 1]]) == 1
+    _, first = numpy.unique(deeper[tree], return_index=True)
+    tree_edges = numpy.nonzero(tree)[0][first]
+    if len(tree_edges) >= max_edges:
+        return edges[generator.choice(tree_edges, max_edges, replace=False)]
+    others = numpy.setdiff1d(numpy.arange(len(edges)), tree_edges)
+    sample = generator.choice(others, max_edges - len(tree_edges), replace=False)
+    return edges[numpy.concatenate([tree_edges, sample])]
+
+
+def _scene(graph, positions, colours, label_count, max_edges, size):
+    """
+    work out what to draw.
+    :param graph: the networkx graph.
+    :param positions: dict of node -> position, or None to lay the graph out.
+    :param colours: list of the colour of each degree, or None to draw every node in one.
+    :param label_count: the most nodes to label.
+    :param max_edges: the most edges to draw.
+    :param size: the width and height of the image in pixels.
+    :return: dict of the node positions in pixels ('xy'), node 'radii' and 'colours', the
+        'edges' to draw, their 'edge_alpha' and 'edge_width', and (position, text) 'labels'.
+    """
+    generator = numpy.random.RandomState(1)
+    nodes, edges, degrees = _graph_arrays(graph)
+    if positions is None:
+        xy = layout_arrays(len(nodes), edges)
+    else:
+        xy = numpy.array([positions[node] for node in nodes], dtype=float).reshape(-1, 2)
+        low = xy.min(axis=0) if len(xy) else 0
+        xy = (xy - low) / max(float((xy.max(axis=0) - low).max()) if len(xy) else 0, 1e-9)
+    margin = size * 0.03
+    # y grows downwards in images.
+    xy = numpy.column_stack([margin + xy[:, 0] * (size - 2 * margin),
+                             size - margin - xy[:, 1] * (size - 2 * margin)])
+    connectivity = _connectivity(len(nodes), edges)
+    base_radius = min(6.0, max(0.6, 300.0 / numpy.sqrt(max(len(nodes), 1))))
+    node_colours = [MISSING_COLOUR if degree < 0 or colours is None or degree >= len(colours)
+                    else colours[degree] for degree in degrees.tolist()]
+    drawn = _thinned_edges(edges, degrees, max_edges, generator)
+    return {'xy': xy, 'radii': base_radius * (1 + 0.3 * numpy.log1p(connectivity)),
+            'colours': node_colours, 'edges': drawn,
+            'edge_alpha': min(0.6, max(0.05, 2000.0 / max(len(drawn), 1))),
+            'edge_width': 0.3 if len(drawn) > 5000 else 0.8,
+            'labels': [(xy[node], u'%s' % nodes[node])
+                       for node in _labelled_nodes(connectivity, degrees, label_count)]}
+
+
+def _write_svg(scene, filename, size):
+    """
+    write a scene as svg. the edges are one path, and the nodes are grouped by colour.
+    :param scene: the scene from _scene.
+    :param filename: the name of the file to write to.
+    :param size: the width and height of the image in pixels.
+    :return:
+    """
+    xy = scene['xy']
+    with open_file(filename, 'w') as f_handle:
+        f_handle.write(u'<?xml version="1.0" encoding="UTF-8"?>\n'
+                       u'<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{0}" '
+                       u'viewBox="0 0 {0} {0}">\n'
+                       u'<rect width="100%" height="100%" fill="white"/>\n'.format(size))
+        if len(scene['edges']):
+            f_handle.write(u'<path fill="none" stroke="{}" stroke-opacity="{:.3f}" '
+                           u'stroke-width="{}" d="'.format(EDGE_COLOUR, scene['edge_alpha'],
+                                                           scene['edge_width']))
+            for node_a, node_b in scene['edges'].tolist():
+                f_handle.write(u'M{:.1f} {:.1f}L{:.1f} {:.1f}'.format(
+                    xy[node_a, 0], xy[node_a, 1], xy[node_b, 0], xy[node_b, 1]))
+            f_handle.write(u'"/>\n')
+        by_colour = dict()
+        for node, colour in enumerate(scene['colours']):
+            by_colour.setdefault(colour, []).append(node)
+        for colour in sorted(by_colour):
+            f_handle.write(u'<g fill="{}" stroke="black" stroke-width="0.2">\n'.format(colour))
+            for node in by_colour[colour]:
+                f_handle.write(u'<circle cx="{:.1f}" cy="{:.1f}" r="{:.1f}"/>\n'.format(
+                    xy[node, 0], xy[node, 1], scene['radii'][node]))
+            f_handle.write(u'</g>\n')
+        f_handle.write(u'<g font-family="sans-serif" font-size="11" text-anchor="middle">\n')
+        for position, text in scene['labels']:
+            f_handle.write(u'<text x="{:.1f}" y="{:.1f}">{}</text>\n'.format(
+                position[0], position[1] - 8, escape(text)))
+        f_handle.write(u'</g>\n</svg>\n')
+
+
+def _draw_matplotlib(scene, figure, size):
+    """
+    draw a scene on a matplotlib figure, filling it.
+    :param scene: the scene from _scene.
+    :param figure: the matplotlib Figure.
+    :param size: the width and height of the image in pixels.
+    :return:
+    """
+    from matplotlib.collections import LineCollection
+    axes = figure.add_axes([0, 0, 1, 1])
+    axes.set_xlim(0, size)
+    axes.set_ylim(size, 0)
+    axes.set_axis_off()
+    xy = scene['xy']
+    if len(scene['edges']):
+        axes.add_collection(LineCollection(xy[scene['edges']], colors=EDGE_COLOUR,
+                                           linewidths=scene['edge_width'],
+                                           alpha=scene['edge_alpha'], zorder=1))
+    # scatter sizes are areas in points squared, at 72 points an inch.
+    points = scene['radii'] * 72.0 / figure.dpi
+    axes.scatter(xy[:, 0], xy[:, 1], s=numpy.pi * points ** 2, c=scene['colours'],
+                 edgecolors='black', linewidths=0.2, zorder=2)
+    for position, text in scene['labels']:
+        axes.text(position[0], position[1] - 8, text, fontsize=8, ha='center', zorder=3)
+
+
+def render_graph(graph, filename, positions=None, colours=None,
+                 label_count=DEFAULT_LABEL_COUNT, max_edges=DEFAULT_MAX_EDGES,
+                 size=DEFAULT_IMAGE_SIZE):
+    """
+    draw a graph to a png or svg file, without a display.
+    :param graph: the networkx graph.
+    :param filename: the name of the file to write to, ending in .png or .svg, optionally
+        followed by a compression suffix.
+    :param positions: dict of node -> position. if None, the graph is laid out with layout.
+    :param colours: list of the colour of each degree of separation, for the nodes' 'degree'
+        attributes. if None, every node is drawn in one colour.
+    :param label_count: the most nodes to label. the best connected nodes are labelled.
+    :param max_edges: the most edges to draw. if there are more, they are thinned.
+    :param size: the width and height of the image in pixels.
+    :return:
+    """
+    render_format = strip_compression(filename).rsplit('.', 1)[-1].lower()
+    if render_format not in RENDER_FORMATS:
+        raise RuntimeError("""Error in render_graph(g, f): 'f' should end in .png or .svg.""")
+    scene = _scene(graph, positions, colours, label_count, max_edges, size)
+    if render_format == 'svg':
+        _write_svg(scene, filename, size)
+        return
+    try:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+    except ImportError:
+        raise RuntimeError("""Error in render_graph(g, f): png images require the matplotlib
+                           module. You can install this module through pip.""")
+    dpi = 100.0
+    figure = Figure(figsize=(size / dpi, size / dpi), dpi=dpi)
+    FigureCanvasAgg(figure)
+    _draw_matplotlib(scene, figure, size)
+    with open_file(filename, 'wb') as f_handle:
+        figure.savefig(f_handle, format='png', dpi=dpi, facecolor='white')
+
+
+def show_graph(graph, colours=None, label_count=DEFAULT_LABEL_COUNT,
+               max_edges=DEFAULT_MAX_EDGES, size=900):  # pragma: no cover
+    """
+    draw a graph as render_graph does, in a matplotlib window.
+    :param graph: the networkx graph.
+    :param colours: list of the colour of each degree of separation.
+    :param label_count: the most nodes to label.
+    :param max_edges: the most edges to draw.
+    :param size: the width and height of the window in pixels.
+    :return:
+    """
+    import matplotlib.pyplot as plt
+    figure = plt.figure(figsize=(size / 100.0, size / 100.0), dpi=100)
+    _draw_matplotlib(_scene(graph, None, colours, label_count, max_edges, size), figure, size)
+    plt.show()
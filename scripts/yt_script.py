@@ -6,44 +6,151 @@ from __future__ import absolute_import, print_function, nested_scopes, generator
 
 from logging import getLogger, StreamHandler, Formatter
 from logging import INFO
-# from multiprocessing import JoinableQueue as JQueue
-try:
-    from queue import Queue
-    from queue import Empty as EmptyQueueException
-except ImportError:
-    from Queue import Queue
-    from Queue import Empty as EmptyQueueException
 
 import argparse
+import gzip
+import importlib
 from itertools import cycle
 import json
+import os
+import threading
+import time
 try:
-    from googleapiclient import discovery
     from googleapiclient.errors import HttpError
-    import networkx
-    from networkx.readwrite import json_graph
 except ImportError:
     print ('''ERROR: the networkX and google-api-client modules are required.
     You can install these modules through pip.''')
     exit()
 
 
+class _LazyModule(object):
+    """
+    a stand-in for a module, which is only imported once one of its attributes is used.
+    heavy modules are imported this way, so showing help or rejecting bad arguments is fast.
+    """
+
+    def __init__(self, name):
+        """
+        :param name: the full name of the module.
+        :return:
+        """
+        self._lazy_name = name
+        self._lazy_module = None
+
+    def __getattr__(self, attribute):
+        # only called for attributes the stand-in itself does not have.
+        if self._lazy_module is None:
+            try:
+                self._lazy_module = importlib.import_module(self._lazy_name)
+            except ImportError:
+                print ('''ERROR: the networkX and google-api-client modules are required.
+    You can install these modules through pip.''')
+                exit()
+        return getattr(self._lazy_module, attribute)
+
+
+discovery = _LazyModule('googleapiclient.discovery')
+httplib2 = _LazyModule('httplib2')
+networkx = _LazyModule('networkx')
+try:
+    from scripts.yt_builder import CompactGraphBuilder, NODE_KEYS
+except ImportError:
+    from yt_builder import CompactGraphBuilder, NODE_KEYS
+try:
+    from scripts.yt_cache import ChannelCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL
+except ImportError:
+    from yt_cache import ChannelCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL
+try:
+    from scripts.yt_compression import (COMPRESSIONS, compressed_filename, compression_of,
+                                        open_file, replace_file, strip_compression)
+except ImportError:
+    from yt_compression import (COMPRESSIONS, compressed_filename, compression_of, open_file,
+                                replace_file, strip_compression)
+try:
+    from scripts.yt_logging import LOG_EVENTS, start_queued_logging, stop_logging
+except ImportError:
+    from yt_logging import LOG_EVENTS, start_queued_logging, stop_logging
+try:
+    from scripts.yt_metrics import CrawlMetrics, DEFAULT_METRICS_INTERVAL, MetricsReporter
+except ImportError:
+    from yt_metrics import CrawlMetrics, DEFAULT_METRICS_INTERVAL, MetricsReporter
+try:
+    from scripts.yt_profile import PhaseProfiler, profile_phase
+except ImportError:
+    from yt_profile import PhaseProfiler, profile_phase
+try:
+    from scripts.yt_quota import (ApiKeyPool, KeyPoolApi, QuotaExhaustedError,
+                                  DEFAULT_DAILY_QUOTA, load_api_keys, project_quota)
+except ImportError:
+    from yt_quota import (ApiKeyPool, KeyPoolApi, QuotaExhaustedError, DEFAULT_DAILY_QUOTA,
+                          load_api_keys, project_quota)
+try:
+    from scripts.yt_stream import DEFAULT_FLUSH_INTERVAL, GraphStreamWriter, STREAM_FORMATS
+except ImportError:
+    from yt_stream import DEFAULT_FLUSH_INTERVAL, GraphStreamWriter, STREAM_FORMATS
+try:
+    from scripts.yt_throttle import AimdController, execute_request, is_retryable_error
+except ImportError:
+    from yt_throttle import AimdController, execute_request, is_retryable_error
+
+
 
 DETAILED_MESSAGE = '%(asctime)-15s >>> %(funcName)s, line:%(lineno)d --- %(message)s'
 
 API_YOUTUBE_SERVICE = 'youtube'
 API_VERSION = 'v3'
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest'
+# the discovery document is kept in the cache directory under this name.
+DISCOVERY_FILENAME = 'youtube.v3.discovery.json'
+# where a stand-in for the api serves the discovery document, relative to its root url.
+DISCOVERY_PATH = 'discovery/v1/apis/youtube/v3/rest'
+# seconds to wait on a response from the api.
+API_TIMEOUT = 60
 
 TEMP_FILENAME = '!__temp__'
 DEFAULT_OUTPUT_FILENAME = 'graph.out'
 
-OUTPUT_FORMATS = ['text', 'graphml', 'gml', 'gexf', 'yaml']
-
-
-def prepare_logger(verbosity):
+OUTPUT_FORMATS = ['text', 'graphml', 'gml', 'gexf', 'yaml', 'json', 'json_tree', 'binary',
+                  'sqlite']
+# output format -> the extension of its file, when several formats are written at once.
+OUTPUT_EXTENSIONS = {'text': 'txt', 'graphml': 'graphml', 'gml': 'gml', 'gexf': 'gexf',
+                     'yaml': 'yaml', 'json': 'json', 'json_tree': 'tree.json', 'binary': 'ytg',
+                     'sqlite': 'sqlite'}
+# formats that are read in place, so can not be compressed.
+UNCOMPRESSED_FORMATS = ['sqlite']
+# the layouts of json output, and the key of node-link json's list of edges.
+JSON_LAYOUTS = ['node_link', 'tree']
+JSON_LINKS_KEY = 'links'
+# output format -> name of the function writing it, looked up only when the format is written.
+OUTPUT_WRITERS = {'text': 'convert_graph_to_text', 'graphml': 'convert_graph_to_graphml',
+                  'gml': 'convert_graph_to_gml', 'gexf': 'convert_graph_to_gexf',
+                  'yaml': 'convert_graph_to_yaml', 'json': 'convert_graph_to_json',
+                  'json_tree': 'convert_graph_to_json_tree',
+                  'binary': 'yt_binary.convert_graph_to_binary',
+                  'sqlite': 'yt_sqlite.convert_graph_to_sqlite'}
+
+# the most nodes labelled in rendered graphs.
+DEFAULT_RENDER_LABELS = 30
+
+# the most channel ids the api accepts in a single channels().list request.
+MAX_IDS_PER_REQUEST = 50
+
+# seconds between checkpoints written during a degree.
+DEFAULT_CHECKPOINT_INTERVAL = 60
+CHECKPOINT_VERSION = 2
+
+# file in the cache directory recording the quota spent by each api key today.
+QUOTA_STATE_FILENAME = 'quota.json'
+
+
+def prepare_logger(verbosity, sample_rates=None, rate_limits=None):
     """
-    setup the logger
+    setup the logger. at verbosity 3, records are json lines written by a background thread,
+    and may be sampled and rate limited by event.
     :param verbosity: determines how much information the logger is to show
+    :param sample_rates: dict of event to the fraction of its records to show, at verbosity 3.
+    :param rate_limits: dict of event to the most records of it to show per second, at
+        verbosity 3.
     :return:
     """
     if verbosity == 0:
@@ -52,12 +159,15 @@ def prepare_logger(verbosity):
         logger = getLogger('youtube_user_graph')
         logger.verbosity = verbosity
         logger.setLevel(INFO)
-        if not getattr(logger, 'handler_set', None):
+        # the handlers of an earlier call are replaced, as its verbosity may differ.
+        stop_logging(logger)
+        if verbosity >= 3:
+            start_queued_logging(logger, StreamHandler(), sample_rates, rate_limits)
+        else:
             formatter = Formatter(DETAILED_MESSAGE)
             console_handler = StreamHandler()
             console_handler.setFormatter(formatter)
             logger.addHandler(console_handler)
-            logger.handler_set = True
     return logger
 
 
@@ -68,7 +178,8 @@ def declare_degree(logger, degree):
     :return:
     """
     if logger is not None:
-        logger.info('\nDegree: #{}'.format(degree))
+        logger.info('\nDegree: #%s', degree, extra={'event': 'degree',
+                                                     'fields': {'degree': degree}})
 
 
 def declare_warning(logger, warning):
@@ -79,7 +190,23 @@ def declare_warning(logger, warning):
     :return:
     """
     if logger is not None:
-            logger.warning(warning)
+            logger.warning(warning, extra={'event': 'warning'})
+
+
+def declare_projected_quota(logger, projected, remaining):
+    """
+    make logger show the quota a crawl is projected to spend, and warn if it exceeds the quota
+    left.
+    :param projected: the projected quota units.
+    :param remaining: the quota units left on the api keys.
+    :return:
+    """
+    if logger is not None:
+        logger.info('Projected Quota: %s units, of %s remaining', projected, remaining,
+                    extra={'event': 'quota',
+                           'fields': {'projected': projected, 'remaining': remaining}})
+        if projected > remaining:
+            declare_warning(logger, 'The crawl may spend more quota than the api keys have left.')
 
 
 def declare_processed_users(logger, user_count):
@@ -90,7 +217,8 @@ def declare_processed_users(logger, user_count):
     """
     if logger is not None:
         if logger.verbosity >= 2:
-            logger.info('Users Processed: {}'.format(user_count))
+            logger.info('Users Processed: %s', user_count,
+                        extra={'event': 'processed', 'fields': {'processed': user_count}})
 
 
 def declare_new_node(logger, node):
@@ -101,7 +229,7 @@ def declare_new_node(logger, node):
     """
     if logger is not None:
         if logger.verbosity >= 3:
-            logger.info('New Node: {}'.format(node))
+            logger.info('New Node: %s', node, extra={'event': 'node', 'fields': {'node': node}})
 
 
 def declare_new_edge(logger, edge_start, edge_end):
@@ -113,7 +241,9 @@ def declare_new_edge(logger, edge_start, edge_end):
     """
     if logger is not None:
         if logger.verbosity >= 3:
-            logger.info('New Edge: {} to {}'.format(edge_start, edge_end))
+            logger.info('New Edge: %s to %s', edge_start, edge_end,
+                        extra={'event': 'edge', 'fields': {'source': edge_start,
+                                                           'target': edge_end}})
 
 
 def setup_arg_parser():
@@ -136,12 +266,25 @@ def setup_arg_parser():
                         default=DEFAULT_OUTPUT_FILENAME,
                         help="""A file to record graphing data to. Must be a valid name for the
                         operating system. If the option is omitted then no file is made.""")
-    parser.add_argument('-o', '--output', action='store', type=str, default=None,
-                        choices=OUTPUT_FORMATS,
-                        help="""Format to convert the graph data into. Valid choices are:
+    parser.add_argument('-o', '--output', action='store', type=output_formats_argument,
+                        default=None,
+                        help="""Format to convert the graph data into. Several formats may be
+                        given, separated by commas, e.g. 'graphml,gml,text', and are written
+                        at once, each to the filename with the format's extension.
+                        Valid choices are:
                         text (default) - tab formatted text listing edges and related nodes.
                         graphml - xml formatted according to graphml specifications.
+                        json - node-link json, as networkx's json_graph.node_link_data.
+                        json_tree - json of nested channels, from the initial channel, as
+                        networkx's json_graph.tree_data.
+                        binary - compact numpy arrays, loaded with yt_binary.load_binary.
+                        sqlite - an indexed sqlite database of nodes and edges tables.
                         """)
+    parser.add_argument('--compress', action='store', type=str, default=None,
+                        choices=COMPRESSIONS,
+                        help="Compress the output files as they are written, adding the " +
+                        "suffix to their names. Files named with a .gz, .bz2 or .xz suffix " +
+                        "are compressed without this option. sqlite output is not compressed.")
     parser.add_argument('-v', '--verbose', action='store', type=int, default=0,
                         choices=[1, 2, 3],
                         help="""Display additional information to the console during processing.
@@ -150,17 +293,140 @@ def setup_arg_parser():
                         1 - current degree of separation being processed.
                         2 - Total users processed.
                         3 - New users, and relationships between users, found.""")
+    parser.add_argument('--node_key', action='store', type=str, default='title',
+                        choices=NODE_KEYS,
+                        help="""How to label the nodes of the graph:
+                        title (default) - the channel title. A channel sharing the title of an
+                        earlier channel is labelled 'title (channel id)'.
+                        id - the channel id, with the title kept as a node attribute.""")
+    parser.add_argument('--stream', action='store', type=str, default=None,
+                        help="A file to append nodes and edges to as they are found, or '-' " +
+                        "for standard output. The streamed graph is the same graph as the " +
+                        "output file holds once the crawl is done.")
+    parser.add_argument('--stream_format', action='store', type=str, default='ndjson',
+                        choices=STREAM_FORMATS,
+                        help="""The format of the --stream file:
+                        ndjson (default) - a json object per line, for each node, with its
+                        title and degree, and each edge.
+                        edgelist - tab separated lines, a single label for each node and two
+                        for each edge. Tabs, newlines and backslashes in titles are escaped
+                        with backslashes.
+                        Either format is read back with yt_stream.load_stream.""")
+    parser.add_argument('--stream_flush', action='store', type=float,
+                        default=DEFAULT_FLUSH_INTERVAL,
+                        help="Seconds between flushes of the --stream file. Default is " +
+                        str(DEFAULT_FLUSH_INTERVAL) + ".")
     parser.add_argument('-s', '--show_graph', action='store_true', default=False,
                         help="Display a visual depiction of the graph in a separate window, "
                         + "when processing is complete.")
+    parser.add_argument('--render', action='store', type=str, default=None,
+                        help="An image file to draw the graph to when processing is complete, " +
+                        "without a display. A name ending in .svg gets an svg image, and one " +
+                        "ending in .png a png image, which requires matplotlib. Large graphs " +
+                        "are drawn with only their best connected nodes labelled.")
+    parser.add_argument('--render_labels', action='store', type=int,
+                        default=DEFAULT_RENDER_LABELS,
+                        help="The most nodes to label in the --render image, and the graph " +
+                        "shown with -s. Default is " + str(DEFAULT_RENDER_LABELS) + ".")
+    parser.add_argument('-w', '--workers', action='store', type=int, default=1,
+                        help="The number of threads sending api requests concurrently. Must be" +
+                        " an integer greater than 0. Default is 1.")
+    parser.add_argument('--async_crawl', action='store_true', default=False,
+                        help="Send the api requests of each degree concurrently from an " +
+                        "asyncio event loop, instead of through threads. Requires python 3.5+.")
+    parser.add_argument('--max_in_flight', action='store', type=int, default=100,
+                        help="With --async_crawl, the most requests waiting on a response at " +
+                        "once. Must be an integer greater than 0. Default is 100.")
+    parser.add_argument('--work_queue', action='store', type=str, default=None,
+                        help="A queue file to share the crawl with worker processes through. " +
+                        "The channel lookups are left to workers started with " +
+                        "'yt_distributed.py <queue> <api_key>', on this or other hosts.")
+    parser.add_argument('--checkpoint', action='store', type=str, default=None,
+                        help="A file to save the state of the crawl to, after each degree and " +
+                        "periodically during a degree. Defaults to the --resume file, if given.")
+    parser.add_argument('--checkpoint_interval', action='store', type=float,
+                        default=DEFAULT_CHECKPOINT_INTERVAL,
+                        help="Seconds between checkpoints written during a degree. Default is " +
+                        str(DEFAULT_CHECKPOINT_INTERVAL) + ".")
+    parser.add_argument('--resume', action='store', type=str, default=None,
+                        help="A checkpoint file to continue an interrupted crawl from. The " +
+                        "degree may be raised to extend a finished crawl.")
+    parser.add_argument('--cache_dir', action='store', type=str, default=DEFAULT_CACHE_DIR,
+                        help="A directory to cache channel details in between runs. Default is "
+                        + "'" + DEFAULT_CACHE_DIR + "'.")
+    parser.add_argument('--cache_ttl', action='store', type=float, default=DEFAULT_CACHE_TTL,
+                        help="Hours before a cached channel is fetched from the api again. " +
+                        "Default is " + str(DEFAULT_CACHE_TTL) + ".")
+    parser.add_argument('--refresh_discovery', action='store_true', default=False,
+                        help="Download the youtube api discovery document again, replacing " +
+                        "the copy kept in the cache directory.")
+    parser.add_argument('--record', action='store', type=str, default=None,
+                        help="A cassette file to record the channels the api sends to, adding " +
+                        "to any it has recorded already. Serve it with scripts/yt_cassette.py " +
+                        "to repeat the crawl without the network or api quota.")
+    parser.add_argument('--api_url', action='store', type=str, default=None,
+                        help="The root url of a stand-in for the youtube api to send requests " +
+                        "to, such as 'http://127.0.0.1:8080/' for a cassette served with " +
+                        "scripts/yt_cassette.py.")
+    parser.add_argument('--bypass_cache', action='store_true', default=False,
+                        help="Fetch every channel from the api, ignoring cached details. " +
+                        "Fresh details are still stored in the cache.")
+    parser.add_argument('--recrawl', action='store_true', default=False,
+                        help="Ask the api whether each cached channel has changed, with " +
+                        "conditional (etag) requests. Unchanged channels reuse the cached " +
+                        "details, so only changed channels are downloaded again.")
+    parser.add_argument('--api_keys', action='store', type=str, default=None,
+                        help="A file listing further api keys, one per line, to share the " +
+                        "requests with once a key's quota is spent. Keys may also be given, " +
+                        "separated by commas, in the YT_API_KEYS environment variable.")
+    parser.add_argument('--daily_quota', action='store', type=int, default=DEFAULT_DAILY_QUOTA,
+                        help="The quota units each api key may spend in a day. Default is " +
+                        str(DEFAULT_DAILY_QUOTA) + ".")
+    parser.add_argument('--wait_for_quota', action='store_true', default=False,
+                        help="When every api key has spent its quota, wait for the quotas to " +
+                        "reset instead of stopping. A stopped crawl can be continued later " +
+                        "with --resume.")
+    parser.add_argument('--metrics', action='store', type=str, default=None,
+                        help="A file to write crawl metrics to periodically: api requests " +
+                        "and their latency, nodes and edges added per degree, the frontier, " +
+                        "the cache hit rate and output times. A name ending in .json gets a " +
+                        "json snapshot, any other name the prometheus text format.")
+    parser.add_argument('--metrics_interval', action='store', type=float,
+                        default=DEFAULT_METRICS_INTERVAL,
+                        help="Seconds between writes of the --metrics file. Default is " +
+                        str(DEFAULT_METRICS_INTERVAL) + ".")
+    parser.add_argument('--log_sample', action='store', type=event_rates_argument,
+                        default=None,
+                        help="At verbosity 3, the fraction of each event's records to show, " +
+                        "e.g. 'node=0.1,edge=0.01' shows one new node in ten and one new edge " +
+                        "in a hundred. Events are " + ', '.join(LOG_EVENTS) + ".")
+    parser.add_argument('--log_rate_limit', action='store', type=event_rates_argument,
+                        default=None,
+                        help="At verbosity 3, the most records of each event to show per " +
+                        "second, e.g. 'edge=100'.")
+    parser.add_argument('--profile', action='store', type=str, default=None,
+                        help="A directory to write cpu and memory profiles of each phase of " +
+                        "the run to: argument verification, each degree of the crawl, output, " +
+                        "rendering and showing the graph. Each phase gets a pstats file and a " +
+                        "summary of its largest allocations.")
+    parser.add_argument('--project_quota', action='store_true', default=False,
+                        help="Show the quota the crawl is projected to spend, and the quota " +
+                        "left on the api keys, then stop without crawling.")
     return parser
 
 
-def verify_arguments(parser, args):
+def verify_arguments(parser, args, api=None):
     """
     Parse a sequence of arguments, given an argumentParser and a list of arguments.
+    the api object used to verify the channel id is kept as arguments.api, and the details of
+    the channel as arguments.seed_details, so the crawl need not request them again. the
+    PhaseProfiler of --profile is kept as arguments.profiler, having profiled the verification,
+    and the Cassette of --record as arguments.cassette. the api transport is configured for
+    --record and --api_url before the channel id is verified through it.
     :param parser:  the argumentParser to use.
     :param args:    list of arguments to process
+    :param api:     the google api object to verify the channel id with. if None, one is made
+                    from the api key.
     :return:        the parsed Arguments object.
     """
 
@@ -188,6 +454,123 @@ def verify_arguments(parser, args):
         except (AssertionError, ValueError):
             raise AttributeError(" '-d <degree>': <degree> should be a positive integer.")
 
+    def _assert_valid_workers():
+        """
+        check the supplied numbers of workers and requests in flight are positive integers.
+        :return:
+        """
+        # arguments is from outer scope
+        if arguments.workers < 1:
+            raise AttributeError(" '-w <workers>': <workers> should be a positive integer.")
+        if arguments.max_in_flight < 1:
+            raise AttributeError(" '--max_in_flight <count>': <count> should be a positive " +
+                                 "integer.")
+
+    def _assert_valid_cache_ttl():
+        """
+        check the supplied cache ttl is not negative.
+        :return:
+        """
+        # arguments is from outer scope
+        if arguments.cache_ttl < 0:
+            raise AttributeError(" '--cache_ttl <hours>': <hours> should not be negative.")
+
+    def _assert_valid_checkpoint():
+        """
+        check the checkpoint to resume from exists.
+        :return:
+        """
+        # arguments is from outer scope
+        if arguments.resume is not None and not os.path.isfile(arguments.resume):
+            raise AttributeError(" '--resume <checkpoint>': <checkpoint> does not exist.")
+        if arguments.checkpoint_interval < 0:
+            raise AttributeError(" '--checkpoint_interval <seconds>': <seconds> should not be " +
+                                 "negative.")
+
+    def _assert_valid_metrics():
+        """
+        check the metrics interval is a positive number of seconds.
+        :return:
+        """
+        # arguments is from outer scope
+        if arguments.metrics_interval <= 0:
+            raise AttributeError(" '--metrics_interval <seconds>': <seconds> should be " +
+                                 "positive.")
+
+    def _assert_valid_log_sample():
+        """
+        check no sample rate keeps more than every record.
+        :return:
+        """
+        # arguments is from outer scope
+        if arguments.log_sample is not None and max(arguments.log_sample.values()) > 1:
+            raise AttributeError(" '--log_sample <event=fraction>': <fraction> should not be " +
+                                 "more than 1.")
+
+    def _assert_valid_transport():
+        """
+        check the stand-in api url is an http url, and responses are only recorded where they
+        can be.
+        :return:
+        """
+        # arguments is from outer scope
+        if arguments.api_url is not None and \
+                not arguments.api_url.startswith(('http://', 'https://')):
+            raise AttributeError(" '--api_url <url>': <url> should start with http:// or " +
+                                 "https://.")
+        if arguments.record is not None and arguments.async_crawl:
+            raise AttributeError(" '--record <cassette>': the requests of --async_crawl " +
+                                 "can not be recorded.")
+
+    def _assert_valid_profile():
+        """
+        check the profile directory is not an existing file.
+        :return:
+        """
+        # arguments is from outer scope
+        if arguments.profile is not None and os.path.exists(arguments.profile) and \
+                not os.path.isdir(arguments.profile):
+            raise AttributeError(" '--profile <directory>': <directory> is a file.")
+
+    def _assert_valid_render():
+        """
+        check the render file is an image format, and the label count is not negative.
+        :return:
+        """
+        # arguments is from outer scope
+        if arguments.render is not None:
+            # yt_render needs numpy, so it is only imported when rendering.
+            try:
+                from scripts.yt_render import RENDER_FORMATS
+            except ImportError:
+                from yt_render import RENDER_FORMATS
+            if strip_compression(arguments.render).rsplit('.', 1)[-1].lower() \
+                    not in RENDER_FORMATS:
+                raise AttributeError(" '--render <image>': <image> should end in .png or .svg.")
+        if arguments.render_labels < 0:
+            raise AttributeError(" '--render_labels <count>': <count> should not be negative.")
+
+    def _assert_valid_stream():
+        """
+        check the stream flush interval is not negative.
+        :return:
+        """
+        # arguments is from outer scope
+        if arguments.stream_flush < 0:
+            raise AttributeError(" '--stream_flush <seconds>': <seconds> should not be " +
+                                 "negative.")
+
+    def _assert_valid_quota():
+        """
+        check the supplied daily quota is a positive integer, and the api keys file exists.
+        :return:
+        """
+        # arguments is from outer scope
+        if arguments.daily_quota < 1:
+            raise AttributeError(" '--daily_quota <units>': <units> should be a positive integer.")
+        if arguments.api_keys is not None and not os.path.isfile(arguments.api_keys):
+            raise AttributeError(" '--api_keys <file>': <file> does not exist.")
+
     def _assert_valid_channel_id():
         """
         check the channel id is for a real channel.
@@ -202,9 +585,14 @@ def verify_arguments(parser, args):
                                      "this id is correct.\nYou may not use a legacy username - " +
                                      "only use a channel id.\nChannel Ids can be found at urls " +
                                      "such as 'https://www.youtube.com/channel/<id>'.")
-            temp_api = create_youtube_api(developer_key=arguments.api_key)
-            api_channels = temp_api.channels()
-            response = api_channels.list(part='snippet', id=arguments.id).execute()
+            verifying_api = api
+            if verifying_api is None:
+                verifying_api = create_youtube_api(
+                    developer_key=arguments.api_key,
+                    discovery_document=load_discovery_document(arguments.cache_dir,
+                                                               arguments.refresh_discovery))
+            response = execute_request(verifying_api.channels().list(part='brandingSettings',
+                                                                     id=arguments.id))
             # check this is the correct kind of response
             # difficult to reliably test
             if not ('kind' in response and 'items' in response and
@@ -214,6 +602,10 @@ def verify_arguments(parser, args):
                                      "this id is correct.\nYou may not use a legacy username - " +
                                      "only use a channel id.\nChannel Ids can be found at urls " +
                                      "such as 'https://www.youtube.com/channel/<id>'.")
+            channel = response['items'][0].get('brandingSettings', {}).get('channel', {})
+            arguments.api = verifying_api
+            arguments.seed_details = {arguments.id: (channel.get('title'),
+                                                     channel.get('featuredChannelsUrls'))}
         # only occurs with malformed api requests or unusual errors from network or api itself.
         except HttpError as http_excp:  # pragma: no cover
             if "HttpError 400" in str(http_excp):
@@ -225,24 +617,175 @@ def verify_arguments(parser, args):
     else:
         arguments = parser.parse_args(args)
 
-    _assert_valid_filename()
-    _assert_valid_degree()
-    _assert_valid_channel_id()
+    arguments.profiler = None
+    if arguments.profile is not None and not os.path.isfile(arguments.profile):
+        # the verification is the first phase profiled.
+        arguments.profiler = PhaseProfiler(arguments.profile)
+        arguments.profiler.start('arguments')
+    try:
+        _assert_valid_filename()
+        _assert_valid_degree()
+        _assert_valid_workers()
+        _assert_valid_cache_ttl()
+        _assert_valid_checkpoint()
+        _assert_valid_stream()
+        _assert_valid_render()
+        _assert_valid_metrics()
+        _assert_valid_log_sample()
+        _assert_valid_profile()
+        _assert_valid_transport()
+        _assert_valid_quota()
+        arguments.cassette = None
+        if arguments.record is not None:
+            try:
+                from scripts.yt_cassette import Cassette
+            except ImportError:
+                from yt_cassette import Cassette
+            arguments.cassette = Cassette(arguments.record)
+        configure_transport(arguments.cassette, arguments.api_url)
+        _assert_valid_channel_id()
+    finally:
+        if arguments.profiler is not None:
+            arguments.profiler.stop()
 
     return arguments
 
 
-def create_youtube_api(developer_key=None):
+# path of a discovery document -> the parsed document, so each is read once per run.
+_discovery_documents = dict()
+_discovery_lock = threading.Lock()
+# the Cassette api responses are recorded to, and the root url of a stand-in for the api to
+# send requests to instead, as set by configure_transport.
+_cassette = None
+_api_url = None
+
+
+def configure_transport(cassette=None, api_url=None):
+    """
+    choose how api objects made from now on reach the api.
+    :param cassette: a yt_cassette.Cassette to record the api's responses to, or None.
+    :param api_url: the root url of a stand-in for the api, such as a
+        yt_cassette.FakeYoutubeServer, to send requests to instead of youtube, or None. its
+        discovery document is downloaded from it, and not saved in the cache directory.
+    :return:
+    """
+    global _cassette, _api_url
+    _cassette = cassette
+    _api_url = api_url
+    if api_url is not None and not api_url.endswith('/'):
+        _api_url = api_url + '/'
+
+
+def load_discovery_document(cache_dir=DEFAULT_CACHE_DIR, refresh=False, http=None):
+    """
+    get the youtube api discovery document, from the cache directory if it has been saved
+    there. otherwise the copy shipped with google-api-python-client is used, or if there is
+    none the document is downloaded. either way it is saved to the cache directory, and is only
+    downloaded again on request.
+    :param cache_dir: the directory to keep the document in.
+    :param refresh: if True, download the document again, replacing the saved copy.
+    :param http: the http transport to download with. if None, a new one is made.
+    :return: the parsed discovery document.
+    """
+    if _api_url is not None:
+        return _load_stand_in_discovery_document(_api_url + DISCOVERY_PATH, http)
+    path = os.path.join(cache_dir, DISCOVERY_FILENAME)
+    with _discovery_lock:
+        if not refresh and path in _discovery_documents:
+            return _discovery_documents[path]
+        content = None
+        if not refresh and os.path.isfile(path):
+            with open(path) as f_handle:
+                content = f_handle.read()
+        if content is None and not refresh:
+            try:
+                from googleapiclient.discovery_cache import get_static_doc
+                content = get_static_doc(API_YOUTUBE_SERVICE, API_VERSION)
+            except ImportError:     # pragma: no cover
+                pass
+        if content is None:
+            content = _download_discovery_document(DISCOVERY_URL, http)
+        document = json.loads(content)
+        if refresh or not os.path.isfile(path):
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            # written aside and moved into place, so a reader never sees half a document.
+            with open(path + '.tmp', 'w') as f_handle:
+                f_handle.write(content)
+            replace_file(path + '.tmp', path)
+        _discovery_documents[path] = document
+        return document
+
+
+def _download_discovery_document(url, http=None):
+    """
+    :param url: the url of the discovery document.
+    :param http: the http transport to download with. if None, a new one is made.
+    :return: the text of the document.
+    """
+    if http is None:
+        http = create_http()
+    resp, content = http.request(url)
+    if resp.status != 200:
+        raise RuntimeError("""Error in load_discovery_document(d, r, h):
+                           could not download the discovery document. status = """ +
+                           str(resp.status))
+    if not isinstance(content, str):
+        content = content.decode('utf-8')
+    return content
+
+
+def _load_stand_in_discovery_document(url, http=None):
+    """
+    get the discovery document of a stand-in for the api, downloading it once per run.
+    :param url: the url of the discovery document.
+    :param http: the http transport to download with. if None, a new one is made.
+    :return: the parsed discovery document.
+    """
+    with _discovery_lock:
+        if url not in _discovery_documents:
+            _discovery_documents[url] = json.loads(_download_discovery_document(url, http))
+        return _discovery_documents[url]
+
+
+def create_http():
+    """
+    generate an http transport for an api object. the transport keeps its connection to the
+    api open between requests, so it should be created once and reused. like the api object,
+    it is not thread-safe.
+    :return: the httplib2.Http object, wrapped in a yt_cassette.RecordingHttp if responses are
+        being recorded.
+    """
+    http = httplib2.Http(timeout=API_TIMEOUT)
+    if _cassette is not None:
+        try:
+            from scripts.yt_cassette import RecordingHttp
+        except ImportError:
+            from yt_cassette import RecordingHttp
+        http = RecordingHttp(http, _cassette)
+    return http
+
+
+def create_youtube_api(developer_key=None, http=None, discovery_document=None):
     """
     generate an api object for interfacing with the google youtube api.
+    the api object should be reused for every request of its thread, so requests share the
+    open connection of its transport.
     :param developer_key: api_key for use by developers
+    :param http: the http transport to send requests through. if None, a new one is made.
+    :param discovery_document: the parsed discovery document to build the api object from. if
+        None, the document in the default cache directory is used.
     :return:
     """
     try:
         if developer_key is None:
             raise RuntimeError(" '<api_key>' developerKey cannot be null.")
-        api = discovery.build(serviceName=API_YOUTUBE_SERVICE, version=API_VERSION,
-                              developerKey=developer_key)
+        if http is None:
+            http = create_http()
+        if discovery_document is None:
+            discovery_document = load_discovery_document()
+        api = discovery.build_from_document(discovery_document, developerKey=developer_key,
+                                            http=http)
         return api
     except HttpError as http_excp:    # pragma: no cover
         if "HttpError 400" in str(http_excp):
@@ -250,11 +793,14 @@ def create_youtube_api(developer_key=None):
                                is key a valid api_key? is key spelt correctly?""")
 
 
-def get_association_list(channel_id, api):
+def get_association_list(channel_id, api, cache=None, controller=None):
     """
     grab a list of associated channels
     :param channel_id: the id of the channel to collect associations from.
     :param api: the google api object.
+    :param cache: a ChannelCache to read from first, and to store fetched details in.
+    :param controller: an AimdController to send requests through. throttled requests are
+        retried whether or not one is given.
     :return: a list of (associated channel name, associated channel id).
     """
 
@@ -264,10 +810,15 @@ def get_association_list(channel_id, api):
         :return: list of associate channels
         """
 
-        result = api.channels().list(part='brandingSettings', id=channel_id).execute()
+        result = execute_request(api.channels().list(part='brandingSettings', id=channel_id),
+                                 controller)
         if len(result['items']) == 0:
             return None
-        channels = result['items'][0]['brandingSettings']['channel']['featuredChannelsUrls']
+        channel_info = result['items'][0]['brandingSettings']['channel']
+        if cache is not None:
+            cache.put(channel_id, channel_info.get('title'),
+                      channel_info.get('featuredChannelsUrls'))
+        channels = channel_info['featuredChannelsUrls']
         for channel in channels:
             associate_list.append(channel)
 
@@ -275,6 +826,10 @@ def get_association_list(channel_id, api):
         raise RuntimeError("""Error in get_association_list(i, a):
                            'i' or 'a' parameter was None.""")
     try:
+        if cache is not None:
+            cached = cache.get(channel_id)
+            if cached is not None:
+                return cached[1]
         associate_list = list()
         _create_associate_list()
         return associate_list
@@ -289,15 +844,22 @@ def get_association_list(channel_id, api):
             raise RuntimeError("""Error in get_association_list(i, a):
                                failed request to youtube api - check the api_key is correctly
                                spelt.""")
+        if is_retryable_error(http_excp):
+            raise RuntimeError("""Error in get_association_list(i, a):
+                               the youtube api was still refusing requests after retrying them.
+                               """ + str(http_excp))
     except KeyError:
         return None
 
 
-def extract_user_name(channel_id, api):
+def extract_user_name(channel_id, api, cache=None, controller=None):
     """
     get the username for a given channel
     :param channel_id: the id of the channel to collect the user name from.
     :param api: the google api object.
+    :param cache: a ChannelCache to read from first, and to store fetched details in.
+    :param controller: an AimdController to send requests through. throttled requests are
+        retried whether or not one is given.
     :return: the user name.
     """
 
@@ -306,15 +868,24 @@ def extract_user_name(channel_id, api):
         grab the channel title through an api brandingSettings request
         :return: channel title
         """
-        result = api.channels().list(part='brandingSettings', id=channel_id).execute()
+        result = execute_request(api.channels().list(part='brandingSettings', id=channel_id),
+                                 controller)
         if len(result['items']) == 0:
             return None
-        return result['items'][0]['brandingSettings']['channel']['title']
+        channel_info = result['items'][0]['brandingSettings']['channel']
+        if cache is not None:
+            cache.put(channel_id, channel_info.get('title'),
+                      channel_info.get('featuredChannelsUrls'))
+        return channel_info['title']
 
     if channel_id is None or api is None:
         raise RuntimeError("""Error in extract_user_name(i, a):
                            'i' or 'a' parameter was None.""")
     try:
+        if cache is not None:
+            cached = cache.get(channel_id)
+            if cached is not None:
+                return cached[0]
         title = _find_title()
         return title
     except AttributeError as att_excp:
@@ -329,10 +900,160 @@ def extract_user_name(channel_id, api):
             raise RuntimeError("""Error in extract_user_name(i, a):
                                failed request to youtube api - check the api_key is correctly
                                spelt.""")
+        if is_retryable_error(http_excp):
+            raise RuntimeError("""Error in extract_user_name(i, a):
+                               the youtube api was still refusing requests after retrying them.
+                               """ + str(http_excp))
     except KeyError:
         return None
 
 
+def _declare_failed_chunk(logger, id_chunk, excp, failed):
+    """
+    warn of a request for channel details that failed, and note its channels.
+    :param logger: the Logger object for message output.
+    :param id_chunk: the ids of the channels requested.
+    :param excp: the exception the request failed with.
+    :param failed: a list to add the ids to, or None.
+    :return:
+    """
+    declare_warning(logger, """Could not retrieve the details of {} channels, from {} to {}.
+                    The request failed with: {}""".format(len(id_chunk), id_chunk[0],
+                                                          id_chunk[-1], excp))
+    if failed is not None:
+        failed.extend(id_chunk)
+
+
+def chunk_channel_ids(channel_ids, cache=None):
+    """
+    split channels into the chunks to request them in, of up to MAX_IDS_PER_REQUEST channels.
+    if the cache is revalidating, channels sent together in an earlier request are chunked as
+    they were, so the request can be made conditional on the etag of its response.
+    :param channel_ids: list of unique channel ids.
+    :param cache: a ChannelCache holding the earlier requests.
+    :return: list of lists of channel ids.
+    """
+    id_chunks = list()
+    if cache is not None and cache.revalidate:
+        id_chunks.extend(cache.get_response_chunks(channel_ids))
+        chunked = set(channel_id for id_chunk in id_chunks for channel_id in id_chunk)
+        channel_ids = [channel_id for channel_id in channel_ids if channel_id not in chunked]
+    id_chunks.extend(channel_ids[start:start + MAX_IDS_PER_REQUEST]
+                     for start in range(0, len(channel_ids), MAX_IDS_PER_REQUEST))
+    return id_chunks
+
+
+def get_channel_details(channel_ids, api, cache=None, controller=None, logger=None,
+                        failed=None, etags=None):
+    """
+    get the titles and associates of many channels, through batched api requests.
+    each brandingSettings request covers up to MAX_IDS_PER_REQUEST channels. a request that
+    fails is logged, and the other requests are still sent.
+    :param channel_ids: the ids of the channels to collect details from.
+    :param api: the google api object.
+    :param cache: a ChannelCache to read from first, and to store fetched details in.
+    :param controller: an AimdController to send requests through. throttled requests are
+        retried whether or not one is given.
+    :param logger: logging object for warning of failed requests.
+    :param failed: a list to add the ids of channels whose request failed to, so they can be
+        told apart from channels the api did not return.
+    :param etags: a dict to add the etag of each channel fetched or revalidated to.
+    :return: dict of channel id to (channel title, list of associated channel ids). channels
+        the api did not return, or whose request failed, are left out. the title or the list
+        is None if unavailable.
+    """
+
+    def _unique_ids():
+        """
+        remove repeated channel ids, keeping the order they were given in.
+        :return: list of channel ids
+        """
+        seen_ids = set()
+        unique_ids = list()
+        for channel_id in channel_ids:
+            if channel_id not in seen_ids:
+                seen_ids.add(channel_id)
+                unique_ids.append(channel_id)
+        return unique_ids
+
+    def _request_details(id_chunk):
+        """
+        grab the details of a chunk of channels through a single api brandingSettings request.
+        if the cache is revalidating, the request is conditional on the etag of the last
+        response, and an unchanged response reuses the cached details.
+        :param id_chunk: list of no more than MAX_IDS_PER_REQUEST channel ids.
+        :return:
+        """
+        request = api.channels().list(part='brandingSettings', id=','.join(id_chunk),
+                                      maxResults=MAX_IDS_PER_REQUEST)
+        stored = None
+        if cache is not None and cache.revalidate:
+            response_etag = cache.get_response_etag(id_chunk)
+            if response_etag is not None:
+                stored = cache.get_stale_many(response_etag[1])
+                # only revalidate if every channel of the last response is still cached.
+                if len(stored) == len(response_etag[1]):
+                    request.headers['If-None-Match'] = response_etag[0]
+                else:
+                    stored = None
+        try:
+            result = execute_request(request, controller)
+        except HttpError as http_excp:
+            if stored is None or getattr(http_excp, 'resp', None) is None or \
+                    http_excp.resp.status != 304:
+                raise
+            details.update(stored)
+            cache.refresh_many(stored)
+            if etags is not None:
+                etags.update(cache.get_etags(stored))
+            return
+        fetched = dict()
+        fetched_etags = dict()
+        for item in result['items']:
+            channel = item.get('brandingSettings', {}).get('channel', {})
+            fetched[item['id']] = (channel.get('title'), channel.get('featuredChannelsUrls'))
+            fetched_etags[item['id']] = item.get('etag')
+        details.update(fetched)
+        if etags is not None:
+            etags.update(fetched_etags)
+        if cache is not None:
+            cache.put_many(fetched, etags=fetched_etags)
+            if 'etag' in result:
+                cache.put_response_etag(id_chunk, result['etag'], list(fetched))
+
+    if channel_ids is None or api is None:
+        raise RuntimeError("""Error in get_channel_details(i, a):
+                           'i' or 'a' parameter was None.""")
+    details = dict()
+    ids = _unique_ids()
+    if cache is not None:
+        details.update(cache.get_many(ids))
+        ids = [channel_id for channel_id in ids if channel_id not in details]
+    for id_chunk in chunk_channel_ids(ids, cache):
+        try:
+            _request_details(id_chunk)
+        except AttributeError as att_excp:
+            if 'has no attribute' in str(att_excp):
+                raise RuntimeError("""Error in get_channel_details(i, a):
+                                   was expecting 'a' to be a youtube api client.""")
+            else:
+                raise att_excp
+        except HttpError as http_excp:
+            # unreliable to test
+            if "HttpError 400" in str(http_excp):     # pragma: no cover
+                raise RuntimeError("""Error in get_channel_details(i, a):
+                                   failed request to youtube api - check the api_key is
+                                   correctly spelt.""")
+            if is_retryable_error(http_excp):       # pragma: no cover
+                raise RuntimeError("""Error in get_channel_details(i, a):
+                                   the youtube api was still refusing requests after retrying
+                                   them. """ + str(http_excp))
+            _declare_failed_chunk(logger, id_chunk, http_excp, failed)
+        except KeyError as key_excp:
+            _declare_failed_chunk(logger, id_chunk, key_excp, failed)
+    return details
+
+
 def convert_graph_to_text(graph, filename):
     """
     given a graph object, write a file containing the adjacency list.
@@ -341,7 +1062,8 @@ def convert_graph_to_text(graph, filename):
     :param filename: the name of the file to write to.
     :return:
     """
-    networkx.write_adjlist(graph, filename)
+    with open_file(filename, 'wb') as f_handle:
+        networkx.write_adjlist(graph, f_handle)
     return
 
 
@@ -352,7 +1074,8 @@ def convert_graph_to_graphml(graph, filename):
     :param filename: the name of the file to write to.
     :return:
     """
-    networkx.write_graphml(graph, filename, prettyprint=True)
+    with open_file(filename, 'wb') as f_handle:
+        networkx.write_graphml(graph, f_handle, prettyprint=True)
     return
 
 
@@ -363,7 +1086,8 @@ def convert_graph_to_gml(graph, filename):
     :param filename: the name of the file to write to.
     :return:
     """
-    networkx.write_gml(graph, filename)
+    with open_file(filename, 'wb') as f_handle:
+        networkx.write_gml(graph, f_handle)
     return
 
 
@@ -374,7 +1098,8 @@ def convert_graph_to_gexf(graph, filename):
     :param filename: the name of the file to write to.
     :return:
     """
-    networkx.write_gexf(graph, filename)
+    with open_file(filename, 'wb') as f_handle:
+        networkx.write_gexf(graph, f_handle)
     return
 
 
@@ -385,152 +1110,726 @@ def convert_graph_to_yaml(graph, filename):
     :param filename: the name of the file to write to.
     :return:
     """
-    networkx.write_yaml(graph, filename)
+    with open_file(filename, 'w') as f_handle:
+        networkx.write_yaml(graph, f_handle)
+    return
+
+
+def find_root_node(graph):
+    """
+    find the initial channel of a graph, in a single pass over the nodes.
+    :param graph: the networkX graph object.
+    :return: the first node of degree 0, or of the lowest degree if none is 0.
+        None if the graph has no nodes.
+    """
+    root_node = None
+    root_degree = None
+    for node, data in graph.nodes(data=True):
+        degree = data.get('degree')
+        if degree is None:
+            continue
+        if root_degree is None or degree < root_degree:
+            root_node, root_degree = node, degree
+            if degree == 0:
+                break
+    if root_node is None and len(graph) > 0:
+        root_node = next(iter(graph))
+    return root_node
+
+
+def _node_record(node, data):
+    """
+    :param node: a node of the graph.
+    :param data: the node's attributes.
+    :return: json text of the node's id and attributes, without the closing brace.
+    """
+    record = json.dumps(node)
+    for key, value in data.items():
+        if key not in ('id', 'children'):
+            record += ', ' + json.dumps(key) + ': ' + json.dumps(value)
+    return '{"id": ' + record
+
+
+def _write_node_link_json(graph, f_handle):
+    """
+    stream the graph as node-link json, as networkx's json_graph.node_link_data.
+    :param graph: the networkX graph object.
+    :param f_handle: the file to write to.
+    :return:
+    """
+    f_handle.write('{"directed": false, "multigraph": false, "graph": ' +
+                   json.dumps(dict(graph.graph)) + ', "nodes": [')
+    separator = '\n'
+    for node, data in graph.nodes(data=True):
+        f_handle.write(separator + _node_record(node, data) + '}')
+        separator = ',\n'
+    f_handle.write('],\n"' + JSON_LINKS_KEY + '": [')
+    separator = '\n'
+    for node_a, node_b in graph.edges():
+        f_handle.write(separator + '{"source": ' + json.dumps(node_a) + ', "target": ' +
+                       json.dumps(node_b) + '}')
+        separator = ',\n'
+    f_handle.write(']}\n')
+
+
+def _write_tree_json(graph, f_handle):
+    """
+    stream the graph as tree json, as networkx's json_graph.tree_data, from the root node.
+    the graph is not a tree, so the tree is its breadth first spanning tree: each channel is
+    the child of the channel it was first found through. channels the root cannot reach are
+    left out.
+    :param graph: the networkX graph object.
+    :param f_handle: the file to write to.
+    :return:
+    """
+    root = find_root_node(graph)
+    if root is None:
+        raise RuntimeError("""Error in convert_graph_to_json(g, f, l):
+                           a tree can not be made from 'g', as it has no nodes.""")
+    children = {root: []}
+    queue = [root]
+    for node in queue:
+        for neighbour in graph[node]:
+            if neighbour not in children:
+                children[neighbour] = []
+                children[node].append(neighbour)
+                queue.append(neighbour)
+    del queue
+    node_data = dict(graph.nodes(data=True))
+    # the children still to write of each node on the path from the root, and whether any of
+    # them has been written, for the separating commas.
+    f_handle.write(_node_record(root, node_data[root]) + ', "children": [')
+    stack = [[iter(children[root]), False]]
+    while stack:
+        node = next(stack[-1][0], None)
+        if node is None:
+            f_handle.write(']}')
+            stack.pop()
+            continue
+        if stack[-1][1]:
+            f_handle.write(',\n')
+        stack[-1][1] = True
+        f_handle.write(_node_record(node, node_data[node]))
+        if children[node]:
+            f_handle.write(', "children": [')
+            stack.append([iter(children[node]), False])
+        else:
+            f_handle.write('}')
+    f_handle.write('\n')
+
+
+def convert_graph_to_json(graph, filename, layout='node_link'):
+    """
+    convert from a networkX graph object, to serialized json format. the json is written a
+    node or edge at a time, so the whole document is never held in memory.
+    :param graph: the networkX graph object.
+    :param filename: the name of the file to write to.
+    :param layout: one of JSON_LAYOUTS. 'node_link' writes lists of nodes and links, as
+        json_graph.node_link_data. 'tree' writes nested children from the initial channel, as
+        json_graph.tree_data.
+    :return:
+    """
+    if layout not in JSON_LAYOUTS:
+        raise RuntimeError("""Error in convert_graph_to_json(g, f, l): 'l' has an unrecognised
+                           value. value of 'l'=""" + str(layout))
+    with open_file(filename, 'w') as f_handle:
+        if layout == 'node_link':
+            _write_node_link_json(graph, f_handle)
+        else:
+            _write_tree_json(graph, f_handle)
     return
 
 
-def convert_graph_to_json(graph, filename):
+def convert_graph_to_json_tree(graph, filename):
     """
-    convert from a networkX graph object, to serialized json format.
+    convert from a networkX graph object, to serialized json in the tree layout.
     :param graph: the networkX graph object.
     :param filename: the name of the file to write to.
     :return:
     """
-    networkx.write_gml(graph, filename)
-    # find the lowest degree node
-    # store [node_name, degree] and compare for the lowest degree
-    root_node = [graph.nodes()[0], graph.node[graph.nodes()[0]]['degree']]
-    for node in graph.nodes():
-        if graph.node[node]['degree'] < root_node[1]:
-            root_node = [node, graph.node[node]['degree']]
-            break
-    data = json_graph.tree_data(graph, root=root_node[0])
-    with open(filename, 'w') as f_handle:
-        f_handle.write(json.dumps(data))
+    convert_graph_to_json(graph, filename, layout='tree')
     return
 
 
-def generate_output(graph, output_format, filename):
+def split_output_formats(output_format):
+    """
+    :param output_format: an output format, several separated by commas, or a list of them.
+    :return: list of the output formats, without repeats.
+    """
+    if not isinstance(output_format, (list, tuple)):
+        output_format = output_format.split(',')
+    formats = list()
+    for name in output_format:
+        name = name.strip()
+        if name not in formats:
+            formats.append(name)
+    return formats
+
+
+def output_formats_argument(value):
+    """
+    check the output formats given to the script, as argparse's choices would for one format.
+    :param value: the value of the -o option.
+    :return: the value, unchanged.
+    """
+    for output_format in split_output_formats(value):
+        if output_format not in OUTPUT_FORMATS:
+            raise argparse.ArgumentTypeError("invalid choice: '" + output_format +
+                                             "' (choose from " + ', '.join(OUTPUT_FORMATS) + ")")
+    return value
+
+
+def event_rates_argument(value):
+    """
+    parse the per event rates given to the script, e.g. 'node=0.1,edge=0.01'.
+    :param value: the value of the --log_sample or --log_rate_limit option.
+    :return: dict of event to its rate.
+    """
+    rates = dict()
+    for item in value.split(','):
+        event, _, rate = item.partition('=')
+        event = event.strip()
+        if event not in LOG_EVENTS:
+            raise argparse.ArgumentTypeError("invalid event: '" + event + "' (choose from " +
+                                             ', '.join(LOG_EVENTS) + ")")
+        try:
+            rates[event] = float(rate)
+        except ValueError:
+            raise argparse.ArgumentTypeError("invalid rate for '" + event + "': '" + rate + "'")
+        if rates[event] <= 0:
+            raise argparse.ArgumentTypeError("the rate for '" + event + "' should be positive.")
+    return rates
+
+
+def output_filename(filename, output_format):
+    """
+    name the file an output format is written to, when several formats are written at once.
+    :param filename: the filename given to the script.
+    :param output_format: the output format.
+    :return: the filename, with its extension replaced by the format's. a compression suffix
+        is kept.
+    """
+    root = os.path.splitext(strip_compression(filename))[0]
+    return compressed_filename(root + '.' + OUTPUT_EXTENSIONS[output_format],
+                               compression_of(filename))
+
+
+def _output_writer(output_format):
+    """
+    find the conversion function for the output format. a name of the form 'module.function'
+    refers to a function in another module of this package, which is imported now.
+    :param output_format: the output format.
+    :return: the conversion function.
+    """
+    writer_name = OUTPUT_WRITERS[output_format]
+    if '.' not in writer_name:
+        return globals()[writer_name]
+    module_name, function_name = writer_name.rsplit('.', 1)
+    try:
+        module = importlib.import_module('scripts.' + module_name)
+    except ImportError:
+        module = importlib.import_module(module_name)
+    return getattr(module, function_name)
+
+
+# the graph written by the processes of an output pool.
+_output_graph = None
+
+
+def _set_output_graph(graph):
+    """
+    keep the graph to write in a process of the output pool, frozen so no writer changes it.
+    :param graph: the networkX graph object.
+    :return:
+    """
+    global _output_graph
+    _output_graph = networkx.freeze(graph)
+
+
+def _write_format(graph, output_format, filename):
+    """
+    write the graph in one format, to a temporary file moved into place once it is complete.
+    a format that fails leaves no file, nor any file already at the filename, changed.
+    :param graph: the networkX graph object.
+    :param output_format: the output format.
+    :param filename: the file to write to.
+    :return: (seconds taken to write the format, or None if it failed, the error message or
+        None).
+    """
+    directory, name = os.path.split(filename)
+    # the name keeps its suffixes, as writers compress the file by them.
+    temp_filename = os.path.join(directory, '.tmp.{}.{}'.format(os.getpid(), name))
+    start = time.time()
+    try:
+        _output_writer(output_format)(graph, temp_filename)
+        replace_file(temp_filename, filename)
+    except Exception as excp:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        return None, '{}: {}'.format(type(excp).__name__, excp)
+    return time.time() - start, None
+
+
+def _write_output(task):
+    """
+    write the graph of an output pool process in one format.
+    :param task: tuple of (output format, the file to write to).
+    :return: as _write_format.
+    """
+    output_format, filename = task
+    return _write_format(_output_graph, output_format, filename)
+
+
+def generate_output(graph, output_format, filename, processes=None, compress=None,
+                    metrics=None):
     """
     Send the graph to console as adjacency list text, or to a file in a specified format.
+    several formats are written at once, from a pool of processes, each to the filename with
+    the format's extension.
+    files named with a .gz, .bz2 or .xz suffix are compressed as they are written.
+    each file is moved into place once complete. a format that fails to write does not stop
+    the others, and is reported once they are written.
     :param graph: The networkX graph object
-    :param output_format: how to format the output graph data
+    :param output_format: how to format the output graph data. several formats may be given,
+        separated by commas, or as a list.
     :param filename: the file to write to. if output_format is None, then this is ignored.
+    :param processes: how many processes write several formats. if None, one per format, up
+        to the number of cpus.
+    :param compress: one of COMPRESSIONS, to compress every file with, adding its suffix to
+        the filenames. formats read in place, such as sqlite, are not compressed.
+    :param metrics: a CrawlMetrics to record the time each format takes to write in.
     :return:
+    :raises RuntimeError: if any format could not be written, naming each with its error.
     """
-
-    def _get_output_funcs_list():
-        """
-        get a sequence of conversion functions.
-        :return: list of conversion functions.
-        """
-        return [convert_graph_to_text, convert_graph_to_graphml, convert_graph_to_gml,
-                convert_graph_to_gexf, convert_graph_to_yaml]
-
     if output_format is None:
         for text in networkx.generate_adjlist(graph):
 
             print(text)
-    elif output_format not in OUTPUT_FORMATS:
-        raise RuntimeError("""Error in generate_output(g, o, f): 'o' has an unrecognised value.
-                           value of 'o'=""" + output_format)
-    else:
-        # temporary mapping of format codes to formatter funcs.
-        output_funcs = _get_output_funcs_list()
-        output_mapping = dict()
-        for index in range(len(OUTPUT_FORMATS)):
-            try:
-                output_mapping[OUTPUT_FORMATS[index]] = output_funcs[index]
-            # do not test: exists as catch
-            except IndexError:      # pragma: no cover
-                break
+        return
+    formats = split_output_formats(output_format)
+    for name in formats:
+        if name not in OUTPUT_FORMATS:
+            raise RuntimeError("""Error in generate_output(g, o, f): 'o' has an unrecognised
+                               value. value of 'o'=""" + name)
+    tasks = list()
+    for name in formats:
+        target = filename if len(formats) == 1 else output_filename(filename, name)
+        if name not in UNCOMPRESSED_FORMATS:
+            target = compressed_filename(target, compress)
+        tasks.append((name, target))
+    if len(tasks) == 1:
         # now convert to the format and write to file.
-        output_mapping[output_format](graph, filename)
+        results = [_write_format(graph, formats[0], tasks[0][1])]
+    else:
+        import multiprocessing
+        if processes is None:
+            processes = min(len(formats), multiprocessing.cpu_count())
+        # the graph is handed to each process once, when it starts, rather than with every
+        # format.
+        pool = multiprocessing.Pool(processes, initializer=_set_output_graph, initargs=(graph,))
+        try:
+            results = pool.map(_write_output, tasks)
+        finally:
+            pool.terminate()
+            pool.join()
+    errors = list()
+    for (name, target), (seconds, error) in zip(tasks, results):
+        if error is not None:
+            errors.append('{} ({}) - {}'.format(name, target, error))
+        elif metrics is not None:
+            metrics.observe_export(name, seconds)
+    if len(errors) > 0:
+        raise RuntimeError("""Error in generate_output(g, o, f): could not write every format.
+                           """ + '; '.join(errors))
     return
 
 
-def build_graph(graph, api, max_depth=1, initial_channel=None, logger=None):
+def write_checkpoint(filename, state):
+    """
+    save the state of a crawl to a gzipped json file. the file is replaced atomically, so a
+    crash while writing leaves the previous checkpoint intact.
+    :param filename: the name of the checkpoint file.
+    :param state: dict of the crawl state, as made by build_graph.
+    :return:
+    """
+    temp_filename = filename + '.tmp'
+    with gzip.open(temp_filename, 'wb') as f_handle:
+        f_handle.write(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+    replace_file(temp_filename, filename)
+
+
+def read_checkpoint(filename):
+    """
+    load the state of a crawl saved by write_checkpoint.
+    :param filename: the name of the checkpoint file.
+    :return: dict of the crawl state.
+    """
+    with gzip.open(filename, 'rb') as f_handle:
+        state = json.loads(f_handle.read().decode('utf-8'))
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise RuntimeError("""Error in read_checkpoint(f):
+                           'f' is not a checkpoint this version of the script can resume.""")
+    return state
+
+
+def build_graph(graph, api, max_depth=1, initial_channel=None, logger=None, cache=None,
+                workers=1, api_factory=None, fetcher=None, checkpoint=None,
+                checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, resume=None, controller=None,
+                initial_details=None, node_key='title', stream=None, metrics=None,
+                profiler=None):
     """
     given an initial graph and node, build a complete tree graph out to a given depth.
+    the details of every channel in a degree are looked up together, in batched requests.
+    the graph is built keyed by channel id in a CompactGraphBuilder, and only added to the
+    networkx graph once the crawl is done.
     :param graph: the networkx graph object to work with.
     :param max_depth: furthermost depth to build to, e.g. 1 gets immediate associates,
         2 gets associates of immediate associates, etc.
     :param initial_channel: the channel id for the initial node
     :param logger: logging object for generating verbose messages
+    :param cache: a ChannelCache to read channel details from first.
+    :param workers: how many threads send the requests of a degree concurrently.
+    :param api_factory: function creating a new api object. required if workers is more than
+        1, as each thread needs its own api object.
+    :param fetcher: function taking a list of channel ids, and a list to add the ids of failed
+        lookups to, and returning their details, as get_channel_details does. if given, it is
+        used instead of api, cache and workers.
+    :param checkpoint: a file to save the state of the crawl to, after each degree and every
+        checkpoint_interval seconds.
+    :param checkpoint_interval: seconds between checkpoints written during a degree.
+    :param resume: a checkpoint file to continue the crawl from. the graph is replaced by the
+        graph saved in the checkpoint.
+    :param controller: an AimdController to send requests through. if None, one is made that
+        allows up to workers requests in flight.
+    :param initial_details: dict of channel id to (title, associate ids) already known, such
+        as the initial channel's from verifying the arguments. these are not requested again.
+    :param node_key: how to label the nodes of the graph, 'title' or 'id'. channels whose
+        title is taken by an earlier channel are labelled 'title (id)'.
+    :param stream: a GraphStreamWriter to write each node and edge to as it is found. it is
+        flushed after each degree.
+    :param metrics: a CrawlMetrics to count the requests, and the nodes and edges added in
+        each degree, in.
+    :param profiler: a PhaseProfiler to profile each degree, and the conversion to networkx, in.
     :return:
     """
     if initial_channel is None:
         return
+    if workers < 1 or (workers > 1 and api_factory is None):
+        raise RuntimeError("""Error in build_graph(g, a, m, i, l, c, w, f):
+                           'w' should be a positive integer, and 'f' is required if 'w' > 1.""")
+
+    def _fetch_chunk(id_chunk, failed_ids):
+        """
+        look up a chunk of channels with the api object of the current thread.
+        :param id_chunk: list of no more than MAX_IDS_PER_REQUEST channel ids.
+        :param failed_ids: list to add the ids of the chunk to if its request fails.
+        :return: dict of channel id to (title, associate ids).
+        """
+        if getattr(thread_data, 'api', None) is None:
+            thread_data.api = api_factory()
+        return get_channel_details(id_chunk, thread_data.api, cache, controller, logger,
+                                   failed_ids)
+
+    def _resolve_channels(channel_ids):
+        """
+        look up the details of any channels not yet seen, in as few requests as possible.
+        :param channel_ids: the ids of the channels to look up.
+        :return:
+        """
+        unresolved_ids = list()
+        for channel_id in channel_ids:
+            if channel_id not in channel_details:
+                # channels missing from the response are not requested again.
+                channel_details[channel_id] = (None, None)
+                unresolved_ids.append(channel_id)
+        if len(unresolved_ids) == 0:
+            return
+        failed_ids = list()
+        if fetcher is not None:
+            channel_details.update(fetcher(unresolved_ids, failed=failed_ids))
+        elif pool is None:
+            channel_details.update(get_channel_details(unresolved_ids, api, cache, controller,
+                                                       logger, failed_ids))
+        else:
+            id_chunks = chunk_channel_ids(unresolved_ids, cache)
+            # results are merged in chunk order, so the graph is built as in the serial path.
+            for details in pool.map(lambda id_chunk: _fetch_chunk(id_chunk, failed_ids),
+                                    id_chunks):
+                channel_details.update(details)
+        # channels whose request failed are left unvisited, to be requested again if featured.
+        for channel_id in failed_ids:
+            channel_details.pop(channel_id, None)
 
     def _transfer_next_ids_to_queue():
         """
-        queue the next se of ids to process.
+        queue the next set of ids to process.
         :return:
         """
-        while len(next_channel_ids) > 0:
-            channel_id = next_channel_ids.pop()
-            if channel_id not in processed_ids:
-                id_queue.put(channel_id)
+        queued_ids = set()
+        del id_queue[:]
+        for assoc_name, assoc_id in next_channel_ids:
+            if assoc_id not in processed_ids and assoc_id not in queued_ids:
+                queued_ids.add(assoc_id)
+                id_queue.append((assoc_name, assoc_id))
+        del next_channel_ids[:]
         return
 
+    def _save_checkpoint():
+        """
+        save everything needed to continue the crawl without repeating any requests.
+        :return:
+        """
+        write_checkpoint(checkpoint, {
+            'version': CHECKPOINT_VERSION, 'initial_channel': initial_channel, 'depth': depth,
+            'graph': builder.state(), 'queue': id_queue, 'processed': list(processed_ids),
+            'next': next_channel_ids, 'details': channel_details})
+
+    def _queued_associates():
+        """
+        collect the associates of every queued channel.
+        :return: generator of associated channel ids.
+        """
+        for _, channel_id in id_queue:
+            associates = channel_details[channel_id][1]
+            if associates is not None:
+                for assoc_id in associates:
+                    yield assoc_id
+
     def _process_associates():
         """
         get the list of associates, produce graph nodes and edges, and prep for future processing.
         :return:
         """
-        associates = get_association_list(current_id, api)
+        associates = channel_details[current_id][1]
         if associates is None:
             declare_warning(logger, """Could not retrieve this channel's associates. This
                             information may be unavailable at this time.
                             channel id = """ + current_id)
         else:
-            for index in range(len(associates)):
-                assoc_id = associates[index]
-                assoc_name = extract_user_name(assoc_id, api)
+            for assoc_id in associates:
+                assoc_name = channel_details.get(assoc_id, (None, None))[0]
                 if assoc_name is not None:
-                    if assoc_name not in graph.nodes():
-                        graph.add_node(assoc_name, degree=depth)
+                    if builder.add_node(assoc_id, assoc_name, depth):
                         declare_new_node(logger, assoc_name)
-                    if (current_name, assoc_name) not in graph.edges() and \
-                            (assoc_name, current_name) not in graph.edges():
-                        graph.add_edge(current_name, assoc_name)
+                        if metrics is not None:
+                            metrics.node_added(depth)
+                        if stream is not None:
+                            stream.add_node(builder.label(assoc_id, node_key), assoc_id,
+                                            assoc_name, depth)
+                    if builder.add_edge(current_id, assoc_id):
                         declare_new_edge(logger, current_name, assoc_name)
-                    if assoc_id not in next_channel_ids:
-                        next_channel_ids.append((assoc_name, assoc_id))
+                        if metrics is not None:
+                            metrics.edge_added(depth)
+                        if stream is not None:
+                            stream.add_edge(builder.label(current_id, node_key),
+                                            builder.label(assoc_id, node_key))
+                    next_channel_ids.append((assoc_name, assoc_id))
                 else:
                     declare_warning(logger, """Could not retrieve this channel's name. This
                                     information may be unavailable at this time.
                                     channel id = """ + assoc_id)
 
-    id_queue = Queue()
+    # channel id -> (title, associate ids), shared by every degree so no channel is fetched twice.
+    channel_details = dict(initial_details or {})
+    builder = CompactGraphBuilder()
+    id_queue = list()
     processed_ids = set()
     next_channel_ids = list()
-    current_name = extract_user_name(initial_channel, api)
-    if current_name is None:
-        raise RuntimeError("""Could not retrieve the initial channel's name. The channel may not
-                           have the required information set to public.""")
-    graph.add_node(current_name, degree=0)
-    id_queue.put((current_name, initial_channel))
-    depth = 1
-    while depth <= max_depth:
-        declare_degree(logger, depth)
-        while id_queue.qsize() > 0 and not id_queue.empty():
-            current_name, current_id, = id_queue.get()
-            _process_associates()
-            processed_ids.add(current_id)
-            declare_processed_users(logger, len(processed_ids))
-            # id_queue.task_done()
-        _transfer_next_ids_to_queue()
-        depth += 1
-    while not id_queue.empty():
-        try:
-            id_queue.get(timeout=0.001)
-        except EmptyQueueException:
-            continue
-    # id_queue.close()
+    thread_data = threading.local()
+    if controller is None:
+        controller = AimdController(workers, metrics=metrics)
+    pool = None
+    if workers > 1 and fetcher is None:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(workers)
+    try:
+        if resume is None:
+            _resolve_channels([initial_channel])
+            current_name = channel_details.get(initial_channel, (None, None))[0]
+            if current_name is None:
+                raise RuntimeError("""Could not retrieve the initial channel's name. The channel
+                                   may not have the required information set to public.""")
+            builder.add_node(initial_channel, current_name, 0)
+            if metrics is not None:
+                metrics.node_added(0)
+            if stream is not None:
+                stream.add_node(builder.label(initial_channel, node_key), initial_channel,
+                                current_name, 0)
+            id_queue.append((current_name, initial_channel))
+            depth = 1
+        else:
+            state = read_checkpoint(resume)
+            if state['initial_channel'] != initial_channel:
+                raise RuntimeError("""Error in build_graph: the checkpoint to resume from was
+                                   made for a different initial channel.""")
+            graph.clear()
+            builder = CompactGraphBuilder.from_state(state['graph'])
+            channel_details.update((channel_id, tuple(details))
+                                   for channel_id, details in state['details'].items())
+            id_queue.extend(tuple(entry) for entry in state['queue'])
+            processed_ids.update(state['processed'])
+            next_channel_ids.extend(tuple(entry) for entry in state['next'])
+            depth = state['depth']
+        last_checkpoint = time.time()
+        while depth <= max_depth:
+            if profiler is not None:
+                profiler.start('degree_{}'.format(depth))
+            declare_degree(logger, depth)
+            if metrics is not None:
+                metrics.degree_started(depth, len(id_queue))
+            _resolve_channels(list(_queued_associates()))
+            for current_name, current_id in id_queue:
+                # only channels processed before resuming from a checkpoint are skipped.
+                if current_id in processed_ids:
+                    continue
+                _process_associates()
+                processed_ids.add(current_id)
+                declare_processed_users(logger, len(processed_ids))
+                if metrics is not None:
+                    metrics.channel_processed()
+                if checkpoint is not None and \
+                        time.time() - last_checkpoint >= checkpoint_interval:
+                    _save_checkpoint()
+                    last_checkpoint = time.time()
+            _transfer_next_ids_to_queue()
+            depth += 1
+            if stream is not None:
+                stream.flush()
+            if checkpoint is not None:
+                _save_checkpoint()
+                last_checkpoint = time.time()
+        if profiler is not None:
+            profiler.start('to_networkx')
+        builder.to_networkx(graph, node_key)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
     return
 
 
+def create_key_pool(arguments, logger=None):
+    """
+    gather the api keys given to the script into a pool, sharing spent quota with earlier runs
+    through the cache directory.
+    :param arguments: the parsed Arguments object.
+    :param logger: logging object for generating verbose messages
+    :return: the ApiKeyPool.
+    """
+    keys = load_api_keys(arguments.api_key, arguments.api_keys)
+    return ApiKeyPool(keys, daily_quota=arguments.daily_quota,
+                      state_file=os.path.join(arguments.cache_dir, QUOTA_STATE_FILENAME),
+                      wait=arguments.wait_for_quota, logger=logger)
+
+
+def create_pooled_api(key_pool, apis=None, discovery_document=None):
+    """
+    generate an api object sending each request with a key from a pool. each key gets its own
+    api object, made when the key is first used, with the http transport of the first.
+    :param key_pool: the ApiKeyPool to take keys from.
+    :param apis: dict of api key to an existing api object to reuse for that key.
+    :param discovery_document: the parsed discovery document to build api objects from.
+    :return: the KeyPoolApi.
+    """
+    http = create_http()
+    pooled_api = KeyPoolApi(key_pool, lambda key: create_youtube_api(
+        developer_key=key, http=http, discovery_document=discovery_document))
+    pooled_api.apis.update(apis or {})
+    return pooled_api
+
+
+def estimate_quota(api, cache, arguments):
+    """
+    project the quota a crawl will spend, from how many channels the initial channel features.
+    :param api: the google api object.
+    :param cache: a ChannelCache to read channel details from first.
+    :param arguments: the parsed Arguments object.
+    :return: the projected quota units.
+    """
+    details = getattr(arguments, 'seed_details', None)
+    if details is None:
+        details = get_channel_details([arguments.id], api, cache)
+    featured = details.get(arguments.id, (None, None))[1] or []
+    return project_quota(arguments.degree, len(featured), MAX_IDS_PER_REQUEST)
+
+
+def crawl(graph, api, cache, arguments, logger=None, key_pool=None, metrics=None,
+          profiler=None):
+    """
+    build the graph with the crawl engine chosen by the script arguments.
+    :param graph: the networkx graph object to work with.
+    :param api: the google api object.
+    :param cache: a ChannelCache to read channel details from first.
+    :param arguments: the parsed Arguments object.
+    :param logger: logging object for generating verbose messages
+    :param key_pool: an ApiKeyPool to share the requests between. if None, every request is
+        sent with the script's api key.
+    :param metrics: a CrawlMetrics to count the crawl in.
+    :param profiler: a PhaseProfiler to profile each degree of the crawl in.
+    :return:
+    """
+    stream = None
+    if arguments.stream is not None:
+        # a resumed crawl adds to the stream of the interrupted one.
+        stream = GraphStreamWriter(arguments.stream, arguments.stream_format,
+                                   arguments.stream_flush, append=arguments.resume is not None)
+    options = dict(max_depth=arguments.degree, initial_channel=arguments.id, logger=logger,
+                   checkpoint=arguments.checkpoint or arguments.resume,
+                   checkpoint_interval=arguments.checkpoint_interval, resume=arguments.resume,
+                   initial_details=getattr(arguments, 'seed_details', None),
+                   node_key=arguments.node_key, stream=stream, metrics=metrics,
+                   profiler=profiler)
+    try:
+        _crawl_with_engine(graph, api, cache, arguments, key_pool, options)
+    finally:
+        if stream is not None:
+            stream.close()
+
+
+def _crawl_with_engine(graph, api, cache, arguments, key_pool, options):
+    """
+    build the graph with the crawl engine chosen by the script arguments.
+    :param graph: the networkx graph object to work with.
+    :param api: the google api object.
+    :param cache: a ChannelCache to read channel details from first.
+    :param arguments: the parsed Arguments object.
+    :param key_pool: an ApiKeyPool to share the requests between, or None.
+    :param options: keyword arguments for build_graph.
+    :return:
+    """
+    if arguments.work_queue is not None:
+        try:
+            from scripts.yt_distributed import CrawlQueue, QueueFetcher
+        except ImportError:
+            from yt_distributed import CrawlQueue, QueueFetcher
+        queue = CrawlQueue(arguments.work_queue)
+        try:
+            build_graph(graph, api, fetcher=QueueFetcher(queue, cache=cache,
+                                                         logger=options['logger']), **options)
+        finally:
+            queue.close()
+    elif arguments.async_crawl:
+        try:
+            from scripts.yt_async import build_graph_async
+        except ImportError:
+            from yt_async import build_graph_async
+        if arguments.api_url is not None:
+            options['base_url'] = arguments.api_url.rstrip('/') + '/youtube/v3/'
+        build_graph_async(graph, arguments.api_key, cache=cache,
+                          max_in_flight=arguments.max_in_flight, key_pool=key_pool, **options)
+    else:
+        document = load_discovery_document(arguments.cache_dir)
+        if key_pool is not None:
+            api_factory = lambda: create_pooled_api(key_pool, discovery_document=document)
+        else:
+            api_factory = lambda: create_youtube_api(developer_key=arguments.api_key,
+                                                     discovery_document=document)
+        build_graph(graph, api, cache=cache, workers=arguments.workers, api_factory=api_factory,
+                    **options)
+
+
 def build_colour_generator():
     """
     create a generator for assigning colours.
@@ -547,33 +1846,90 @@ def main_function():
     the runner function of the main_script
     :return:
     """
+    logger = None
+    cassette = None
     try:
         parser = setup_arg_parser()
         arguments = verify_arguments(parser, None)
-        logger = prepare_logger(arguments.verbose)
-        api = create_youtube_api(developer_key=arguments.api_key)
+        profiler = getattr(arguments, 'profiler', None)
+        cassette = getattr(arguments, 'cassette', None)
+        logger = prepare_logger(arguments.verbose, arguments.log_sample, arguments.log_rate_limit)
+        cache = ChannelCache(arguments.cache_dir, ttl=arguments.cache_ttl,
+                             bypass=arguments.bypass_cache, revalidate=arguments.recrawl)
+        key_pool = create_key_pool(arguments, logger)
+        verified_apis = dict()
+        if getattr(arguments, 'api', None) is not None:
+            # the api object that verified the arguments is reused, for its open connection.
+            verified_apis[arguments.api_key] = arguments.api
+        api = create_pooled_api(key_pool, verified_apis,
+                                load_discovery_document(arguments.cache_dir))
         # colour generator
 
         youtube_user_graph = networkx.Graph()
         youtube_user_graph.clear()
-        build_graph(youtube_user_graph, api, max_depth=arguments.degree,
-                    initial_channel=arguments.id, logger=logger)
-        generate_output(youtube_user_graph, arguments.output, arguments.filename)
-        # causes issues due to matplotlib use.
-        if arguments.show_graph:            # pragma: no cover
+        metrics = None
+        reporter = None
+        output_error = None
+        if arguments.metrics is not None:
+            metrics = CrawlMetrics()
+            metrics.track_cache(cache)
+            reporter = MetricsReporter(metrics, arguments.metrics, arguments.metrics_interval)
+            reporter.start()
+        try:
+            try:
+                projected = estimate_quota(api, cache, arguments)
+                if arguments.project_quota:
+                    print('Projected quota for degree {}: {} units, of {} remaining on {} api '
+                          'keys.'.format(arguments.degree, projected, key_pool.remaining(),
+                                         len(key_pool.keys)))
+                    return
+                declare_projected_quota(logger, projected, key_pool.remaining())
+                crawl(youtube_user_graph, api, cache, arguments, logger, key_pool, metrics,
+                      profiler)
+            finally:
+                key_pool.save()
+                cache.close()
+            with profile_phase(profiler, 'output'):
+                try:
+                    generate_output(youtube_user_graph, arguments.output, arguments.filename,
+                                    compress=arguments.compress, metrics=metrics)
+                # reported once the graph is rendered, which does not need the files.
+                except RuntimeError as excp:
+                    output_error = excp
+        finally:
+            if reporter is not None:
+                reporter.stop()
+        if arguments.render is not None or arguments.show_graph:
+            try:
+                from scripts import yt_render
+            except ImportError:
+                import yt_render
             colours = build_colour_generator()
-            colours_dict = dict()
-            for i in range(arguments.degree + 1):
-                colours_dict[i] = next(colours)
-            import matplotlib.pyplot as plt
-            # labels=networkx.draw_networkx_labels(
-            #     youtube_user_graph,pos=networkx.spring_layout(youtube_user_graph))
-            networkx.draw_networkx(youtube_user_graph, with_labels=True,
-                                   node_color=[colours_dict[youtube_user_graph.node[node]['degree']]
-                                               for node in youtube_user_graph])
-            plt.show()
+            colours = [next(colours) for _ in range(arguments.degree + 1)]
+            if arguments.render is not None:
+                with profile_phase(profiler, 'render'):
+                    yt_render.render_graph(youtube_user_graph, arguments.render, colours=colours,
+                                           label_count=arguments.render_labels)
+            # causes issues due to matplotlib use.
+            if arguments.show_graph:            # pragma: no cover
+                with profile_phase(profiler, 'show'):
+                    yt_render.show_graph(youtube_user_graph, colours=colours,
+                                         label_count=arguments.render_labels)
+        if output_error is not None:
+            print('ERROR: ' + str(output_error))
     except (AttributeError, HttpError) as excp:
         print('ERROR: ' + str(excp))
+    except QuotaExhaustedError as excp:
+        print('ERROR: ' + str(excp))
+        if arguments.checkpoint or arguments.resume:
+            print('The crawl can be continued with --resume ' +
+                  (arguments.checkpoint or arguments.resume))
+    finally:
+        if logger is not None:
+            stop_logging(logger)
+        if cassette is not None:
+            cassette.save()
+        configure_transport()
 
 if __name__ == '__main__':
     main_function()
@@ -0,0 +1,100 @@
+"""
+Indexed sqlite output for the youtube graphing script.
+The graph is written to a nodes(id, title, degree) table and an edges(src, dst) table, each
+edge once, so neighbourhood and degree queries can be run on large crawls without loading the
+whole graph into memory.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import os
+import sqlite3
+
+try:
+    from scripts.yt_compression import compression_of
+except ImportError:
+    from yt_compression import compression_of
+
+
+# indexes are made once the rows are in, which is much faster than updating them per row.
+GRAPH_TABLES = ["""CREATE TABLE nodes (id TEXT NOT NULL, title TEXT, degree INTEGER)""",
+                """CREATE TABLE edges (src TEXT NOT NULL, dst TEXT NOT NULL)"""]
+GRAPH_INDEXES = ["""CREATE UNIQUE INDEX nodes_id ON nodes (id)""",
+                 """CREATE INDEX nodes_degree ON nodes (degree)""",
+                 """CREATE INDEX edges_src ON edges (src, dst)""",
+                 """CREATE INDEX edges_dst ON edges (dst, src)"""]
+
+
+def convert_graph_to_sqlite(graph, filename):
+    """
+    convert from a networkX graph object, to an indexed sqlite database.
+    a node's id is its label in the graph. its title is its 'title' attribute, or its label
+    when the nodes are labelled by title.
+    :param graph: the networkX graph object.
+    :param filename: the name of the file to write to. an existing file is replaced.
+    :return:
+    """
+    if compression_of(filename) is not None:
+        raise RuntimeError("""Error in convert_graph_to_sqlite(g, f): 'f' names a compressed
+                           file, but sqlite databases are read in place, so can not be
+                           compressed.""")
+    if os.path.exists(filename):
+        os.remove(filename)
+    connection = sqlite3.connect(filename)
+    try:
+        # the database is new, so nothing is lost if writing it is interrupted.
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+        with connection:
+            for statement in GRAPH_TABLES:
+                connection.execute(statement)
+            connection.executemany('INSERT INTO nodes VALUES (?, ?, ?)',
+                                   ((u'%s' % node, data.get('title', u'%s' % node),
+                                     data.get('degree')) for node, data in
+                                    graph.nodes(data=True)))
+            connection.executemany('INSERT INTO edges VALUES (?, ?)',
+                                   ((u'%s' % node_a, u'%s' % node_b) for node_a, node_b in
+                                    graph.edges()))
+            for statement in GRAPH_INDEXES:
+                connection.execute(statement)
+        connection.execute('ANALYZE')
+    finally:
+        connection.close()
+    return
+
+
+def neighbours(connection, node_id):
+    """
+    find the neighbours of a node.
+    :param connection: an sqlite3 connection to a database written by convert_graph_to_sqlite.
+    :param node_id: the id of the node.
+    :return: list of the ids of the node's neighbours.
+    """
+    return [row[0] for row in connection.execute(
+        'SELECT dst FROM edges WHERE src = ? UNION SELECT src FROM edges WHERE dst = ?',
+        (node_id, node_id))]
+
+
+def load_sqlite(filename, graph=None):
+    """
+    read a graph written by convert_graph_to_sqlite. each node's 'degree' attribute is kept,
+    and its 'title' attribute when that differs from its id.
+    :param filename: the name of the database file.
+    :param graph: the networkx graph to add to. if None, a new networkx.Graph is made.
+    :return: the networkx graph.
+    """
+    if graph is None:
+        import networkx
+        graph = networkx.Graph()
+    connection = sqlite3.connect(filename)
+    try:
+        for node_id, title, degree in connection.execute('SELECT id, title, degree FROM nodes'):
+            attributes = dict()
+            if degree is not None:
+                attributes['degree'] = degree
+            if title != node_id:
+                attributes['title'] = title
+            graph.add_node(node_id, **attributes)
+        graph.add_edges_from(connection.execute('SELECT src, dst FROM edges'))
+    finally:
+        connection.close()
+    return graph
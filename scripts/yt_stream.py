@@ -0,0 +1,180 @@
+"""
+Streaming output for the youtube graphing script.
+Nodes and edges are written out as the crawl finds them, so the graph can be followed while
+the crawl runs, and loaded into the same graph the batch output formats hold.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import json
+import re
+import sys
+import time
+
+try:
+    from scripts.yt_compression import open_file
+except ImportError:
+    from yt_compression import open_file
+
+
+# ndjson - one json object per line, for each node (with its title and degree) and edge.
+# edgelist - tab separated lines, one node alone when it is found and two for each edge. it
+#   holds no titles or degrees. tabs, newlines and backslashes in labels are escaped with
+#   backslashes, so it is read back with load_stream.
+STREAM_FORMATS = ['ndjson', 'edgelist']
+# the name standing for standard output, instead of a file.
+STDOUT_TARGET = '-'
+# seconds between flushes of the stream.
+DEFAULT_FLUSH_INTERVAL = 5.0
+# the characters escaped in edgelist labels, and their escapes.
+EDGELIST_ESCAPES = {u'\\': u'\\\\', u'\t': u'\\t', u'\n': u'\\n', u'\r': u'\\r'}
+_EDGELIST_UNESCAPES = dict((escape[1], character)
+                           for character, escape in EDGELIST_ESCAPES.items())
+
+
+def escape_label(label):
+    """
+    :param label: the label of a node.
+    :return: the label, with the characters of EDGELIST_ESCAPES escaped.
+    """
+    return re.sub(u'[\\\\\t\n\r]', lambda match: EDGELIST_ESCAPES[match.group()], label)
+
+
+def unescape_label(text):
+    """
+    :param text: a label escaped with escape_label.
+    :return: the label.
+    """
+    return re.sub(u'\\\\(.)', lambda match: _EDGELIST_UNESCAPES.get(match.group(1),
+                                                                     match.group(1)), text)
+
+
+class GraphStreamWriter(object):
+    """
+    writes nodes and edges to a file, or to standard output, as they are found.
+    """
+
+    def __init__(self, target, stream_format='ndjson', flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 append=False):
+        """
+        :param target: the file to write to, or '-' for standard output. a .gz, .bz2 or .xz
+            suffix compresses the file.
+        :param stream_format: one of STREAM_FORMATS.
+        :param flush_interval: seconds between flushes. 0 flushes after every line.
+        :param append: if True, add to the end of the file, e.g. when resuming a crawl.
+        :return:
+        """
+        if stream_format not in STREAM_FORMATS:
+            raise RuntimeError("""Error in GraphStreamWriter(t, s, f, a): 's' has an unrecognised
+                               value. value of 's'=""" + str(stream_format))
+        if flush_interval is None or flush_interval < 0:
+            raise RuntimeError("""Error in GraphStreamWriter(t, s, f, a):
+                               'f' should be zero or a positive number of seconds.""")
+        self.stream_format = stream_format
+        self.flush_interval = flush_interval
+        if target == STDOUT_TARGET:
+            self.f_handle = sys.stdout
+            self.owns_handle = False
+        else:
+            self.f_handle = open_file(target, 'a' if append else 'w')
+            self.owns_handle = True
+        self.last_flush = time.time()
+        self.nodes_written = 0
+        self.edges_written = 0
+
+    def _write(self, line):
+        """
+        write a line, flushing if the flush interval has passed.
+        :param line: the line, without its newline.
+        :return:
+        """
+        text = line + u'\n'
+        if sys.version_info < (3,) and not self.owns_handle:    # pragma: no cover
+            text = text.encode('utf-8')
+        self.f_handle.write(text)
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def add_node(self, label, channel_id, title, degree):
+        """
+        write a node.
+        :param label: the label of the node in the graph.
+        :param channel_id: the id of the channel.
+        :param title: the title of the channel.
+        :param degree: the degree of separation the channel was found at.
+        :return:
+        """
+        if self.stream_format == 'ndjson':
+            self._write(json.dumps({'type': 'node', 'label': label, 'id': channel_id,
+                                    'title': title, 'degree': degree}))
+        else:
+            self._write(escape_label(label))
+        self.nodes_written += 1
+
+    def add_edge(self, label_a, label_b):
+        """
+        write an edge.
+        :param label_a: the label of one end.
+        :param label_b: the label of the other end.
+        :return:
+        """
+        if self.stream_format == 'ndjson':
+            self._write(json.dumps({'type': 'edge', 'source': label_a, 'target': label_b}))
+        else:
+            self._write(escape_label(label_a) + u'\t' + escape_label(label_b))
+        self.edges_written += 1
+
+    def flush(self):
+        """
+        flush written lines through to the file.
+        :return:
+        """
+        self.f_handle.flush()
+        self.last_flush = time.time()
+
+    def close(self):
+        """
+        flush, and close the file unless writing to standard output.
+        :return:
+        """
+        self.flush()
+        if self.owns_handle:
+            self.f_handle.close()
+
+
+def load_stream(filename, stream_format='ndjson', graph=None, node_key='title'):
+    """
+    read a streamed graph. lines written twice, as when a crawl resumes from a checkpoint, are
+    added once. a partly written last line, from a crawl still running, is skipped.
+    compressed streams are read through their compressor, as they were written.
+    :param filename: the streamed file.
+    :param stream_format: one of STREAM_FORMATS.
+    :param graph: the networkx graph to add to. if None, a new networkx.Graph is made.
+    :param node_key: with ndjson, how the crawl labelled its nodes. 'id' nodes get a 'title'
+        attribute, as build_graph gives them.
+    :return: the networkx graph.
+    """
+    if graph is None:
+        import networkx
+        graph = networkx.Graph()
+    with open_file(filename, 'r') as f_handle:
+        for line in f_handle:
+            if not line.endswith('\n'):
+                break
+            line = line.rstrip('\n')
+            if stream_format == 'ndjson':
+                record = json.loads(line)
+                if record['type'] == 'node':
+                    if record['label'] not in graph:
+                        attributes = {'degree': record['degree']}
+                        if node_key == 'id':
+                            attributes['title'] = record['title']
+                        graph.add_node(record['label'], **attributes)
+                else:
+                    graph.add_edge(record['source'], record['target'])
+            else:
+                labels = [unescape_label(text) for text in line.split('\t')]
+                if len(labels) == 1:
+                    graph.add_node(labels[0])
+                else:
+                    graph.add_edge(labels[0], labels[1])
+    return graph
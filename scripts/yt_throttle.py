@@ -0,0 +1,221 @@
+"""
+Request execution for the youtube graphing script.
+Requests the api refuses for load - rate limits, 429s and server errors - are retried after a
+jittered exponential backoff, while an AIMD controller adjusts how many requests may be in
+flight: the limit grows by one for each window of successes, and halves when requests are
+throttled.
+"""
+from __future__ import absolute_import, print_function, nested_scopes, generators, with_statement
+
+import random
+import socket
+import threading
+import time
+
+try:
+    from scripts.yt_metrics import request_endpoint
+except ImportError:
+    from yt_metrics import request_endpoint
+try:
+    from googleapiclient.errors import HttpError
+except ImportError:
+    print ('''ERROR: the google-api-client module is required.
+    You can install this module through pip.''')
+    exit()
+
+
+# reasons given with a 403 when requests are sent too fast, rather than the quota being spent.
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+DEFAULT_MAX_RETRIES = 6
+# seconds of the first backoff, doubled with each retry up to the maximum.
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 64.0
+# the share of the limit kept when requests are throttled.
+DEFAULT_DECREASE_FACTOR = 0.5
+
+
+def is_retryable_status(status, content=None):
+    """
+    check whether a response refuses a request for load, so it is worth retrying later.
+    :param status: the http status code.
+    :param content: the response body, as text or bytes.
+    :return: True for 429s, 5xx responses and 403s for rate limits.
+    """
+    if status == 429 or 500 <= status < 600:
+        return True
+    if status == 403 and content:
+        if not isinstance(content, str):
+            content = content.decode('utf-8', 'replace')
+        return any(reason in content for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+def is_retryable_error(excp):
+    """
+    check whether an error from executing a request is worth retrying later.
+    :param excp: the exception raised by the request.
+    :return: True if the api refused the request for load, or the connection failed.
+    """
+    if isinstance(excp, HttpError):
+        resp = getattr(excp, 'resp', None)
+        return resp is not None and is_retryable_status(resp.status,
+                                                        getattr(excp, 'content', None))
+    return isinstance(excp, (socket.error, socket.timeout))
+
+
+def backoff_delay(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+    """
+    choose how long to wait before a retry, with full jitter, so throttled requests do not
+    retry in step.
+    :param attempt: how many times the request has been retried already.
+    :param base_delay: seconds of the first backoff.
+    :param max_delay: the longest backoff, in seconds.
+    :return: seconds to wait.
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class AimdController(object):
+    """
+    limits the requests in flight, raising the limit additively while requests succeed and
+    cutting it multiplicatively when they are throttled.
+    the controller may be shared between threads.
+    """
+
+    def __init__(self, max_in_flight, min_in_flight=1, decrease_factor=DEFAULT_DECREASE_FACTOR,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, metrics=None):
+        """
+        :param max_in_flight: the highest the limit may grow to. the limit starts here.
+        :param min_in_flight: the lowest the limit may fall to.
+        :param decrease_factor: the share of the limit kept when requests are throttled.
+        :param max_retries: the most times a request is retried before its error is raised.
+        :param base_delay: seconds of the first backoff.
+        :param max_delay: the longest backoff, in seconds.
+        :param metrics: a CrawlMetrics to count every request sent in.
+        :return:
+        """
+        if max_in_flight is None or max_in_flight < 1:
+            raise RuntimeError("""Error in AimdController(m, ...):
+                               'm' should be a positive integer.""")
+        if min_in_flight < 1 or min_in_flight > max_in_flight:
+            raise RuntimeError("""Error in AimdController(m, n, ...):
+                               'n' should be a positive integer no greater than 'm'.""")
+        self.max_in_flight = max_in_flight
+        self.min_in_flight = min_in_flight
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self.limit = float(max_in_flight)
+        self.in_flight = 0
+        self.decreases = 0
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.condition = threading.Condition()
+
+    @property
+    def current_limit(self):
+        """
+        :return: how many requests may be in flight now.
+        """
+        return max(int(self.limit), self.min_in_flight)
+
+    def on_success(self):
+        """
+        grow the limit, by one request for each window of successes.
+        :return:
+        """
+        with self.condition:
+            self.requests += 1
+            self.limit = min(self.limit + 1.0 / self.limit, float(self.max_in_flight))
+            self.condition.notify_all()
+
+    def on_throttle(self, ticket):
+        """
+        cut the limit after a throttled request. requests sent before the last cut were
+        throttled at the old limit, so they do not cut it again.
+        :param ticket: the ticket the request was sent with.
+        :return:
+        """
+        with self.condition:
+            self.requests += 1
+            self.throttled += 1
+            if ticket == self.decreases:
+                self.limit = max(self.limit * self.decrease_factor, float(self.min_in_flight))
+                self.decreases += 1
+
+    def ticket(self):
+        """
+        :return: a ticket marking when a request was sent, for on_throttle.
+        """
+        with self.condition:
+            return self.decreases
+
+    def acquire(self):
+        """
+        wait until a request may be sent, then count it as in flight.
+        :return: the ticket for the request.
+        """
+        with self.condition:
+            while self.in_flight >= self.current_limit:
+                self.condition.wait()
+            self.in_flight += 1
+            return self.decreases
+
+    def release(self):
+        """
+        count a request as no longer in flight.
+        :return:
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def execute(self, request):
+        """
+        execute a google api request, within the limit, retrying it while it is throttled.
+        :param request: the request to execute.
+        :return: the api response.
+        """
+        attempt = 0
+        while True:
+            ticket = self.acquire()
+            start = time.time()
+            try:
+                result = request.execute()
+            except Exception as excp:
+                self.release()
+                if self.metrics is not None:
+                    resp = getattr(excp, 'resp', None)
+                    self.metrics.observe_request(request_endpoint(request),
+                                                 'network' if resp is None else resp.status,
+                                                 time.time() - start)
+                if not is_retryable_error(excp) or attempt >= self.max_retries:
+                    raise
+                self.on_throttle(ticket)
+                with self.condition:
+                    self.retries += 1
+                time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+                attempt += 1
+                continue
+            self.release()
+            if self.metrics is not None:
+                self.metrics.observe_request(request_endpoint(request), 200, time.time() - start)
+            self.on_success()
+            return result
+
+
+def execute_request(request, controller=None):
+    """
+    execute a google api request, retrying it while it is throttled.
+    :param request: the request to execute.
+    :param controller: an AimdController to limit the requests in flight with. if None, the
+        request is only retried.
+    :return: the api response.
+    """
+    if controller is None:
+        controller = AimdController(1)
+    return controller.execute(request)